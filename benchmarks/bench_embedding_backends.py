@@ -0,0 +1,89 @@
+"""对比各嵌入后端（torch / onnx / onnx-int8）的吞吐量和检索召回率
+
+在固定随机种子的合成语料上：
+    docs/sec   每个后端嵌入全部文档的吞吐量（不含模型加载）
+    load       模型加载耗时
+    recall@k   以torch后端的检索结果为基准，各后端前k个结果的重合率
+    cosine     与torch后端同一文档向量的平均余弦相似度
+用法:
+    python benchmarks/bench_embedding_backends.py --docs 2000 --queries 100 --k 10
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.config import EMBEDDING_MODEL
+from src.indexer.embeddings import EMBEDDING_BACKENDS, LazySentenceTransformerEmbeddingFunction
+
+WORDS = ["合同", "发票", "季度", "报告", "销售", "客户", "项目", "预算", "会议", "审计",
+         "contract", "invoice", "budget", "report", "revenue", "customer", "project", "SKU"]
+
+
+def make_texts(n: int, words: int, seed: int):
+    """生成固定随机种子的合成文本"""
+    rng = random.Random(seed)
+    return [f"文档{i} " + " ".join(rng.choice(WORDS) for _ in range(words)) for i in range(n)]
+
+
+def embed(backend: str, texts, batch_size: int):
+    """返回 (加载耗时, 嵌入耗时, 向量矩阵)"""
+    embedding_function = LazySentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL, backend=backend)
+    start = time.perf_counter()
+    embedding_function.load()
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embedding_function(texts[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+
+    vectors = np.vstack(vectors)
+    vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return load_seconds, elapsed, vectors
+
+
+def top_k(doc_vectors, query_vectors, k: int):
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='嵌入后端吞吐量与召回率基准测试')
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--words', type=int, default=60, help='每篇文档的词数')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    args = parser.parse_args()
+
+    docs = make_texts(args.docs, args.words, seed=42)
+    queries = make_texts(args.queries, 4, seed=7)
+
+    # torch 后端作为召回率基准，总是第一个运行
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    baseline = None
+    print(f"{'backend':<10} {'load':>7} {'docs/sec':>9} {f'recall@{args.k}':>10} {'cosine':>7}")
+    for backend in backends:
+        load_seconds, elapsed, doc_vectors = embed(backend, docs, args.batch_size)
+        _, _, query_vectors = embed(backend, queries, args.batch_size)
+        neighbours = top_k(doc_vectors, query_vectors, args.k)
+
+        if baseline is None:
+            baseline = (doc_vectors, neighbours)
+        recall = np.mean([
+            len(set(row) & set(base_row)) / args.k
+            for row, base_row in zip(neighbours, baseline[1])
+        ])
+        cosine = float(np.mean(np.sum(doc_vectors * baseline[0], axis=1)))
+        print(f"{backend:<10} {load_seconds:>6.2f}s {args.docs / elapsed:>9.1f} {recall:>10.3f} {cosine:>7.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""测量每次提问的固定开销：每次重建问答链（旧实现） vs 复用初始化时构建的问答链
+
+默认使用LangChain的假LLM，只测量向量存储/检索器/问答链构建与检索的开销，不含生成耗时。
+指定 --model 时改为加载本地LlamaCpp模型，测量首token耗时（TTFT）；
+分别以 LLM_PROMPT_CACHE=none 和 LLM_PROMPT_CACHE=ram 运行即可对比提示缓存的效果。
+用法:
+    python benchmarks/bench_qa_overhead.py --questions 50
+    LLM_PROMPT_CACHE=none python benchmarks/bench_qa_overhead.py --model ./models/model.gguf --questions 10
+    LLM_PROMPT_CACHE=ram  python benchmarks/bench_qa_overhead.py --model ./models/model.gguf --questions 10
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUESTIONS = ["季度销售报告的结论是什么？", "预算审批需要哪些步骤？", "客户名单包含哪些行业？",
+             "合同的付款条款是什么？", "项目进度是否延期？"]
+
+
+def bench_overhead(integration, n_questions: int):
+    from langchain.chains import RetrievalQA
+    from langchain.vectorstores import Chroma
+
+    def rebuild_and_ask(question):
+        # 旧实现：每次提问都重新构建向量存储、检索器和问答链
+        vectorstore = Chroma(client=integration.chroma_client, collection_name="documents",
+                             embedding_function=integration.embeddings)
+        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        chain = RetrievalQA.from_chain_type(llm=integration.llm, chain_type="stuff",
+                                            retriever=retriever, return_source_documents=True)
+        return chain({"query": question})
+
+    def reuse_and_ask(question):
+        return integration.qa_chain({"query": question})
+
+    # 预热嵌入模型，避免首次加载计入结果
+    reuse_and_ask(QUESTIONS[0])
+
+    for label, fn in [("rebuild", rebuild_and_ask), ("reuse", reuse_and_ask)]:
+        timings = []
+        for i in range(n_questions):
+            start = time.perf_counter()
+            fn(QUESTIONS[i % len(QUESTIONS)])
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{label:<8} mean {statistics.mean(timings):7.2f} ms  median {statistics.median(timings):7.2f} ms")
+
+
+def bench_ttft(integration, n_questions: int, n_docs: int):
+    from src.indexer.chroma_index import search
+
+    collection = integration.collection
+    timings = []
+    for i in range(n_questions):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        hits = search(collection, question, n_results=n_docs)
+        prompt = integration.build_prompt(question, [hit['document'] for hit in hits])
+        start = time.perf_counter()
+        next(iter(integration.stream(prompt)), None)
+        timings.append(time.perf_counter() - start)
+        print(f"question {i + 1}: ttft {timings[-1]:.2f}s")
+
+    print(f"LLM_PROMPT_CACHE={os.environ.get('LLM_PROMPT_CACHE', 'ram')}: "
+          f"ttft mean {statistics.mean(timings):.2f}s, median {statistics.median(timings):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='问答固定开销与首token耗时基准测试')
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--model', help='本地LlamaCpp模型路径（指定时测量TTFT）')
+    parser.add_argument('--docs', type=int, default=3, help='提示中包含的文档数（TTFT模式）')
+    args = parser.parse_args()
+
+    if args.model:
+        os.environ["MODEL_PATH"] = args.model
+
+    from src.indexer.chroma_index import get_chroma_client
+    from src.llm_integration import LLMIntegration
+
+    client = get_chroma_client()
+    if args.model:
+        bench_ttft(LLMIntegration(client), args.questions, args.docs)
+    else:
+        from langchain.llms.fake import FakeListLLM
+        llm = FakeListLLM(responses=["测试回答。"])
+        bench_overhead(LLMIntegration(client, llm=llm), args.questions)
+
+
+if __name__ == "__main__":
+    main()
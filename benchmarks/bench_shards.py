@@ -0,0 +1,72 @@
+"""对比不同分片数下的查询延迟（各分片并行检索后按距离合并）
+
+用随机向量构造语料，不加载嵌入模型，只测量向量检索本身：
+分片数为1时相当于单个集合，分片数增加后每个HNSW索引变小，查询在各分片上并行执行。
+
+用法: python benchmarks/bench_shards.py --chunks 100000 --shards 1 2 4 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import chromadb
+from src.indexer.sharding import ShardedCollection
+
+
+def build(client, n_shards: int, vectors: np.ndarray, batch_size: int):
+    collection = ShardedCollection(client, scheme="hash", count=n_shards)
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        ids = [f"chunk{i}" for i in range(offset, min(offset + batch_size, len(vectors)))]
+        collection.add(
+            ids=ids,
+            documents=[""] * len(ids),
+            metadatas=[{'file_path': f"/bench/{i}.txt"} for i in range(offset, offset + len(ids))],
+            embeddings=vectors[offset:offset + len(ids)].tolist()
+        )
+    return collection, time.perf_counter() - start
+
+
+def bench_queries(collection, queries: np.ndarray, n_results: int):
+    # 预热：首次查询加载各分片的HNSW索引
+    collection.query(query_embeddings=queries[:1].tolist(), n_results=n_results)
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=n_results)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分片查询延迟基准测试')
+    parser.add_argument('--chunks', type=int, default=50000, help='分块数量')
+    parser.add_argument('--dim', type=int, default=384, help='向量维度')
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8], help='要比较的分片数')
+    parser.add_argument('--queries', type=int, default=200, help='查询次数')
+    parser.add_argument('--top-k', type=int, default=10, help='每次查询返回的结果数')
+    parser.add_argument('--batch-size', type=int, default=5000, help='每批写入的分块数')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(42)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    for n_shards in args.shards:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            client = chromadb.PersistentClient(path=tmp_dir)
+            collection, build_seconds = build(client, n_shards, vectors, args.batch_size)
+            p50, p95 = bench_queries(collection, queries, args.top_k)
+            print(f"{n_shards:>3} shards  build {build_seconds:7.1f}s  "
+                  f"query p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""测量快照导出和恢复的吞吐量（恢复直接写入快照中的向量，不调用嵌入模型）
+
+用随机向量构造语料，对比快照大小和导出/恢复耗时；
+作为参照，--embed 时额外测量用嵌入模型重新嵌入同样数量分块的耗时（按样本外推）。
+
+用法: python benchmarks/bench_snapshot.py --chunks 50000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import chromadb
+from src.indexer.chroma_index import hnsw_metadata
+from src.indexer.embeddings import get_embedding_function
+from src.indexer.snapshot import create_snapshot, apply_part, read_snapshot
+
+
+def open_collection(path: str):
+    client = chromadb.PersistentClient(path=path)
+    return client.get_or_create_collection(
+        name="documents", embedding_function=get_embedding_function(), metadata=hnsw_metadata()
+    )
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='快照导出/恢复基准测试')
+    parser.add_argument('--chunks', type=int, default=50000, help='分块数量')
+    parser.add_argument('--dim', type=int, default=384, help='向量维度')
+    parser.add_argument('--batch-size', type=int, default=5000, help='每批写入的分块数')
+    parser.add_argument('--embed', type=int, default=0, help='重新嵌入参照的样本分块数（0 表示不测量）')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(42)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    documents = [f"文档{i} " + "合同 发票 预算 报告 " * 20 for i in range(args.chunks)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = open_collection(os.path.join(tmp_dir, "source"))
+        for offset in range(0, args.chunks, args.batch_size):
+            end = min(offset + args.batch_size, args.chunks)
+            source.add(
+                ids=[f"chunk{i}" for i in range(offset, end)],
+                documents=documents[offset:end],
+                metadatas=[{'file_path': f"/bench/{i}.txt"} for i in range(offset, end)],
+                embeddings=vectors[offset:end]
+            )
+
+        snapshot_dir = os.path.join(tmp_dir, "snapshot")
+        start = time.perf_counter()
+        create_snapshot(source, snapshot_dir, batch_size=args.batch_size)
+        snapshot_seconds = time.perf_counter() - start
+
+        target = open_collection(os.path.join(tmp_dir, "target"))
+        start = time.perf_counter()
+        for part in read_snapshot(snapshot_dir)['parts']:
+            apply_part(target, snapshot_dir, part['name'], args.batch_size)
+        restore_seconds = time.perf_counter() - start
+        assert target.count() == args.chunks
+
+        print(f"chunks {args.chunks}  snapshot {dir_size(snapshot_dir) / 1024 ** 2:.1f} MB  "
+              f"(index {dir_size(os.path.join(tmp_dir, 'source')) / 1024 ** 2:.1f} MB)")
+        print(f"snapshot {snapshot_seconds:7.1f}s  restore {restore_seconds:7.1f}s  "
+              f"{args.chunks / restore_seconds:8.0f} chunks/sec")
+
+    if args.embed:
+        embedding_function = get_embedding_function()
+        embedding_function(documents[:32])
+        start = time.perf_counter()
+        embedding_function(documents[:args.embed])
+        per_chunk = (time.perf_counter() - start) / args.embed
+        print(f"re-embedding {args.chunks} chunks would take ~{per_chunk * args.chunks:.0f}s "
+              f"({1 / per_chunk:.0f} chunks/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""测量服务冷启动耗时：进程启动到 /health 可响应、到第一次搜索返回
+
+每轮在新的子进程中启动服务（避免模型已在内存中），依次记录：
+    health: 进程启动到 /health 返回200
+    search: 进程启动到第一次 /search 返回200（包含嵌入模型加载）
+用法:
+    python benchmarks/bench_startup.py --runs 3 --port 8765
+    EMBEDDING_WARMUP=false python benchmarks/bench_startup.py   # 对比不预热
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_for(client, method, url, deadline, **kwargs):
+    """轮询接口直到返回200，返回耗时基准点（perf_counter）"""
+    while time.perf_counter() < deadline:
+        try:
+            response = client.request(method, url, **kwargs)
+            if response.status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not respond in time")
+
+
+def run_once(port: int, timeout: float):
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.mcp_server.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT
+    )
+    try:
+        deadline = start + timeout
+        with httpx.Client(timeout=timeout) as client:
+            health = wait_for(client, "GET", f"{url}/health", deadline) - start
+            search = wait_for(client, "POST", f"{url}/search", deadline, json={"query": "启动测试"}) - start
+        return health, search
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='服务冷启动耗时基准测试')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=300, help='单轮最长等待时间（秒）')
+    args = parser.parse_args()
+
+    results = [run_once(args.port, args.timeout) for _ in range(args.runs)]
+    for i, (health, search) in enumerate(results, 1):
+        print(f"run {i}: health {health:.2f}s, first search {search:.2f}s")
+
+    print(f"median: health {statistics.median(r[0] for r in results):.2f}s, "
+          f"first search {statistics.median(r[1] for r in results):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""负载测试：持续上传文件的同时测量 /search 的延迟分布
+
+先单独测量搜索延迟作为基线，再在并发上传的同时重复测量，对比 p50/p99。
+用法（服务需已启动）:
+    python benchmarks/load_test_search_during_upload.py --url http://localhost:8000 --duration 30
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import httpx
+
+QUERIES = ["季度销售报告", "合同编号", "预算审批", "客户名单", "项目进度", "invoice", "SKU"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def search_loop(client, url, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{url}/search", json={"query": random.choice(QUERIES)})
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+
+
+async def upload_loop(client, url, deadline, size_kb, counter):
+    body = ("上传负载测试内容。" * (size_kb * 1024 // 27 + 1)).encode("utf-8")
+    while time.perf_counter() < deadline:
+        name = f"load_{random.getrandbits(48):x}.txt"
+        response = await client.post(f"{url}/upload", files={"file": (name, body + name.encode())})
+        counter[response.status_code] = counter.get(response.status_code, 0) + 1
+
+
+async def run_phase(url, duration, searchers, uploaders, size_kb):
+    latencies, errors, uploads = [], [], {}
+    deadline = time.perf_counter() + duration
+    async with httpx.AsyncClient(timeout=120) as client:
+        tasks = [search_loop(client, url, deadline, latencies, errors) for _ in range(searchers)]
+        tasks += [upload_loop(client, url, deadline, size_kb, uploads) for _ in range(uploaders)]
+        await asyncio.gather(*tasks)
+    return latencies, errors, uploads
+
+
+def report(name, latencies, errors, uploads):
+    if not latencies:
+        print(f"{name}: no successful searches ({len(errors)} errors)")
+        return
+    print(f"{name:<16} searches={len(latencies):<6} "
+          f"p50={statistics.median(latencies):7.1f}ms "
+          f"p99={percentile(latencies, 99):7.1f}ms "
+          f"max={max(latencies):7.1f}ms errors={len(errors)} uploads={uploads}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上传期间的搜索延迟负载测试')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--duration', type=float, default=30, help='每个阶段的持续时间（秒）')
+    parser.add_argument('--searchers', type=int, default=8, help='并发搜索客户端数')
+    parser.add_argument('--uploaders', type=int, default=4, help='并发上传客户端数')
+    parser.add_argument('--size-kb', type=int, default=256, help='每个上传文件的大小（KB）')
+    args = parser.parse_args()
+
+    baseline = asyncio.run(run_phase(args.url, args.duration, args.searchers, 0, args.size_kb))
+    report("search only", *baseline)
+    loaded = asyncio.run(run_phase(args.url, args.duration, args.searchers, args.uploaders, args.size_kb))
+    report("during uploads", *loaded)
+
+
+if __name__ == "__main__":
+    main()
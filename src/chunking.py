@@ -0,0 +1,122 @@
+import re
+from typing import List, Dict, Any
+
+# 加载器输出中的结构标记（DOCX段落/表格、PPT幻灯片/表格、Excel工作表、PDF页面）
+SECTION_MARKER = re.compile(r"^\[(段落\d+|幻灯片 \d+|工作表 '[^\n]*?'|表格\d*|页面 \d+)\]", re.MULTILINE)
+
+# 近似分词：CJK字符逐字计数，连续的字母数字计为一个词，其余非空白符号各计一个
+TOKEN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数（与MiniLM的WordPiece分词大致相当）"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def split_sections(text: str) -> List[Dict[str, Any]]:
+    """按加载器输出的结构标记把文本拆分为若干段"""
+    starts = [m.start() for m in SECTION_MARKER.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(text))
+
+    sections = []
+    for start, end in zip(starts, starts[1:]):
+        section_text = text[start:end].strip()
+        if not section_text:
+            continue
+        marker = SECTION_MARKER.match(section_text)
+        sections.append({
+            'text': section_text,
+            'section': marker.group(1) if marker else '',
+            'tokens': estimate_tokens(section_text)
+        })
+    return sections
+
+
+def _split_window(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """按token窗口切分超长文本，相邻窗口之间保留重叠"""
+    spans = [m.span() for m in TOKEN_PATTERN.finditer(text)]
+    if len(spans) <= chunk_size:
+        return [text]
+
+    step = chunk_size - chunk_overlap
+    pieces = []
+    for start in range(0, len(spans), step):
+        window = spans[start:start + chunk_size]
+        pieces.append(text[window[0][0]:window[-1][1]])
+        if start + chunk_size >= len(spans):
+            break
+    return pieces
+
+
+def chunk_text(text: str, chunk_size: int = 200, chunk_overlap: int = 32) -> List[Dict[str, Any]]:
+    """把文本切分为不超过 chunk_size 个token的分块
+
+    优先沿结构标记切分，并把相邻的小段合并到同一分块；
+    单个超长段按token窗口切分，窗口之间重叠 chunk_overlap 个token（需满足 0 <= chunk_overlap < chunk_size）。
+    chunk_size <= 0 时不切分。
+    """
+    if chunk_size > 0 and not 0 <= chunk_overlap < chunk_size:
+        raise ValueError(f"分块重叠 ({chunk_overlap}) 必须不小于0且小于分块大小 ({chunk_size})")
+    if chunk_size <= 0 or estimate_tokens(text) <= chunk_size:
+        marker = SECTION_MARKER.match(text)
+        return [{'content': text, 'section': marker.group(1) if marker else '', 'index': 0}]
+
+    chunks = []
+    buffer, buffer_tokens, buffer_section = [], 0, ''
+
+    def flush():
+        if buffer:
+            chunks.append({'content': "\n\n".join(buffer), 'section': buffer_section})
+
+    for section in split_sections(text):
+        if section['tokens'] > chunk_size:
+            flush()
+            buffer, buffer_tokens = [], 0
+            for piece in _split_window(section['text'], chunk_size, chunk_overlap):
+                chunks.append({'content': piece, 'section': section['section']})
+            continue
+
+        if buffer and buffer_tokens + section['tokens'] > chunk_size:
+            flush()
+            buffer, buffer_tokens = [], 0
+
+        if not buffer:
+            buffer_section = section['section']
+        buffer.append(section['text'])
+        buffer_tokens += section['tokens']
+
+    flush()
+
+    for i, chunk in enumerate(chunks):
+        chunk['index'] = i
+    return chunks
+
+
+def chunk_document(document: Dict[str, Any], parent_id: str,
+                   chunk_size: int = 200, chunk_overlap: int = 32, start_index: int = 0) -> List[Dict[str, Any]]:
+    """把加载器输出的文档切分为分块文档，每个分块带有独立ID和父文件元数据
+
+    流式加载时同一文件会分多次切分，start_index 用于保证分块编号连续。
+    """
+    chunks = chunk_text(document['content'], chunk_size, chunk_overlap)
+
+    chunk_documents = []
+    for chunk in chunks:
+        chunk_index = start_index + chunk['index']
+        metadata = dict(document.get('metadata', {}))
+        metadata.update({
+            'parent_id': parent_id,
+            'chunk_index': chunk_index,
+            'section': chunk['section']
+        })
+        chunk_documents.append({
+            'id': f"{parent_id}:{chunk_index}",
+            'content': chunk['content'],
+            'type': document.get('type', 'unknown'),
+            'size': len(chunk['content']),
+            'status': document.get('status', 'unknown'),
+            'metadata': metadata
+        })
+    return chunk_documents
@@ -1,6 +1,7 @@
 import argparse
 import logging
 import json
+from datetime import datetime
 from src.document_processor import DocumentProcessor
 
 
@@ -21,11 +22,56 @@ def main():
     index_parser.add_argument('--file', help='单个文件路径')
     index_parser.add_argument('--dir', help='目录路径')
     index_parser.add_argument('--ext', nargs='+', help='文件扩展名，如 .txt .pdf')
+    index_parser.add_argument('--workers', type=int, help='并行解析进程数（大于1时启用流水线模式）')
+    index_parser.add_argument('--batch-size', type=int, help='批量写入索引的文档数')
+    index_parser.add_argument('--tenant', help='文件所属租户（SHARD_BY=tenant 时写入该租户的分片）')
 
     # 搜索命令
     search_parser = subparsers.add_parser('search', help='搜索索引')
     search_parser.add_argument('--query', required=True, help='搜索查询')
     search_parser.add_argument('--count', type=int, default=3, help='返回结果数量')
+    search_parser.add_argument('--mode', choices=['vector', 'lexical', 'hybrid'],
+                               help='搜索模式（默认使用配置中的 SEARCH_MODE）')
+    search_parser.add_argument('--ext', nargs='+', help='只搜索这些扩展名的文件，如 .pdf .docx')
+    search_parser.add_argument('--path', help='只搜索该目录下的文件')
+    search_parser.add_argument('--after', type=datetime.fromisoformat, help='文件修改时间下限（ISO 8601）')
+    search_parser.add_argument('--before', type=datetime.fromisoformat, help='文件修改时间上限（ISO 8601）')
+    search_parser.add_argument('--min-size', type=int, help='文件大小下限（字节）')
+    search_parser.add_argument('--max-size', type=int, help='文件大小上限（字节）')
+    search_parser.add_argument('--shards', nargs='+', help='只检索这些分片（启用分片时有效）')
+
+    # 监视命令
+    watch_parser = subparsers.add_parser('watch', help='监视目录变化并持续增量索引')
+    watch_parser.add_argument('--dir', nargs='+', required=True, help='要监视的目录')
+    watch_parser.add_argument('--ext', nargs='+', help='文件扩展名，如 .txt .pdf')
+    watch_parser.add_argument('--workers', type=int, help='并行解析进程数（大于1时启用流水线模式）')
+    watch_parser.add_argument('--batch-size', type=int, help='批量写入索引的文档数')
+    watch_parser.add_argument('--debounce', type=int, help='事件合并的时间窗口（毫秒）')
+    watch_parser.add_argument('--no-initial-scan', action='store_true', help='开始监视前不先同步目录')
+
+    # 分片管理命令
+    shards_parser = subparsers.add_parser('shards', help='查看或管理索引分片（需启用 SHARD_BY）')
+    shards_parser.add_argument('--drop', metavar='KEY', help='删除一个分片及其中的文件')
+
+    # 索引压缩命令：用已存储的向量重建HNSW索引，并比较不同 ef 下的召回率和延迟
+    compact_parser = subparsers.add_parser('compact', aliases=['rebuild'],
+                                           help='重建向量索引（不重新嵌入），应用HNSW参数并回收空间')
+    compact_parser.add_argument('--m', type=int, help='HNSW每个节点的邻居数（默认使用配置中的 HNSW_M）')
+    compact_parser.add_argument('--construction-ef', type=int, help='构建时的候选数（默认 HNSW_CONSTRUCTION_EF）')
+    compact_parser.add_argument('--batch-size', type=int, help='每批重写的分块数')
+    compact_parser.add_argument('--ef', type=int, nargs='+', help='评估召回率和延迟的 search_ef 取值，如 10 50 100 200')
+    compact_parser.add_argument('--queries', type=int, default=100, help='评估使用的查询数')
+    compact_parser.add_argument('--top-k', type=int, default=10, help='评估召回率的前 k 个结果')
+    compact_parser.add_argument('--no-eval', action='store_true', help='重建后不评估召回率和延迟')
+
+    # 快照命令：导出向量和内容，新节点恢复时无需重新嵌入
+    snapshot_parser = subparsers.add_parser('snapshot', help='导出索引快照（已有快照时增量追加）')
+    snapshot_parser.add_argument('--out', required=True, help='快照目录')
+    snapshot_parser.add_argument('--full', action='store_true', help='重新导出全量快照')
+
+    restore_parser = subparsers.add_parser('restore', help='从快照恢复索引（不重新嵌入）')
+    restore_parser.add_argument('--from', dest='source', required=True, help='快照目录')
+    restore_parser.add_argument('--batch-size', type=int, help='每批写入的分块数')
 
     # 统计命令
     subparsers.add_parser('count', help='获取索引文档数量')
@@ -34,12 +80,15 @@ def main():
     processor = DocumentProcessor()
 
     if args.command == 'index':
+        metadata = {'tenant': args.tenant} if args.tenant else None
         if args.file:
-            result = processor.process_file(args.file)
+            result = processor.process_file(args.file, metadata)
             print(json.dumps(result, ensure_ascii=False, indent=2))
         elif args.dir:
-            results = processor.process_directory(args.dir, args.ext)
-            print(f"已处理 {len(results)} 个文件")
+            results = processor.process_directory(args.dir, args.ext, args.workers, args.batch_size, metadata)
+            stats = processor.last_ingest_stats
+            print(f"已处理 {len(results)} 个文件，耗时 {stats['elapsed']:.1f} 秒，"
+                  f"{stats['files_per_sec']:.1f} 文件/秒")
             errors = [r for r in results if r['status'] == 'error']
             if errors:
                 print(f"错误: {len(errors)} 个文件处理失败")
@@ -47,10 +96,72 @@ def main():
             print("请指定 --file 或 --dir 参数")
 
     elif args.command == 'search':
-        from src.indexer.chroma_index import search
-        results = search(processor.collection, args.query, args.count)
+        from src.indexer.chroma_index import search, build_filter
+        from src.indexer.sharding import ShardedCollection
+        if args.shards and not isinstance(processor.collection, ShardedCollection):
+            print("索引未启用分片，不能使用 --shards（请设置 SHARD_BY）")
+            return
+        filter = build_filter(
+            extensions=args.ext,
+            path_prefix=args.path,
+            modified_after=args.after.timestamp() if args.after else None,
+            modified_before=args.before.timestamp() if args.before else None,
+            min_size=args.min_size,
+            max_size=args.max_size
+        )
+        collection = processor.collection.view(args.shards) if args.shards else processor.collection
+        results = search(collection, args.query, args.count, filter, group_by_file=True,
+                         lexical_index=processor.lexical_index, mode=args.mode)
+        results = processor.collapse_duplicates(results)
         print(json.dumps(results, ensure_ascii=False, indent=2))
 
+    elif args.command == 'watch':
+        from src.watcher import DirectoryWatcher
+        from src.config import WATCH_DEBOUNCE_MS
+        watcher = DirectoryWatcher(processor, args.dir, args.ext, args.workers, args.batch_size,
+                                   args.debounce or WATCH_DEBOUNCE_MS)
+        watcher.run(initial_scan=not args.no_initial_scan)
+        stats = watcher.stats()
+        print(f"已停止监视：{stats['batches']} 批变化，索引 {stats['indexed']} 个文件，"
+              f"删除 {stats['removed']} 个文件，错误 {stats['errors']} 个")
+
+    elif args.command == 'shards':
+        if not hasattr(processor.collection, 'stats'):
+            print("索引未启用分片，请设置 SHARD_BY")
+        elif args.drop:
+            removed = processor.drop_shard(args.drop)
+            print(f"已删除分片 {args.drop}，共 {len(removed)} 个文件")
+        else:
+            for name, count in processor.collection.stats().items():
+                print(f"{name}: {count} 个分块")
+
+    elif args.command in ('compact', 'rebuild'):
+        from src.config import HNSW_M, HNSW_CONSTRUCTION_EF
+        from src.indexer.compaction import evaluate_search, EVAL_EF_VALUES
+        stats = processor.compact(args.m or HNSW_M, args.construction_ef or HNSW_CONSTRUCTION_EF,
+                                  batch_size=args.batch_size)
+        saved = stats['size_before'] - stats['size_after']
+        print(f"已重建 {stats['chunks']} 个分块，耗时 {stats['elapsed']:.1f} 秒；"
+              f"索引大小 {stats['size_before'] / 1024 ** 2:.1f} MB -> {stats['size_after'] / 1024 ** 2:.1f} MB"
+              f"（减少 {saved / max(stats['size_before'], 1):.1%}）")
+        if not args.no_eval:
+            for row in evaluate_search(processor.collection, args.ef or EVAL_EF_VALUES, args.queries, args.top_k):
+                print(f"ef={row['ef']:<5} recall@{args.top_k} {row['recall']:.3f}  "
+                      f"p50 {row['p50_ms']:.2f} ms  p95 {row['p95_ms']:.2f} ms")
+
+    elif args.command == 'snapshot':
+        stats = processor.snapshot(args.out, args.full)
+        if stats['part'] is None:
+            print(f"索引没有变化，快照已是最新（共 {stats['total_chunks']} 个分块）")
+        else:
+            print(f"已写入快照 {stats['part']}：{stats['chunks']} 个分块，删除 {stats['deleted']} 个，"
+                  f"共 {stats['total_chunks']} 个分块，耗时 {stats['elapsed']:.1f} 秒")
+
+    elif args.command == 'restore':
+        stats = processor.restore(args.source, args.batch_size)
+        print(f"已恢复 {len(stats['parts'])} 个快照部分：写入 {stats['chunks']} 个分块，删除 {stats['deleted']} 个，"
+              f"索引共 {stats['total_chunks']} 个分块，耗时 {stats['elapsed']:.1f} 秒")
+
     elif args.command == 'count':
         count = processor.get_document_count()
         print(f"索引中的文档数量: {count}")
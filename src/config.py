@@ -16,3 +16,110 @@ SERVER_LOG_LEVEL = os.environ.get("LOG_LEVEL", "info")
 
 # 索引配置
 INDEX_DIR = os.environ.get("INDEX_DIR", "./index")
+
+# 摄取配置
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 1))
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 64))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 256))
+
+# 分块配置（按token预算切分，CHUNK_SIZE_TOKENS=0 表示不切分）
+CHUNK_SIZE_TOKENS = int(os.environ.get("CHUNK_SIZE_TOKENS", 200))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))
+
+# 流式加载配置（超过阈值且支持流式的文件逐页/逐块写入，每 STREAM_WINDOW 段写入一次）
+STREAM_THRESHOLD_MB = float(os.environ.get("STREAM_THRESHOLD_MB", 20))
+STREAM_WINDOW = int(os.environ.get("STREAM_WINDOW", 50))
+
+# Excel行块大小（流式读取时每个行块的最大行数，每个行块都包含表头）
+EXCEL_BLOCK_ROWS = int(os.environ.get("EXCEL_BLOCK_ROWS", 50))
+
+# 查询缓存配置（缓存大小为0表示禁用，TTL单位为秒）
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 1024))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 3600))
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 1024))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 300))
+
+# 服务器执行器配置（并发数和排队上限，超出时接口返回503）
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", 1))
+INGEST_MAX_QUEUE = int(os.environ.get("INGEST_MAX_QUEUE", 16))
+SEARCH_CONCURRENCY = int(os.environ.get("SEARCH_CONCURRENCY", 4))
+SEARCH_MAX_QUEUE = int(os.environ.get("SEARCH_MAX_QUEUE", 64))
+
+# 上传暂存与后台任务配置
+SPOOL_DIR = os.environ.get("SPOOL_DIR", "./spool")
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+# 上传文件在索引中的逻辑路径前缀（<前缀>/<内容摘要>/<原始文件名>，不对应磁盘上的文件，
+# 清除已删除文件时跳过；按目录前缀过滤时可用该前缀只检索上传的文件）
+UPLOAD_PATH_PREFIX = os.environ.get("UPLOAD_PATH_PREFIX", "/upload")
+
+# 嵌入模型配置（模型在首次使用时加载；EMBEDDING_WARMUP=true 时服务启动后在后台预热）
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_WARMUP = os.environ.get("EMBEDDING_WARMUP", "true").lower() == "true"
+
+# 嵌入推理后端：torch、onnx（fp32）或 onnx-int8（量化，CPU上吞吐更高、内存更小）
+# EMBEDDING_ONNX_FILE 可指定模型仓库中的其他ONNX文件，留空时按CPU架构自动选择
+# 各后端的向量略有差异，切换后端后需重建索引（快照只能恢复到相同模型和后端的索引）
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "")
+
+# 搜索模式（vector / lexical / hybrid）；hybrid 按倒数排名融合（RRF）向量和BM25结果，
+# 每路取 HYBRID_CANDIDATES 个候选，RRF_K 为融合常数
+SEARCH_MODE = os.environ.get("SEARCH_MODE", "hybrid")
+RRF_K = int(os.environ.get("RRF_K", 60))
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", 20))
+
+# 批量搜索接口单次请求的最大查询数
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", 64))
+
+# LLM调度器配置（单个模型实例串行生成；排队的生成数超出 LLM_MAX_QUEUE 时接口返回503，
+# 为0时不排队，只在没有正在进行的生成时接受请求；每个问答请求默认最多等待 LLM_REQUEST_TIMEOUT 秒）
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 4))
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", 120))
+
+# LLM提示缓存（none / ram / disk）：复用固定系统提示前缀的KV状态，避免每次提问重新计算
+LLM_PROMPT_CACHE = os.environ.get("LLM_PROMPT_CACHE", "ram")
+LLM_PROMPT_CACHE_MB = float(os.environ.get("LLM_PROMPT_CACHE_MB", 1024))
+LLM_PROMPT_CACHE_DIR = os.environ.get("LLM_PROMPT_CACHE_DIR", "./models/prompt_cache")
+
+# 问答上下文预算：回答最多 LLM_MAX_TOKENS 个token，检索文档最多占 LLM_CONTEXT_TOKENS 个token
+# （同时不超过 MODEL_N_CTX 的剩余空间）；先取 LLM_CONTEXT_CANDIDATES 个候选段落，
+# 相似度不低于 LLM_CONTEXT_DEDUP_THRESHOLD 的近似重复段落只保留一个
+LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", 256))
+LLM_CONTEXT_TOKENS = int(os.environ.get("LLM_CONTEXT_TOKENS", 1024))
+LLM_CONTEXT_CANDIDATES = int(os.environ.get("LLM_CONTEXT_CANDIDATES", 8))
+LLM_CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("LLM_CONTEXT_DEDUP_THRESHOLD", 0.9))
+
+# 语义回答缓存：新问题与已回答问题的向量余弦相似度不低于 ANSWER_CACHE_THRESHOLD、
+# 且来源文件未变化时直接返回缓存的回答；最多保留 ANSWER_CACHE_MAX_ENTRIES 条（0 表示关闭）
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 1000))
+
+# 目录监视：WATCH_DIRS 为逗号分隔的目录列表，非空时服务启动后在后台监视这些目录并增量索引；
+# WATCH_DEBOUNCE_MS 内的文件系统事件合并为一批处理，WATCH_INITIAL_SCAN 控制开始监视前是否先同步一次
+WATCH_DIRS = [path.strip() for path in os.environ.get("WATCH_DIRS", "").split(",") if path.strip()]
+WATCH_DEBOUNCE_MS = int(os.environ.get("WATCH_DEBOUNCE_MS", 1600))
+WATCH_INITIAL_SCAN = os.environ.get("WATCH_INITIAL_SCAN", "true").lower() == "true"
+
+# 近似重复检测（MinHash/LSH）：与已索引文件的估计Jaccard相似度不低于 NEAR_DUP_THRESHOLD 的文件
+# 不再切分和嵌入，只链接到规范文件；搜索结果按重复簇折叠
+NEAR_DUP_ENABLED = os.environ.get("NEAR_DUP_ENABLED", "true").lower() == "true"
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", 0.9))
+
+# 目录范围过滤：每个分块记录所在的前 PATH_INDEX_DEPTH 级目录（path_1 .. path_N）
+PATH_INDEX_DEPTH = int(os.environ.get("PATH_INDEX_DEPTH", 16))
+
+# 索引分片：SHARD_BY 为 none（单个集合）、directory（按 SHARD_ROOT 下的顶级目录）、
+# tenant（按元数据中的 tenant）或 hash（按文件路径哈希到 SHARD_COUNT 个分片）；
+# 检索时最多 SHARD_QUERY_WORKERS 个分片并行查询
+SHARD_BY = os.environ.get("SHARD_BY", "none")
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", 8))
+SHARD_ROOT = os.environ.get("SHARD_ROOT", "")
+SHARD_QUERY_WORKERS = int(os.environ.get("SHARD_QUERY_WORKERS", 8))
+
+# HNSW索引参数：M（每个节点的邻居数）和 construction_ef 只在新建集合时生效，
+# 修改后需要执行 cli.py compact 重建索引；HNSW_SEARCH_EF（查询时的候选数，越大召回率越高、越慢）
+# 在打开已有集合时自动应用
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_CONSTRUCTION_EF = int(os.environ.get("HNSW_CONSTRUCTION_EF", 100))
+HNSW_SEARCH_EF = int(os.environ.get("HNSW_SEARCH_EF", 100))
@@ -0,0 +1,80 @@
+from typing import List, Dict, Any, Callable
+from src.chunking import TOKEN_PATTERN, estimate_tokens
+
+# 判断近似重复时使用的分词n元组长度
+SHINGLE_SIZE = 3
+
+
+def _shingles(text: str) -> set:
+    tokens = [token.lower() for token in TOKEN_PATTERN.findall(text)]
+    if len(tokens) < SHINGLE_SIZE:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def similarity(a: set, b: set) -> float:
+    """两段文本n元组集合的Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def trim_to_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int] = estimate_tokens) -> str:
+    """在词边界处截断文本，使其不超过 max_tokens 个token（二分查找，count_tokens 调用次数为对数级）"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    ends = [m.end() for m in TOKEN_PATTERN.finditer(text)]
+    low, high = 0, len(ends)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:ends[mid - 1]]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:ends[low - 1]] if low else ""
+
+
+def pack_passages(passages: List[Dict[str, Any]], budget: int,
+                  count_tokens: Callable[[str], int] = estimate_tokens,
+                  dedupe_threshold: float = 0.9, min_tokens: int = 32,
+                  separator: str = "\n\n") -> List[Dict[str, Any]]:
+    """在token预算内选择段落
+
+    passages 为带 'content' 和 'score' 的字典列表。段落按得分降序依次选入，
+    与已选段落近似重复（相似度不低于 dedupe_threshold）的段落被跳过；
+    放不下的段落在剩余预算不少于 min_tokens 时截断后放入（'truncated' 为 True）。
+    返回的段落保持得分顺序，用 separator 连接后的总token数不超过 budget。
+    """
+    selected, selected_shingles = [], []
+    remaining = budget
+    separator_tokens = count_tokens(separator)
+
+    for passage in sorted(passages, key=lambda p: p.get('score', 0), reverse=True):
+        if remaining <= 0:
+            break
+        content = passage['content'].strip()
+        if not content:
+            continue
+
+        shingles = _shingles(content)
+        if any(similarity(shingles, other) >= dedupe_threshold for other in selected_shingles):
+            continue
+
+        available = remaining - (separator_tokens if selected else 0)
+        tokens = count_tokens(content)
+        truncated = False
+        if tokens > available:
+            if available < min_tokens:
+                continue
+            content = trim_to_tokens(content, available, count_tokens)
+            tokens = count_tokens(content)
+            truncated = True
+
+        selected.append(dict(passage, content=content, tokens=tokens, truncated=truncated))
+        selected_shingles.append(shingles)
+        remaining = available - tokens
+
+    return selected
@@ -1,66 +1,673 @@
 import os
+import time
 import logging
-from typing import List, Dict, Any
-from src.file_loader import load_file
+import threading
+from typing import List, Dict, Any, Optional, Iterable
+from src.config import (
+    INGEST_WORKERS,
+    INGEST_BATCH_SIZE,
+    INGEST_QUEUE_SIZE,
+    CHUNK_SIZE_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    STREAM_THRESHOLD_MB,
+    STREAM_WINDOW,
+    NEAR_DUP_ENABLED,
+    NEAR_DUP_THRESHOLD,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF
+)
+from src.chunking import chunk_document
+from src.file_loader import iter_file, supports_streaming, always_streams
+from src.ingest_pipeline import IngestPipeline, load_document
 from src.indexer.chroma_index import (
     get_chroma_client,
     get_or_create_collection,
-    add_document,
     add_documents,
-    count_documents
+    delete_documents,
+    count_documents,
+    filter_metadata,
+    hnsw_metadata,
+    embedding_model_key,
+    reset_index
+)
+from src.indexer.compaction import compact_collection, index_size, vacuum_index, REBUILT_FROM_KEY
+from src.indexer import snapshot as snapshots
+from src.indexer.manifest import (
+    IndexManifest,
+    file_doc_id,
+    file_digest,
+    normalize_path,
+    upload_path,
+    is_upload_path
 )
+from src.indexer.lexical_index import LexicalIndex
+from src.indexer.near_duplicates import NearDuplicateIndex, StreamingMinHash, minhash, estimate_similarity
+
+# 默认索引的文件扩展名
+DEFAULT_EXTENSIONS = ['.txt', '.pdf', '.docx', '.xlsx', '.xls', '.pptx']
 
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, chunk_size: int = None, chunk_overlap: int = None):
+        self.chunk_size = CHUNK_SIZE_TOKENS if chunk_size is None else chunk_size
+        self.chunk_overlap = CHUNK_OVERLAP_TOKENS if chunk_overlap is None else chunk_overlap
         self.client = get_chroma_client()
         self.collection = get_or_create_collection(self.client)
+        collection_id = str(self.collection.id)
+        # 未分片的集合重建（压缩索引）后ID改变，中断后恢复的集合记录了原集合ID
+        rebuilt_from = (self.collection.metadata or {}).get(REBUILT_FROM_KEY)
+        self.manifest = IndexManifest(collection_id=collection_id, rebuilt_from=rebuilt_from)
+        self.lexical_index = LexicalIndex(collection_id=collection_id, rebuilt_from=rebuilt_from)
+        self.near_duplicates = NearDuplicateIndex(collection_id=collection_id, rebuilt_from=rebuilt_from)
+        self.last_ingest_stats = {}
+        # 规范文件变化或删除后，需要重新处理的原近似重复文件
+        self._orphans = set()
+        self._orphans_lock = threading.Lock()
+        # 写锁：目录监视、上传和后台任务等线程共用同一个处理器时，写入索引、清单和近似重复索引的操作依次执行
+        # （可重入：process_directory 调用 process_files，drop_shard 调用 remove_files）
+        self.write_lock = threading.RLock()
+        self._backfill_lexical_index()
+        self._backfill_filter_metadata()
+
+    def _backfill_lexical_index(self, page_size: int = 1000):
+        """词法索引为空而集合中已有分块时（如升级前建立的索引），从集合中重建词法索引"""
+        total = count_documents(self.collection)
+        if total == 0 or len(self.lexical_index) > 0:
+            return
+
+        logging.info(f"Building lexical index for {total} existing chunks")
+        for offset in range(0, total, page_size):
+            page = self.collection.get(limit=page_size, offset=offset, include=["documents"])
+            self.lexical_index.add(zip(page['ids'], page['documents']))
+
+    def _backfill_filter_metadata(self, page_size: int = 1000):
+        """为升级前建立的索引补写过滤用的元数据（扩展名、各级目录），只更新元数据，不重新嵌入"""
+        sample = self.collection.get(limit=1, include=["metadatas"])
+        if not sample['ids']:
+            return
+        metadata = sample['metadatas'][0] or {}
+        if not metadata.get('file_path') or 'extension' in metadata:
+            return
+
+        logging.info("Adding filter metadata to existing chunks")
+        for offset in range(0, count_documents(self.collection), page_size):
+            page = self.collection.get(limit=page_size, offset=offset, include=["metadatas"])
+            ids, metadatas = [], []
+            for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+                if metadata and metadata.get('file_path') and 'extension' not in metadata:
+                    ids.append(chunk_id)
+                    metadatas.append(dict(metadata, **filter_metadata(str(metadata['file_path']))))
+            if ids:
+                self.collection.update(ids=ids, metadatas=metadatas)
+
+    def _add_chunks(self, chunks: List[Dict[str, Any]]) -> List[str]:
+        """把分块同时写入向量索引和词法索引"""
+        ids = add_documents(self.collection, chunks, [chunk['id'] for chunk in chunks])
+        self.lexical_index.add((chunk['id'], chunk['content']) for chunk in chunks)
+        return ids
+
+    def _delete_chunks(self, chunk_ids: List[str]):
+        """从向量索引和词法索引中删除分块"""
+        delete_documents(self.collection, chunk_ids)
+        self.lexical_index.delete(chunk_ids)
+
+    def process_file(self, file_path: str, metadata: Dict[str, Any] = None,
+                     source_path: str = None) -> Dict[str, Any]:
+        """处理单个文件并添加到索引（文件未变化时跳过）
+
+        metadata 为附加的元数据（如上传文件的原始文件名），会写入每个分块。
+        source_path 为实际读取的文件（如上传的暂存文件），此时 file_path 只作为清单和元数据中的路径。
+        """
+        with self.write_lock:
+            result = self._index_file(file_path, metadata, source_path)
+            self._reindex_orphans()
+            self.manifest.save()
+            return result
 
-    def process_file(self, file_path: str) -> Dict[str, Any]:
-        """处理单个文件并添加到索引"""
+    def process_upload(self, spool_path: str, filename: str, metadata: Dict[str, Any] = None,
+                       digest: str = None) -> Dict[str, Any]:
+        """索引上传的暂存文件，清单和元数据使用稳定的逻辑路径 upload_path(摘要, 原始文件名)"""
+        digest = digest or file_digest(spool_path)
+        metadata = dict(metadata or {}, filename=filename)
+        return self.process_file(upload_path(digest, filename), metadata, source_path=spool_path)
+
+    def _index_file(self, file_path: str, metadata: Dict[str, Any] = None,
+                    source_path: str = None) -> Dict[str, Any]:
+        source_path = source_path or file_path
         try:
+            skipped = self._check_unchanged(file_path, source_path)
+            if skipped is not None:
+                return skipped
+
             logging.info(f"Processing file: {file_path}")
 
-            # 加载文件内容
-            document = load_file(file_path)
+            if self._should_stream(source_path):
+                return self._stream_file(file_path, metadata, source_path)
 
-            # 添加元数据
+            # 加载文件内容并添加元数据
+            document = load_document(source_path)
             document['metadata']['file_path'] = file_path
-            document['metadata']['file_size'] = os.path.getsize(file_path)
+            document['metadata'].update(metadata or {})
 
             # 添加到索引
-            doc_id = add_document(self.collection, document)
+            return self._write_documents([document])[0]
 
-            result = {
+        except Exception as e:
+            logging.error(f"Error processing file {file_path}: {str(e)}")
+            return {
+                'status': 'error',
+                'error': str(e),
+                'file_path': file_path
+            }
+
+    def _check_unchanged(self, file_path: str, source_path: str = None) -> Optional[Dict[str, Any]]:
+        """根据清单中的大小和修改时间判断文件是否未变化，未变化时返回跳过结果"""
+        stat = os.stat(source_path or file_path)
+        if not self.manifest.is_unchanged(file_path, stat.st_size, stat.st_mtime):
+            return None
+
+        return {
+            'status': 'skipped',
+            'doc_id': file_doc_id(file_path),
+            'file_path': file_path
+        }
+
+    def _write_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """将已加载的文档切分为分块并写入索引
+
+        内容摘要未变化的文件只更新清单（标记为 unchanged）；内容已变化的文件先删除旧分块再写入。
+        与已索引文件（或同一批次中的文件）近似重复的文件不切分、不嵌入，
+        只在清单中链接到规范文件（结果中带 'duplicate_of'）。
+        加载失败的文件（status 为 'error'）不写入分块也不记入清单，下次处理时会重试。
+        每批写入后保存清单，运行中断时已写入的批次不会在下次运行中重新嵌入。
+        """
+        results = []
+        to_add = []
+        # 本批次新写入的规范文件签名，写入成功后才加入近似重复索引
+        signatures = {}
+        for document in documents:
+            metadata = document['metadata']
+            file_path = metadata['file_path']
+            if document.get('status') == 'error':
+                logging.error(f"Error loading file {file_path}: {document['content']}")
+                results.append({'status': 'error', 'error': document['content'], 'file_path': file_path})
+                continue
+
+            digest = metadata['content_hash']
+            entry = self.manifest.get(file_path)
+
+            if entry and entry['digest'] == digest:
+                self.manifest.update(file_path, metadata['file_size'], metadata['file_mtime'],
+                                     digest, entry['chunk_ids'], entry.get('duplicate_of'))
+                results.append({
+                    'status': 'success',
+                    'unchanged': True,
+                    'doc_id': file_doc_id(file_path),
+                    'chunk_ids': entry['chunk_ids'],
+                    'file_path': file_path,
+                    'document': document
+                })
+                continue
+
+            if entry:
+                self._delete_chunks(entry['chunk_ids'])
+                self._release_canonical(file_path, entry)
+
+            scope = self._duplicate_scope(metadata)
+            canonical, signature = self._find_canonical(file_path, document['content'], scope, signatures)
+            if canonical is not None:
+                results.append({
+                    'status': 'success',
+                    'doc_id': file_doc_id(file_path),
+                    'duplicate_of': canonical,
+                    'chunk_ids': [],
+                    'file_path': file_path,
+                    'document': document
+                })
+                continue
+            if signature is not None:
+                signatures[normalize_path(file_path)] = (signature, scope)
+
+            doc_id = file_doc_id(file_path)
+            chunks = chunk_document(document, doc_id, self.chunk_size, self.chunk_overlap)
+            to_add.extend(chunks)
+            results.append({
                 'status': 'success',
                 'doc_id': doc_id,
+                'chunk_ids': [chunk['id'] for chunk in chunks],
+                'file_path': file_path,
                 'document': document
-            }
+            })
 
-            return result
+        if to_add:
+            self._add_chunks(to_add)
+        for path, (signature, scope) in signatures.items():
+            self.near_duplicates.add(path, signature, scope)
+        for result in results:
+            if result['status'] != 'success' or result.get('unchanged'):
+                continue
+            metadata = result['document']['metadata']
+            self.manifest.update(metadata['file_path'], metadata['file_size'], metadata['file_mtime'],
+                                 metadata['content_hash'], result['chunk_ids'], result.get('duplicate_of'))
+        self.manifest.save()
+
+        return results
 
+    def _duplicate_scope(self, metadata: Dict[str, Any]) -> str:
+        """近似重复的链接范围：同一分片、同一目录、同一扩展名
+
+        近似重复文件不写入向量索引，只能由规范文件的分块代表；规范文件与它位于同一分片、
+        同一目录且扩展名相同时，按目录前缀或扩展名过滤、只检索部分分片（租户视图）都不会漏掉它。
+        """
+        file_path = metadata['file_path']
+        scope = f"{os.path.dirname(normalize_path(file_path))}|{os.path.splitext(file_path)[1].lower()}"
+        if hasattr(self.collection, 'key_for'):
+            scope = f"{self.collection.key_for(metadata)}|{scope}"
+        return scope
+
+    def _detects_duplicates(self, file_path: str) -> bool:
+        # 上传文件处理后暂存文件即被删除，规范文件变化时无法重新读取，始终写入自身的分块
+        return NEAR_DUP_ENABLED and not is_upload_path(file_path)
+
+    def _find_canonical(self, file_path: str, content: Optional[str], scope: str, pending: Dict[str, Any],
+                        signature=None):
+        """查找同一链接范围内内容近似重复的规范文件，返回 (规范文件路径或 None, MinHash签名或 None)
+
+        流式处理的文件不传入内容，而是传入逐段累计的签名 signature。
+        """
+        if not self._detects_duplicates(file_path):
+            return None, None
+        if signature is None and content is not None:
+            signature = minhash(content)
+        if signature is None:
+            return None, None
+
+        path = normalize_path(file_path)
+        for other, (other_signature, other_scope) in pending.items():
+            if other_scope == scope and estimate_similarity(signature, other_signature) >= NEAR_DUP_THRESHOLD:
+                return other, signature
+
+        canonical = self.near_duplicates.find(signature, NEAR_DUP_THRESHOLD, exclude=path, scope=scope)
+        if canonical is not None and self.manifest.get(canonical) is None:
+            # 规范文件已不在清单中（如中途写入失败），丢弃过期的签名
+            self.near_duplicates.delete([canonical])
+            canonical = None
+        return canonical, signature
+
+    def _release_canonical(self, file_path: str, entry: Dict[str, Any]):
+        """规范文件的内容变化或被删除：移除其签名，链接到它的近似重复文件稍后重新处理"""
+        if entry.get('duplicate_of'):
+            return
+        self.near_duplicates.delete([normalize_path(file_path)])
+        duplicates = self.manifest.duplicates_of(file_path)
+        if duplicates:
+            with self._orphans_lock:
+                self._orphans.update(duplicates)
+
+    def _reindex_orphans(self):
+        """重新处理失去规范文件的近似重复文件（其中第一个成为新的规范文件，其余重新链接）"""
+        while True:
+            with self._orphans_lock:
+                orphans = sorted(self._orphans)
+                self._orphans.clear()
+            if not orphans:
+                return
+            logging.info(f"Reindexing {len(orphans)} files whose canonical copy changed")
+            for file_path in orphans:
+                # 先从清单中移除，否则文件大小和修改时间未变会被跳过
+                self.manifest.remove(file_path)
+                if os.path.exists(file_path):
+                    self._index_file(file_path)
+
+    def collapse_duplicates(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按重复簇折叠搜索结果：每个簇只保留得分最高的命中，并在 'duplicates' 中列出簇内的其他文件"""
+        collapsed, seen = [], set()
+        for hit in hits:
+            file_path = (hit.get('metadata') or {}).get('file_path')
+            if not file_path:
+                collapsed.append(hit)
+                continue
+            canonical = self.manifest.canonical_of(file_path)
+            if canonical in seen:
+                continue
+            seen.add(canonical)
+            members = [canonical] + self.manifest.duplicates_of(canonical)
+            hit['duplicates'] = [path for path in members if path != normalize_path(file_path)]
+            collapsed.append(hit)
+        return collapsed
+
+    def _write_batch(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量写入文档，写入失败时整批记为错误"""
+        try:
+            return self._write_documents(documents)
         except Exception as e:
-            logging.error(f"Error processing file {file_path}: {str(e)}")
-            return {
-                'status': 'error',
-                'error': str(e),
+            logging.error(f"Error writing batch of {len(documents)} documents: {str(e)}")
+            return [
+                {'status': 'error', 'error': str(e), 'file_path': document['metadata']['file_path']}
+                for document in documents
+            ]
+
+    def _should_stream(self, file_path: str) -> bool:
+        """超过阈值且加载器支持流式输出的文件（以及 .xlsx 等总是流式加载的文件）走流式写入"""
+        if not supports_streaming(file_path):
+            return False
+        return always_streams(file_path) or os.path.getsize(file_path) >= STREAM_THRESHOLD_MB * 1024 * 1024
+
+    def _stream_file(self, file_path: str, metadata: Dict[str, Any] = None,
+                     source_path: str = None) -> Dict[str, Any]:
+        """流式加载并写入大文件：逐段切分，每累计 STREAM_WINDOW 段批量写入一次
+
+        内存占用只与窗口大小有关，与文件大小无关。source_path 为实际读取的文件（默认为 file_path）。
+        写入时逐段累计MinHash签名，全部写入后与小文件相同地查找近似重复的规范文件；
+        找到时删除已写入的分块，只在清单中链接到规范文件。
+        """
+        source_path = source_path or file_path
+        stat = os.stat(source_path)
+        digest = file_digest(source_path)
+        doc_id = file_doc_id(file_path)
+        entry = self.manifest.get(file_path)
+
+        if entry and entry['digest'] == digest:
+            self.manifest.update(file_path, stat.st_size, stat.st_mtime, digest, entry['chunk_ids'],
+                                 entry.get('duplicate_of'))
+            result = {
+                'status': 'success',
+                'unchanged': True,
+                'doc_id': doc_id,
+                'chunk_ids': entry['chunk_ids'],
                 'file_path': file_path
             }
+            if entry.get('duplicate_of'):
+                result['duplicate_of'] = entry['duplicate_of']
+            return result
+
+        if entry:
+            self._delete_chunks(entry['chunk_ids'])
+            self._release_canonical(file_path, entry)
+
+        file_metadata = {
+            'file_path': file_path,
+            'file_size': stat.st_size,
+            'file_mtime': stat.st_mtime,
+            'content_hash': digest
+        }
+        file_metadata.update(metadata or {})
+        chunk_ids, window, window_sections = [], [], 0
+        sketch = StreamingMinHash() if self._detects_duplicates(file_path) else None
+        try:
+            for section in iter_file(source_path, max_tokens=self.chunk_size):
+                if sketch is not None:
+                    sketch.update(section['content'])
+                section['metadata'] = dict(section.get('metadata', {}), **file_metadata)
+                window.extend(chunk_document(section, doc_id, self.chunk_size, self.chunk_overlap,
+                                             start_index=len(chunk_ids) + len(window)))
+                window_sections += 1
+
+                if window_sections >= STREAM_WINDOW:
+                    chunk_ids.extend(self._add_chunks(window))
+                    window, window_sections = [], 0
+
+            if window:
+                chunk_ids.extend(self._add_chunks(window))
+
+        except Exception:
+            # 写入中途失败时删除已写入的分块，避免索引中残留不完整的文件
+            self._delete_chunks(chunk_ids)
+            raise
+
+        scope = self._duplicate_scope(file_metadata)
+        canonical, signature = self._find_canonical(
+            file_path, None, scope, {}, signature=sketch.signature() if sketch is not None else None
+        )
+        if canonical is not None:
+            self._delete_chunks(chunk_ids)
+            self.manifest.update(file_path, stat.st_size, stat.st_mtime, digest, [], canonical)
+            self.manifest.save()
+            logging.info(f"Linked streamed file {file_path} to near-duplicate {canonical}")
+            return {'status': 'success', 'doc_id': doc_id, 'duplicate_of': canonical,
+                    'chunk_ids': [], 'file_path': file_path}
+        if signature is not None:
+            self.near_duplicates.add(normalize_path(file_path), signature, scope)
+
+        self.manifest.update(file_path, stat.st_size, stat.st_mtime, digest, chunk_ids)
+        self.manifest.save()
+        logging.info(f"Streamed {len(chunk_ids)} chunks from {file_path}")
+        return {'status': 'success', 'doc_id': doc_id, 'chunk_ids': chunk_ids, 'file_path': file_path}
+
+    def remove_file(self, file_path: str) -> bool:
+        """从索引中删除文件的所有分块"""
+        return bool(self.remove_files([file_path]))
+
+    def remove_files(self, file_paths: List[str]) -> List[str]:
+        """从索引中批量删除文件（所有分块合并为一次删除），返回实际删除的文件路径"""
+        with self.write_lock:
+            removed, chunk_ids = [], []
+            for file_path in file_paths:
+                entry = self.manifest.remove(file_path)
+                if entry is not None:
+                    removed.append(file_path)
+                    chunk_ids.extend(entry['chunk_ids'])
+                    self._release_canonical(file_path, entry)
+            self._delete_chunks(chunk_ids)
+            self._reindex_orphans()
+            return removed
+
+    def drop_shard(self, key: str) -> List[str]:
+        """删除一个索引分片：分片中的文件先从清单和词法索引中删除，再删除分片集合，返回删除的文件路径"""
+        with self.write_lock:
+            if not hasattr(self.collection, 'drop_shard'):
+                raise ValueError("索引未启用分片（SHARD_BY=none）")
+            if key not in self.collection.shard_names():
+                raise ValueError(f"分片不存在: {key}")
+            metadatas = self.collection.view([key]).get(include=['metadatas'])['metadatas']
+            removed = self.remove_files(sorted({m['file_path'] for m in metadatas if m and m.get('file_path')}))
+            self.collection.drop_shard(key)
+            self.manifest.save()
+            logging.info(f"Dropped index shard {key} ({len(removed)} files)")
+            return removed
+
+    def reset(self):
+        """清空索引（用于测试）：重新创建集合，清单、词法索引和近似重复索引清空后关联新的集合ID"""
+        with self.write_lock:
+            self.collection = reset_index(self.client)
+            collection_id = str(self.collection.id)
+            self.manifest.replace({})
+            self.manifest.rebind(collection_id)
+            self.lexical_index.clear()
+            self.lexical_index.rebind(collection_id)
+            self.near_duplicates.clear()
+            self.near_duplicates.rebind(collection_id)
+            with self._orphans_lock:
+                self._orphans.clear()
+
+    def purge_missing(self, dir_path: str = None) -> List[str]:
+        """清除清单中已从磁盘删除的文件（上传文件的逻辑路径不对应磁盘文件，不会被清除）"""
+        with self.write_lock:
+            removed = self.remove_files([
+                file_path for file_path in self.manifest.paths(dir_path)
+                if not is_upload_path(file_path) and not os.path.exists(file_path)
+            ])
 
-    def process_directory(self, dir_path: str, extensions: List[str] = None) -> List[Dict[str, Any]]:
-        """处理目录下的所有文件并添加到索引"""
+            if removed:
+                logging.info(f"Purged {len(removed)} deleted files from index")
+            return removed
+
+    def process_directory(self, dir_path: str, extensions: List[str] = None,
+                          workers: int = None, batch_size: int = None,
+                          metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """处理目录下的所有文件并添加到索引
+
+        workers 大于1时使用多进程流水线（并行解析、批量写入）。
+        未变化的文件会被跳过，已删除的文件会从索引中清除。
+        metadata 为附加到每个文件的元数据（如分片使用的 tenant）。
+        """
+        with self.write_lock:
+            results = self.process_files(self._iter_files(dir_path, extensions), workers, batch_size, metadata)
+            self.last_ingest_stats['purged'] = len(self.purge_missing(dir_path))
+            self.manifest.save()
+            return results
+
+    def process_files(self, file_paths: Iterable[str], workers: int = None,
+                      batch_size: int = None, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """处理一组文件并添加到索引（未变化的文件会被跳过），统计信息记录在 last_ingest_stats 中
+
+        单进程模式下同样按 batch_size 个文档一批写入索引，大量文件同时变化时不会逐个文件写入。
+        """
+        with self.write_lock:
+            workers = INGEST_WORKERS if workers is None else workers
+            batch_size = batch_size or INGEST_BATCH_SIZE
+
+            def write_batch(documents):
+                for document in documents:
+                    document['metadata'].update(metadata or {})
+                return self._write_documents(documents)
+
+            if workers > 1:
+                pipeline = IngestPipeline(
+                    write_batch,
+                    workers=workers,
+                    batch_size=batch_size,
+                    queue_size=INGEST_QUEUE_SIZE,
+                    check_skip=self._check_unchanged,
+                    stream_filter=self._should_stream,
+                    stream_file=lambda file_path: self._stream_file(file_path, metadata)
+                )
+                results = pipeline.run(file_paths)
+                self.last_ingest_stats = pipeline.stats
+            else:
+                start = time.perf_counter()
+                results, batch = [], []
+                for file_path in file_paths:
+                    try:
+                        skipped = self._check_unchanged(file_path)
+                        if skipped is not None:
+                            results.append(skipped)
+                        elif self._should_stream(file_path):
+                            results.append(self._stream_file(file_path, metadata))
+                        else:
+                            logging.info(f"Processing file: {file_path}")
+                            document = load_document(file_path)
+                            document['metadata'].update(metadata or {})
+                            batch.append(document)
+                    except Exception as e:
+                        logging.error(f"Error processing file {file_path}: {str(e)}")
+                        results.append({'status': 'error', 'error': str(e), 'file_path': file_path})
+
+                    if len(batch) >= batch_size:
+                        results.extend(self._write_batch(batch))
+                        batch = []
+                if batch:
+                    results.extend(self._write_batch(batch))
+                elapsed = time.perf_counter() - start
+                self.last_ingest_stats = {
+                    'files': len(results),
+                    'indexed': sum(1 for r in results if r['status'] == 'success'),
+                    'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+                    'errors': sum(1 for r in results if r['status'] == 'error'),
+                    'elapsed': elapsed,
+                    'files_per_sec': len(results) / elapsed if elapsed > 0 else 0.0
+                }
+
+            self._reindex_orphans()
+            self.manifest.save()
+            return results
+
+    @staticmethod
+    def _iter_files(dir_path: str, extensions: List[str] = None):
+        """遍历目录，产出匹配扩展名的文件路径"""
         if extensions is None:
-            extensions = ['.txt', '.pdf', '.docx', '.xlsx', '.xls', '.pptx']
+            extensions = DEFAULT_EXTENSIONS
 
-        results = []
         for root, _, files in os.walk(dir_path):
             for file in files:
                 if any(file.lower().endswith(ext) for ext in extensions):
-                    file_path = os.path.join(root, file)
-                    result = self.process_file(file_path)
-                    results.append(result)
+                    yield os.path.join(root, file)
 
-        return results
+    def compact(self, m: int = HNSW_M, construction_ef: int = HNSW_CONSTRUCTION_EF,
+                search_ef: int = HNSW_SEARCH_EF, batch_size: int = None) -> Dict[str, Any]:
+        """用已存储的向量重建向量索引（不重新嵌入），应用HNSW参数并回收删除和更新留下的空间
+
+        重建期间不应有其他进程写入索引（服务运行时启用分片的索引重建后可调用 /shards/reload）。
+        """
+        with self.write_lock:
+            size_before = index_size()
+            start = time.perf_counter()
+            self.collection = compact_collection(
+                self.client, self.collection, hnsw_metadata(m, construction_ef, search_ef), batch_size
+            )
+            # 未分片的集合重建后ID改变，清单、词法索引和近似重复索引改为关联新的集合ID
+            collection_id = str(self.collection.id)
+            self.manifest.rebind(collection_id)
+            self.lexical_index.rebind(collection_id)
+            self.near_duplicates.rebind(collection_id)
+            vacuum_index()
+            return {
+                'chunks': count_documents(self.collection),
+                'elapsed': time.perf_counter() - start,
+                'size_before': size_before,
+                'size_after': index_size()
+            }
+
+    def snapshot(self, path: str, full: bool = False) -> Dict[str, Any]:
+        """导出索引快照（向量、内容、元数据、文件清单和近似重复签名），已有快照时增量追加"""
+        with self.write_lock:
+            self.manifest.save()
+            return snapshots.create_snapshot(
+                self.collection, path, full,
+                files=self.manifest.entries(),
+                signatures=self.near_duplicates.signatures()
+            )
+
+    def restore(self, path: str, batch_size: int = None) -> Dict[str, Any]:
+        """从快照恢复索引，直接写入快照中的向量而不调用嵌入模型
+
+        只能恢复到空索引，或继续恢复本地上次恢复过的同一快照（只应用之后新增的增量部分）。
+        """
+        with self.write_lock:
+            start = time.perf_counter()
+            info = snapshots.read_snapshot(path)
+            if info is None:
+                raise ValueError(f"目录中没有快照: {path}")
+            if info['model'] != list(embedding_model_key(self.collection)):
+                raise ValueError(f"快照的嵌入模型 {info['model']} 与当前配置不一致，无法直接使用其中的向量")
+
+            state = snapshots.load_restore_state()
+            applied = []
+            if state.get('snapshot_id') == info['id'] and state.get('collection_id') == str(self.collection.id):
+                applied = state['parts']
+            elif count_documents(self.collection) > 0:
+                raise ValueError("索引不为空：只能恢复到空索引，或继续恢复上次恢复过的同一快照")
+
+            chunks = deleted = 0
+            parts = [part['name'] for part in info['parts'] if part['name'] not in applied]
+            for part in parts:
+                result = snapshots.apply_part(self.collection, path, part, batch_size, self.lexical_index)
+                chunks += result['chunks']
+                deleted += result['deleted']
+                applied.append(part)
+                snapshots.save_restore_state({
+                    'snapshot_id': info['id'],
+                    'collection_id': str(self.collection.id),
+                    'parts': applied
+                })
+                logging.info(f"Restored snapshot part {part}: {result['chunks']} chunks, {result['deleted']} deleted")
+
+            files = snapshots.read_files(path)
+            if files is not None:
+                self.manifest.replace(files)
+            self.near_duplicates.clear()
+            for file_path, signature, scope in snapshots.read_signatures(path):
+                self.near_duplicates.add(file_path, signature, scope)
+
+            return {
+                'snapshot_id': info['id'],
+                'parts': parts,
+                'chunks': chunks,
+                'deleted': deleted,
+                'total_chunks': count_documents(self.collection),
+                'elapsed': time.perf_counter() - start
+            }
 
     def get_document_count(self) -> int:
         """获取索引中的文档数量"""
@@ -1,19 +1,31 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 from .txt_loader import load_txt
-from .pdf_loader import load_pdf
+from .pdf_loader import load_pdf, iter_pdf_pages
 from .docx_loader import load_docx
-from .excel_loader import load_excel
+from .excel_loader import load_excel, iter_excel_blocks
+from .ppt_loader import load_ppt
+
+# 支持流式输出（逐页/逐块产出文档片段）的加载器，参数为 (文件路径, max_tokens)
+STREAMING_LOADERS = {
+    # PDF按页产出，页面在分块时再按token切分
+    '.pdf': lambda file_path, max_tokens=None: iter_pdf_pages(file_path),
+    '.xlsx': iter_excel_blocks,
+    '.xls': iter_excel_blocks
+}
+# 不论文件大小总是流式加载的类型：.xlsx 是压缩格式，文件很小时也可能包含大量行
+ALWAYS_STREAM = ('.xlsx',)
 
 def load_file(file_path: str) -> Dict[str, Any]:
-    if file_path.endswith('.txt'):
+    lower_path = file_path.lower()
+    if lower_path.endswith('.txt'):
         return load_txt(file_path)
-    elif file_path.endswith('.pdf'):
+    elif lower_path.endswith('.pdf'):
         return load_pdf(file_path)
-    elif file_path.endswith('.docx'):
+    elif lower_path.endswith('.docx'):
         return load_docx(file_path)
-    elif file_path.endswith(('.xlsx', '.xls')):
+    elif lower_path.endswith(('.xlsx', '.xls')):
         return load_excel(file_path)
-    elif file_path.endswith('.pptx'):
+    elif lower_path.endswith('.pptx'):
         return load_ppt(file_path)
     else:
         return {
@@ -22,4 +34,26 @@ def load_file(file_path: str) -> Dict[str, Any]:
             'size': 0,
             'status': 'error',
             'metadata': {}
-        }
\ No newline at end of file
+        }
+
+
+def supports_streaming(file_path: str) -> bool:
+    """判断文件类型是否支持流式加载"""
+    return any(file_path.lower().endswith(ext) for ext in STREAMING_LOADERS)
+
+
+def always_streams(file_path: str) -> bool:
+    """判断文件类型是否不论大小都走流式加载"""
+    return file_path.lower().endswith(ALWAYS_STREAM)
+
+
+def iter_file(file_path: str, max_tokens: int = None) -> Iterator[Dict[str, Any]]:
+    """流式加载文件，逐段产出文档片段（内存占用与文件大小无关）
+
+    max_tokens 为分块的token上限，Excel行块按它控制大小（默认使用 CHUNK_SIZE_TOKENS）。
+    只支持 supports_streaming() 为真的文件类型。
+    """
+    for ext, loader in STREAMING_LOADERS.items():
+        if file_path.lower().endswith(ext):
+            return loader(file_path, max_tokens=max_tokens)
+    raise ValueError(f"不支持流式加载的文件类型: {file_path}")
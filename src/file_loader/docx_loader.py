@@ -9,6 +9,7 @@ def load_docx(file_path: str) -> Dict[str, Any]:
         doc = Document(file_path)
         result = {
             'content': '',
+            'type': 'docx',
             'metadata': {
                 'title': doc.core_properties.title or '',
                 'author': doc.core_properties.author or '',
@@ -44,6 +45,7 @@ def load_docx(file_path: str) -> Dict[str, Any]:
         logging.error(f"Error loading DOCX {file_path}: {str(e)}")
         return {
             'content': f"Error: {str(e)}",
+            'type': 'docx',
             'metadata': {},
             'sections': [],
             'size': 0,
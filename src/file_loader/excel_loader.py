@@ -1,71 +1,136 @@
 import logging
 import pandas as pd
-from typing import List, Dict, Any
+from openpyxl import load_workbook
+from typing import List, Dict, Any, Iterator, Tuple
+from src.config import EXCEL_BLOCK_ROWS, CHUNK_SIZE_TOKENS
+from src.chunking import estimate_tokens
+
+
+def _format_row(values) -> str:
+    """把一行单元格格式化为制表符分隔的文本（去掉行尾空单元格）"""
+    cells = ['' if v is None else str(v) for v in values]
+    while cells and cells[-1] == '':
+        cells.pop()
+    return "\t".join(cells)
+
+
+def _iter_sheets(file_path: str) -> Iterator[Tuple[str, Iterator[tuple]]]:
+    """逐个工作表产出 (工作表名, 行迭代器)
+
+    .xlsx 以只读模式逐行读取；旧版 .xls（openpyxl 不支持）通过 pandas 按工作表整表读取，
+    该格式本身限制每个工作表最多65536行，单个工作表的内存占用有上限。
+    """
+    if file_path.lower().endswith('.xlsx'):
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield sheet.title, sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+        return
+
+    with pd.ExcelFile(file_path) as xls:
+        for sheet_name in xls.sheet_names:
+            df = xls.parse(sheet_name, header=None, dtype=object)
+            yield str(sheet_name), (
+                tuple(None if pd.isna(v) else v for v in row) for row in df.itertuples(index=False, name=None)
+            )
+
+
+def iter_excel_blocks(file_path: str, block_rows: int = None, max_tokens: int = None) -> Iterator[Dict[str, Any]]:
+    """逐行读取 .xlsx/.xls，按固定行数产出行块，每个行块都重复表头
+
+    行块同时受 block_rows 行数和 max_tokens token预算限制，使每个行块恰好构成一个分块；
+    任意时刻只持有一个行块，内存占用与工作表行数无关。没有数据行的工作表产出一个“空表”行块。
+    """
+    block_rows = block_rows or EXCEL_BLOCK_ROWS
+    max_tokens = CHUNK_SIZE_TOKENS if max_tokens is None else max_tokens
+
+    for sheet_title, rows in _iter_sheets(file_path):
+        header = next(rows, None)
+        if header is None:
+            yield _empty_block(sheet_title)
+            continue
+
+        header_line = _format_row(header)
+        # 标记行（含行号范围）与表头在每个行块中都会出现
+        fixed_tokens = estimate_tokens(f"[工作表 '{sheet_title}'] 行 0-0\n{header_line}")
+
+        block, block_tokens, start_row, end_row = [], 0, 0, 0
+        for row_number, values in enumerate(rows, start=2):
+            line = _format_row(values)
+            if not line:
+                continue
+            line_tokens = estimate_tokens(line)
+
+            if block and (len(block) >= block_rows
+                          or (max_tokens > 0 and fixed_tokens + block_tokens + line_tokens > max_tokens)):
+                yield _make_block(sheet_title, header_line, block, start_row, end_row)
+                block, block_tokens = [], 0
+
+            if not block:
+                start_row = row_number
+            block.append(line)
+            block_tokens += line_tokens
+            end_row = row_number
+
+        if block:
+            yield _make_block(sheet_title, header_line, block, start_row, end_row)
+        elif not end_row:
+            yield _empty_block(sheet_title)
+
+
+def _make_block(sheet_name: str, header_line: str, lines: List[str], start_row: int, end_row: int) -> Dict[str, Any]:
+    content = f"[工作表 '{sheet_name}'] 行 {start_row}-{end_row}\n{header_line}\n" + "\n".join(lines)
+    return {
+        'content': content,
+        'type': 'excel',
+        'status': 'success',
+        'metadata': {'sheet': sheet_name, 'row_start': start_row, 'row_end': end_row}
+    }
+
+
+def _empty_block(sheet_name: str) -> Dict[str, Any]:
+    return {
+        'content': f"[工作表 '{sheet_name}']\n空表",
+        'type': 'excel',
+        'status': 'success',
+        'metadata': {'sheet': sheet_name, 'row_start': 0, 'row_end': 0}
+    }
 
 
 def load_excel(file_path: str) -> Dict[str, Any]:
+    """读取完整的 .xlsx/.xls（无行数上限），内容由带表头的行块组成"""
     try:
-        xls = pd.ExcelFile(file_path)
-        sheet_names = xls.sheet_names
+        sheets = {}
+        blocks = []
+        for block in iter_excel_blocks(file_path):
+            name = block['metadata']['sheet']
+            sheet = sheets.setdefault(name, {'name': name, 'stats': {'rows': 0}, 'preview': ''})
+            sheet['stats']['rows'] = max(0, block['metadata']['row_end'] - 1)
+            if not sheet['preview']:
+                sheet['preview'] = block['content'][:500]  # 前500个字符预览
+            blocks.append(block['content'])
 
-        result = {
-            'content': '',
+        content = "\n\n\n".join(blocks)
+        sheet_names = list(sheets)
+        return {
+            'content': content,
+            'type': 'excel',
             'metadata': {
                 'sheet_names': sheet_names,
                 'num_sheets': len(sheet_names)
             },
-            'sheets': []
+            'sheets': list(sheets.values()),
+            'size': len(content),
+            'status': 'success'
         }
 
-        all_sheets_content = []
-
-        for sheet_name in sheet_names:
-            try:
-                # 尝试读取前1000行（避免内存溢出）
-                df = xls.parse(sheet_name, nrows=1000)
-
-                # 处理空表
-                if df.empty:
-                    sheet_content = f"[工作表 '{sheet_name}']\n空表"
-                else:
-                    # 获取基本统计信息
-                    sheet_stats = {
-                        'rows': len(df),
-                        'columns': list(df.columns),
-                        'dtypes': {col: str(df[col].dtype) for col in df.columns}
-                    }
-
-                    # 转换为CSV格式（保留结构）
-                    csv_content = df.to_csv(sep='\t', na_rep='nan')
-
-                    sheet_content = (
-                        f"[工作表 '{sheet_name}']\n"
-                        f"行数: {sheet_stats['rows']}\n"
-                        f"列名: {', '.join(sheet_stats['columns'])}\n\n"
-                        f"{csv_content}"
-                    )
-
-                all_sheets_content.append(sheet_content)
-                result['sheets'].append({
-                    'name': sheet_name,
-                    'stats': sheet_stats,
-                    'preview': csv_content[:500]  # 前500个字符预览
-                })
-
-            except Exception as e:
-                logging.error(f"Error parsing sheet {sheet_name} in {file_path}: {str(e)}")
-                all_sheets_content.append(f"[工作表 '{sheet_name}']\n解析错误: {str(e)}")
-
-        result['content'] = "\n\n\n".join(all_sheets_content)
-        result['size'] = len(result['content'])
-        result['status'] = 'success'
-
-        return result
-
     except Exception as e:
         logging.error(f"Error loading Excel {file_path}: {str(e)}")
         return {
             'content': f"Error: {str(e)}",
+            'type': 'excel',
             'metadata': {},
             'sheets': [],
             'size': 0,
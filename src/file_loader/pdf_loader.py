@@ -1,27 +1,45 @@
 import logging
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import Dict, Any, Iterator
+from pypdf import PdfReader
 
 
-def load_pdf(file_path: str) -> str:
-    try:
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
+def iter_pdf_pages(file_path: str) -> Iterator[Dict[str, Any]]:
+    """逐页读取PDF，每次只解析一页，产出带页码元数据的页面文档"""
+    reader = PdfReader(file_path)
+    num_pages = len(reader.pages)
+
+    for page_number in range(1, num_pages + 1):
+        text = reader.pages[page_number - 1].extract_text() or ''
+        if not text.strip():
+            continue
+        yield {
+            'content': f"[页面 {page_number}]\n{text}",
+            'type': 'pdf',
+            'status': 'success',
+            'metadata': {'page': page_number, 'num_pages': num_pages}
+        }
 
-        # 合并所有页面内容
-        full_text = "\n".join([doc.page_content for doc in documents])
 
-        # 处理超大PDF（可选）
-        if len(full_text) > 1000000:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000000,
-                chunk_overlap=50000
-            )
-            texts = text_splitter.split_text(full_text)
-            return texts[0]  # 只取第一部分
-        else:
-            return full_text
+def load_pdf(file_path: str) -> Dict[str, Any]:
+    try:
+        # 合并所有页面内容（超大PDF应使用 iter_pdf_pages 流式处理）
+        pages = list(iter_pdf_pages(file_path))
+        full_text = "\n\n".join(page['content'] for page in pages)
+
+        return {
+            'content': full_text,
+            'type': 'pdf',
+            'metadata': {'num_pages': pages[0]['metadata']['num_pages'] if pages else 0},
+            'size': len(full_text),
+            'status': 'success'
+        }
 
     except Exception as e:
         logging.error(f"Error loading PDF {file_path}: {str(e)}")
-        return ""
+        return {
+            'content': f"Error: {str(e)}",
+            'type': 'pdf',
+            'metadata': {},
+            'size': 0,
+            'status': 'error'
+        }
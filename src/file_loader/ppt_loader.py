@@ -8,6 +8,7 @@ def load_ppt(file_path: str) -> Dict[str, Any]:
         prs = Presentation(file_path)
         result = {
             'content': '',
+            'type': 'ppt',
             'metadata': {
                 'title': prs.core_properties.title or '',
                 'author': prs.core_properties.author or '',
@@ -65,6 +66,7 @@ def load_ppt(file_path: str) -> Dict[str, Any]:
         logging.error(f"Error loading PPT {file_path}: {str(e)}")
         return {
             'content': f"Error: {str(e)}",
+            'type': 'ppt',
             'metadata': {},
             'slides': [],
             'size': 0,
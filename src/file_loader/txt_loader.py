@@ -1,6 +1,8 @@
 import logging
+from typing import Dict, Any
 
-def load_txt(file_path: str) -> str:
+
+def _read_text(file_path: str) -> str:
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
@@ -8,6 +10,24 @@ def load_txt(file_path: str) -> str:
         logging.error(f"Failed to decode {file_path} as UTF-8")
         with open(file_path, 'r', encoding='latin-1') as f:
             return f.read()
+
+
+def load_txt(file_path: str) -> Dict[str, Any]:
+    try:
+        content = _read_text(file_path)
+        return {
+            'content': content,
+            'type': 'txt',
+            'metadata': {},
+            'size': len(content),
+            'status': 'success'
+        }
     except Exception as e:
         logging.error(f"Error loading {file_path}: {str(e)}")
-        return ""
+        return {
+            'content': f"Error: {str(e)}",
+            'type': 'txt',
+            'metadata': {},
+            'size': 0,
+            'status': 'error'
+        }
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from src.indexer.chroma_index import INDEX_DIR
+from src.config import ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES
+
+# 语义回答缓存文件（SQLite）
+ANSWER_CACHE_PATH = os.path.join(INDEX_DIR, "answers.sqlite3")
+
+
+def source_versions(sources: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, str]:
+    """回答引用的来源及其内容摘要 {父文件ID: content_hash}，用于判断缓存的回答是否过期
+
+    sources 为 (父文件ID, 元数据) 列表；没有父文件的文档以其自身ID作为父文件ID。
+    """
+    versions = {}
+    for parent_id, metadata in sources:
+        if parent_id:
+            versions[parent_id] = (metadata or {}).get('content_hash', '')
+    return versions
+
+
+def sources_unchanged(collection, versions: Dict[str, str]) -> bool:
+    """来源文件仍在索引中且内容摘要未变（文件被修改后重新索引或被删除时返回 False）"""
+    for parent_id, content_hash in versions.items():
+        result = collection.get(where={"parent_id": parent_id}, limit=1, include=["metadatas"])
+        if not result['ids']:
+            result = collection.get(ids=[parent_id], include=["metadatas"])
+        if not result['ids']:
+            return False
+        if (result['metadatas'][0] or {}).get('content_hash', '') != content_hash:
+            return False
+    return True
+
+
+class AnswerCache:
+    """按问题向量检索的语义回答缓存（线程安全，持久化在SQLite中）
+
+    新问题与已缓存问题的余弦相似度不低于 threshold、且回答的来源文件没有变化时，
+    直接返回缓存的回答和来源文档，不再调用LLM。scope 区分影响回答的请求参数
+    （检索数量、搜索模式等），只在相同 scope 内匹配。
+    条目数超过 max_entries 时淘汰最久未使用的条目；嵌入模型变化后旧缓存自动清空。
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, model: str = None):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.enabled = max_entries > 0
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+        self._lock = threading.Lock()
+        # 问题向量常驻内存（已归一化），查找只需一次矩阵乘法
+        self._ids: List[int] = []
+        self._scopes: List[str] = []
+        self._matrix = None
+        self._conn = None
+        if not self.enabled:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._init_db()
+        self._load()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    answer TEXT NOT NULL,
+                    sources TEXT NOT NULL,
+                    versions TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    UNIQUE (question, scope)
+                );
+                CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+            """)
+            if self.model is None:
+                return
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+            if row is not None and row[0] != self.model:
+                logging.info("Embedding model has changed, discarding cached answers")
+                self._conn.execute("DELETE FROM answers")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (self.model,))
+
+    def _load(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, scope, embedding FROM answers").fetchall()
+            self._ids = [row[0] for row in rows]
+            self._scopes = [row[1] for row in rows]
+            self._matrix = (np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+                            if rows else None)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, embedding, scope: str = "", collection=None) -> Optional[Dict[str, Any]]:
+        """查找相似问题的缓存回答，未命中返回 None
+
+        提供 collection 时校验来源文件是否变化，已过期的条目被删除。
+        """
+        if not self.enabled:
+            return None
+        query = self._normalize(embedding)
+        with self._lock:
+            candidates = []
+            if self._matrix is not None and self._matrix.shape[1] == query.shape[0]:
+                similarities = self._matrix @ query
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.threshold:
+                        break
+                    if self._scopes[i] == scope:
+                        candidates.append((self._ids[i], float(similarities[i])))
+
+        for entry_id, similarity in candidates:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT question, answer, sources, versions FROM answers WHERE id = ?", (entry_id,)
+                ).fetchone()
+            if row is None:
+                continue
+            question, answer, sources, versions = row
+            # 来源校验会访问集合，不持有缓存锁
+            if collection is not None and not sources_unchanged(collection, json.loads(versions)):
+                with self._lock:
+                    self.stale += 1
+                    self._delete_locked([entry_id])
+                continue
+            with self._lock, self._conn:
+                self.hits += 1
+                self._conn.execute(
+                    "UPDATE answers SET last_used = ?, hits = hits + 1 WHERE id = ?", (time.time(), entry_id)
+                )
+            return {
+                'question': question,
+                'answer': answer,
+                'source_documents': json.loads(sources),
+                'similarity': similarity
+            }
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, question: str, embedding, answer: str, source_documents: List[Dict[str, Any]],
+            versions: Dict[str, str], scope: str = ""):
+        """缓存一次回答；相同问题和 scope 的旧回答被替换，超出容量时淘汰最久未使用的条目"""
+        if not self.enabled or not answer:
+            return
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM answers WHERE question = ? AND scope = ?", (question, scope))
+                self._conn.execute(
+                    "INSERT INTO answers (question, scope, embedding, answer, sources, versions, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (question, scope, vector.tobytes(), answer, json.dumps(source_documents, ensure_ascii=False),
+                     json.dumps(versions, ensure_ascii=False), now, now)
+                )
+                overflow = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM answers WHERE id IN "
+                        "(SELECT id FROM answers ORDER BY last_used, id LIMIT ?)", (overflow,)
+                    )
+        self._load()
+
+    def _delete_locked(self, entry_ids: List[int]):
+        with self._conn:
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in entry_ids])
+        keep = [i for i, entry_id in enumerate(self._ids) if entry_id not in entry_ids]
+        self._ids = [self._ids[i] for i in keep]
+        self._scopes = [self._scopes[i] for i in keep]
+        self._matrix = self._matrix[keep] if keep else None
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answers")
+            self._ids, self._scopes, self._matrix = [], [], None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._ids),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
@@ -1,101 +1,520 @@
 import os
+import json
+import copy
+import hashlib
+import logging
 import chromadb
-from chromadb.utils import embedding_functions
-from typing import List, Dict, Any
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterator
+from src.indexer.query_cache import query_embeddings, search_results, get_generation, bump_generation
+from src.indexer.embeddings import get_embedding_function
+from src.indexer.sharding import ShardedCollection, SHARD_PREFIX, SHARD_REGISTRY
+from src.config import (
+    SEARCH_MODE,
+    RRF_K,
+    HYBRID_CANDIDATES,
+    PATH_INDEX_DEPTH,
+    SHARD_BY,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF
+)
 
 # 索引目录
 INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../index")
 os.makedirs(INDEX_DIR, exist_ok=True)
 
+# 按文件聚合搜索结果时的分块预取倍数
+GROUP_FETCH_FACTOR = 4
+
+# 搜索模式：向量检索、BM25词法检索、两者按倒数排名融合（RRF）
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
 
 def get_chroma_client():
     """获取ChromaDB客户端，支持持久化存储"""
     return chromadb.PersistentClient(path=INDEX_DIR)
 
 
+def hnsw_metadata(m: int = HNSW_M, construction_ef: int = HNSW_CONSTRUCTION_EF,
+                  search_ef: int = HNSW_SEARCH_EF) -> Dict[str, Any]:
+    """新建集合使用的集合元数据（余弦相似度和HNSW参数）"""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef
+    }
+
+
 def get_or_create_collection(client):
-    """获取或创建文档集合"""
-    # 使用Sentence Transformer作为嵌入函数
-    embed_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    """获取或创建文档集合（SHARD_BY 不为 none 时返回分片集合）
 
-    # 创建或获取集合
-    return client.get_or_create_collection(
-        name="documents",
-        embedding_function=embed_function,
-        metadata={"hnsw:space": "cosine"}  # 使用余弦相似度
-    )
+    打开之前先完成中断的索引重建，避免重建副本被丢弃而创建出空集合。
+    """
+    from src.indexer.compaction import finish_interrupted_rebuilds
+    finish_interrupted_rebuilds(client)
+
+    if SHARD_BY != "none":
+        collection = ShardedCollection(client, metadata=hnsw_metadata())
+    else:
+        # 使用共享的Sentence Transformer嵌入函数（首次嵌入时才加载模型）
+        embed_function = get_embedding_function()
+
+        # 创建或获取集合
+        collection = client.get_or_create_collection(
+            name="documents",
+            embedding_function=embed_function,
+            metadata=hnsw_metadata()
+        )
+    set_search_ef(collection, HNSW_SEARCH_EF)
+    return collection
+
+
+def _hnsw_targets(collection) -> List[Any]:
+    return list(collection.shard_collections().values()) if hasattr(collection, 'shard_collections') else [collection]
+
+
+def hnsw_config(collection) -> Dict[str, Any]:
+    """集合当前的HNSW参数（分片集合取第一个分片）"""
+    for target in _hnsw_targets(collection):
+        return dict((target.configuration_json or {}).get('hnsw') or {})
+    return {}
+
+
+def set_search_ef(collection, search_ef: int):
+    """修改查询时的 ef（已有集合的 M 和 construction_ef 不能修改，与配置不同时提示重建索引）"""
+    changed = False
+    for target in _hnsw_targets(collection):
+        hnsw = (target.configuration_json or {}).get('hnsw') or {}
+        if hnsw.get('ef_search') != search_ef:
+            target.modify(configuration={"hnsw": {"ef_search": search_ef}})
+            changed = True
+        if (hnsw.get('max_neighbors'), hnsw.get('ef_construction')) not in (
+                (None, None), (HNSW_M, HNSW_CONSTRUCTION_EF)):
+            logging.info(f"Collection {target.name} was built with M={hnsw.get('max_neighbors')}, "
+                         f"construction_ef={hnsw.get('ef_construction')}; run `cli.py compact` to apply "
+                         f"M={HNSW_M}, construction_ef={HNSW_CONSTRUCTION_EF}")
+    if changed:
+        bump_generation(collection.id)
 
 
 def reset_index(client):
-    """重置索引（用于测试）"""
-    client.delete_collection(name="documents")
+    """重置索引（用于测试），同时删除所有分片集合"""
+    for collection in client.list_collections():
+        if collection.name in ("documents", SHARD_REGISTRY) or collection.name.startswith(SHARD_PREFIX):
+            client.delete_collection(name=collection.name)
     return get_or_create_collection(client)
 
 
-def add_document(collection, document: Dict[str, Any], external_id: str = None):
-    """添加单个文档到索引"""
-    doc_id = external_id or str(hash(document['content']))
+def content_digest(content: str) -> str:
+    """计算稳定的内容摘要（不受解释器哈希随机化影响）"""
+    return hashlib.sha256(content.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+def _normalize_dir(path: str) -> str:
+    """规范化路径，统一使用 / 作为分隔符（过滤条件与元数据中的路径写法一致）"""
+    return os.path.normcase(os.path.abspath(path)).replace(os.sep, '/')
+
+
+def path_prefixes(file_path: str) -> List[str]:
+    """文件所在的各级目录，由浅到深，最多 PATH_INDEX_DEPTH 级
+
+    例如 /legal/2025/a.pdf -> ['/legal', '/legal/2025']
+    """
+    parts = _normalize_dir(file_path).split('/')[:-1]
+    prefixes = []
+    for depth in range(1, min(len(parts), PATH_INDEX_DEPTH + 1)):
+        prefixes.append('/'.join(parts[:depth + 1]))
+    return prefixes
 
-    # 提取元数据
-    metadata = {
+
+def filter_metadata(file_path: str) -> Dict[str, Any]:
+    """用于过滤的文件级元数据：扩展名和各级目录（path_1 .. path_N）
+
+    Chroma的 where 条件不支持前缀匹配，目录范围查询改为对 path_N 做等值匹配，
+    由元数据索引直接定位，不需要多取向量再过滤。
+    """
+    metadata = {'extension': os.path.splitext(file_path)[1].lower()}
+    for depth, prefix in enumerate(path_prefixes(file_path), start=1):
+        metadata[f'path_{depth}'] = prefix
+    return metadata
+
+
+def build_filter(file_types: List[str] = None, extensions: List[str] = None, path_prefix: str = None,
+                 modified_after: float = None, modified_before: float = None,
+                 min_size: int = None, max_size: int = None) -> Optional[Dict[str, Any]]:
+    """构建Chroma元数据过滤条件（各条件之间为“与”关系），没有条件时返回 None
+
+    path_prefix 为目录范围；修改时间为Unix时间戳，大小为文件字节数，范围均包含端点。
+    """
+    conditions = []
+    if file_types:
+        conditions.append({'type': {'$in': list(file_types)}})
+    if extensions:
+        conditions.append({'extension': {'$in': [
+            ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in extensions
+        ]}})
+    if path_prefix:
+        prefix = _normalize_dir(path_prefix).rstrip('/')
+        depth = prefix.count('/')
+        if depth > PATH_INDEX_DEPTH:
+            raise ValueError(f"目录层级超过 PATH_INDEX_DEPTH（{PATH_INDEX_DEPTH}）")
+        if depth > 0:
+            conditions.append({f'path_{depth}': prefix})
+    if modified_after is not None:
+        conditions.append({'file_mtime': {'$gte': float(modified_after)}})
+    if modified_before is not None:
+        conditions.append({'file_mtime': {'$lte': float(modified_before)}})
+    if min_size is not None:
+        conditions.append({'file_size': {'$gte': int(min_size)}})
+    if max_size is not None:
+        conditions.append({'file_size': {'$lte': int(max_size)}})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
+def _build_metadata(document: Dict[str, Any]) -> Dict[str, Any]:
+    """构建文档元数据（Chroma只接受标量值，列表等类型会被转换）
+
+    type/size/status 由加载和切分结果决定，文档自带的元数据不会覆盖这三个字段；
+    带 file_path 的文档额外写入用于过滤的扩展名和各级目录。
+    """
+    metadata = dict(document.get('metadata') or {})
+    metadata.update({
         'type': document.get('type', 'unknown'),
         'size': document.get('size', 0),
         'status': document.get('status', 'unknown')
-    }
+    })
+    if metadata.get('file_path'):
+        metadata.update(filter_metadata(str(metadata['file_path'])))
 
-    # 合并文档自带的元数据
-    if 'metadata' in document:
-        metadata.update(document['metadata'])
+    for key, value in metadata.items():
+        if value is None:
+            metadata[key] = ''
+        elif isinstance(value, (list, tuple)):
+            metadata[key] = ', '.join(str(v) for v in value)
+        elif not isinstance(value, (str, int, float, bool)):
+            metadata[key] = str(value)
 
-    # 添加到集合
-    collection.add(
+    return metadata
+
+
+def get_max_batch_size(collection) -> int:
+    """获取Chroma单次写入允许的最大记录数"""
+    return collection._client.get_max_batch_size()
+
+
+def add_document(collection, document: Dict[str, Any], external_id: str = None):
+    """添加单个文档到索引（ID已存在时覆盖）"""
+    doc_id = external_id or content_digest(document['content'])
+
+    # 写入集合
+    collection.upsert(
         ids=[doc_id],
         documents=[document['content']],
-        metadatas=[metadata]
+        metadatas=[_build_metadata(document)]
     )
+    bump_generation(collection.id)
 
     return doc_id
 
 
-def add_documents(collection, documents: List[Dict[str, Any]]):
-    """批量添加文档到索引"""
-    doc_ids = []
+def add_documents(collection, documents: List[Dict[str, Any]], ids: List[str] = None):
+    """批量添加文档到索引
+
+    所有文档合并为一次写入（仅在超过Chroma最大批量时拆分），
+    嵌入函数因此能以大批量向量化计算，也只需一次HNSW/SQLite写入。
+    使用 upsert：分块ID是确定的，中断后重新索引时已存在的分块被覆盖而不是保留旧内容
+    （add 遇到已存在的ID会静默保留旧文档，与词法索引不一致）。
+    """
+    doc_ids = list(ids) if ids else [content_digest(doc['content']) for doc in documents]
+
+    # 同一批次内的重复ID只保留第一个（Chroma不允许单次写入包含重复ID）
+    seen = set()
+    batch_ids, batch_contents, batch_metadatas = [], [], []
+    for doc_id, doc in zip(doc_ids, documents):
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        batch_ids.append(doc_id)
+        batch_contents.append(doc['content'])
+        batch_metadatas.append(_build_metadata(doc))
 
-    for doc in documents:
-        doc_id = add_document(collection, doc)
-        doc_ids.append(doc_id)
+    max_batch_size = get_max_batch_size(collection)
+    for start in range(0, len(batch_ids), max_batch_size):
+        end = start + max_batch_size
+        collection.upsert(
+            ids=batch_ids[start:end],
+            documents=batch_contents[start:end],
+            metadatas=batch_metadatas[start:end]
+        )
+    bump_generation(collection.id)
 
     return doc_ids
 
 
+def delete_documents(collection, ids: List[str]):
+    """根据ID删除文档（超过Chroma最大批量时分批删除）"""
+    ids = list(ids)
+    if ids:
+        max_batch_size = get_max_batch_size(collection)
+        for start in range(0, len(ids), max_batch_size):
+            collection.delete(ids=ids[start:start + max_batch_size])
+        bump_generation(collection.id)
+
+
+def iter_pages(collection, page_size: int, include: List[str]) -> Iterator[Dict[str, Any]]:
+    """分页读取集合中的全部分块"""
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=include)
+        if not page['ids']:
+            return
+        yield page
+        offset += len(page['ids'])
+
+
 def count_documents(collection):
     """获取索引中文档数量"""
     return collection.count()
 
 
-def search(collection, query: str, n_results: int = 3, filter: Dict = None):
-    """执行语义搜索"""
+def embedding_model_key(collection) -> tuple:
+    """集合所用嵌入模型的标识 (模型名, 推理后端)；不同推理后端的向量略有差异，缓存键中包含后端"""
+    embedding_function = collection._embedding_function
+    return (
+        getattr(embedding_function, 'model_name', type(embedding_function).__name__),
+        getattr(embedding_function, 'backend', '')
+    )
+
+
+def embed_queries(collection, queries: List[str]) -> List[Any]:
+    """计算查询向量，已缓存的查询不再重复嵌入，未命中的查询一次性批量嵌入"""
+    embedding_function = collection._embedding_function
+    model_key = embedding_model_key(collection)
+
+    embeddings = [query_embeddings.get((model_key, query)) for query in queries]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        computed = embedding_function([queries[i] for i in missing])
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+            query_embeddings.put((model_key, queries[i]), embedding)
+
+    return embeddings
+
+
+def search(collection, query: str, n_results: int = 3, filter: Dict = None, group_by_file: bool = False,
+           lexical_index=None, mode: str = None):
+    """执行搜索
+
+    mode 为 vector（语义检索）、lexical（BM25词法检索，不使用嵌入模型）或 hybrid
+    （两路结果按倒数排名融合），默认取 SEARCH_MODE；未提供 lexical_index 时只做语义检索。
+    group_by_file=True 时按父文件聚合分块命中结果，每个文件只返回得分最高的分块，
+    并在 'chunks' 中附带该文件所有命中的分块。
+    查询向量和搜索结果均有缓存，集合内容变化后结果缓存自动失效。
+    """
+    return search_batch(collection, [query], n_results, filter, group_by_file, lexical_index, mode)[0]
+
+
+def search_batch(collection, queries: List[str], n_results: int = 3, filter: Dict = None,
+                 group_by_file: bool = False, lexical_index=None, mode: str = None) -> List[List[Dict[str, Any]]]:
+    """批量执行搜索，按查询顺序返回每个查询的结果（参数含义同 search）
+
+    未命中缓存的查询一次性批量嵌入，并在一次 collection.query 中完成向量检索。
+    """
+    mode = (mode or SEARCH_MODE) if lexical_index is not None else "vector"
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"不支持的搜索模式: {mode}，可选: {', '.join(SEARCH_MODES)}")
+
+    generation = get_generation(collection.id)
+    filter_key = json.dumps(filter or None, sort_keys=True, ensure_ascii=False)
+    # 分片视图只检索部分分片，缓存键中包含视图范围
+    scope = getattr(collection, 'shard_scope', None)
+    cache_keys = [
+        (str(collection.id), scope, generation, query, n_results, filter_key, group_by_file, mode)
+        for query in queries
+    ]
+    results = [search_results.get(key) for key in cache_keys]
+    missing = [i for i, cached in enumerate(results) if cached is None]
+    # 同一批次中重复的查询只检索一次
+    pending = list(dict.fromkeys(queries[i] for i in missing))
+
+    if pending:
+        fetch_k = n_results * GROUP_FETCH_FACTOR if group_by_file else n_results
+        if mode == "vector":
+            batch_hits = _vector_search(collection, embed_queries(collection, pending), fetch_k, filter)
+        elif mode == "lexical":
+            batch_hits = _lexical_search(collection, lexical_index, pending, fetch_k, filter)
+        else:
+            batch_hits = _hybrid_search(collection, lexical_index, pending, fetch_k, filter)
+
+        computed = {}
+        for query, hits in zip(pending, batch_hits):
+            if group_by_file:
+                hits = group_hits_by_file(hits, n_results)
+            computed[query] = hits
+        for i in missing:
+            results[i] = computed[queries[i]]
+            search_results.put(cache_keys[i], copy.deepcopy(results[i]))
+
+    return [copy.deepcopy(hits) for hits in results]
+
+
+def dedupe_hits(results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """合并多个查询的结果并按ID去重，保留得分最高的命中，'queries' 记录命中该结果的查询序号"""
+    merged = {}
+    for query_index, hits in enumerate(results):
+        for hit in hits:
+            existing = merged.get(hit['id'])
+            if existing is None or hit['score'] > existing['score']:
+                queries = existing['queries'] if existing else []
+                merged[hit['id']] = dict(hit, queries=queries)
+            merged[hit['id']]['queries'].append(query_index)
+    return sorted(merged.values(), key=lambda hit: hit['score'], reverse=True)
+
+
+def _vector_search(collection, query_embeddings: List[Any], n_results: int,
+                   filter: Dict = None) -> List[List[Dict[str, Any]]]:
+    if not query_embeddings:
+        return []
     results = collection.query(
-        query_texts=[query],
+        query_embeddings=list(query_embeddings),
         n_results=n_results,
-        where=filter,
+        where=filter or None,
         include=["documents", "metadatas", "distances"]
     )
 
-    # 处理搜索结果
-    hits = []
-    if results and 'documents' in results and results['documents']:
-        for i in range(len(results['documents'][0])):
-            hits.append({
-                'document': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i],
-                'score': max(0, 1 - results['distances'][0][i])  # 将距离转换为相似度分数
-            })
-
-    return hits
+    # 处理搜索结果（每个查询一组）
+    batch_hits = []
+    for q in range(len(query_embeddings)):
+        hits = []
+        if results and results.get('documents'):
+            for i in range(len(results['documents'][q])):
+                hits.append({
+                    'id': results['ids'][q][i],
+                    'document': results['documents'][q][i],
+                    'metadata': results['metadatas'][q][i],
+                    'distance': results['distances'][q][i],
+                    'score': max(0, 1 - results['distances'][q][i])  # 将距离转换为相似度分数
+                })
+        batch_hits.append(hits)
+    return batch_hits
+
+
+def _get_chunks(collection, ids: List[str], filter: Dict = None, include_embeddings: bool = False):
+    """按ID读取分块（应用元数据过滤），返回 {分块ID: 结果}；词法索引中已失效的ID会被忽略"""
+    if not ids:
+        return {}
+    include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+    results = collection.get(ids=list(ids), where=filter or None, include=include)
+    chunks = {}
+    for i, chunk_id in enumerate(results['ids']):
+        chunks[chunk_id] = {
+            'document': results['documents'][i],
+            'metadata': results['metadatas'][i],
+            'embedding': results['embeddings'][i] if include_embeddings else None
+        }
+    return chunks
+
+
+def _lexical_search(collection, lexical_index, queries: List[str], n_results: int,
+                    filter: Dict = None) -> List[List[Dict[str, Any]]]:
+    # 有过滤条件时多取一些候选，过滤后仍能凑够结果
+    candidate_k = n_results * GROUP_FETCH_FACTOR if filter else n_results
+    candidates = [lexical_index.search(query, candidate_k) for query in queries]
+    chunks = _get_chunks(collection, {chunk_id for hits in candidates for chunk_id, _ in hits}, filter)
+
+    batch_hits = []
+    for query_candidates in candidates:
+        hits = []
+        for chunk_id, bm25 in query_candidates:
+            if chunk_id in chunks:
+                hits.append({
+                    'id': chunk_id,
+                    'document': chunks[chunk_id]['document'],
+                    'metadata': chunks[chunk_id]['metadata'],
+                    'bm25': bm25,
+                    'score': bm25
+                })
+        batch_hits.append(hits[:n_results])
+    return batch_hits
+
+
+def _hybrid_search(collection, lexical_index, queries: List[str], n_results: int,
+                   filter: Dict = None) -> List[List[Dict[str, Any]]]:
+    """向量检索和BM25检索各取候选，按倒数排名融合（RRF）：score = Σ 1 / (RRF_K + rank)
+
+    结果中 'score' 仍为余弦相似度（仅由词法检索召回的分块用已存储的向量计算），
+    'rrf_score' 为融合得分，结果按融合得分降序排列。
+    """
+    candidate_k = max(n_results, HYBRID_CANDIDATES)
+    query_embeddings = embed_queries(collection, queries)
+    vector_hits = _vector_search(collection, query_embeddings, candidate_k, filter)
+    lexical_hits = [lexical_index.search(query, candidate_k) for query in queries]
+
+    # 仅由词法检索召回的分块一次性读取（含向量）
+    vector_ids = [{hit['id'] for hit in hits} for hits in vector_hits]
+    missing = {
+        chunk_id
+        for ids, hits in zip(vector_ids, lexical_hits)
+        for chunk_id, _ in hits if chunk_id not in ids
+    }
+    chunks = _get_chunks(collection, missing, filter, include_embeddings=True)
+
+    batch_hits = []
+    for query_embedding, query_vector_hits, query_lexical_hits in zip(query_embeddings, vector_hits, lexical_hits):
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_embedding) or 1.0
+
+        hits = {hit['id']: dict(hit, bm25=0.0, rrf_score=0.0) for hit in query_vector_hits}
+        for rank, hit in enumerate(query_vector_hits, 1):
+            hits[hit['id']]['rrf_score'] += 1 / (RRF_K + rank)
+
+        # 只对通过过滤且仍存在于集合中的词法命中计算排名
+        rank = 0
+        for chunk_id, bm25 in query_lexical_hits:
+            if chunk_id not in hits:
+                if chunk_id not in chunks:
+                    continue
+                chunk = chunks[chunk_id]
+                embedding = np.asarray(chunk['embedding'], dtype=np.float32)
+                similarity = float(embedding @ query_embedding / ((np.linalg.norm(embedding) or 1.0) * query_norm))
+                hits[chunk_id] = {
+                    'id': chunk_id,
+                    'document': chunk['document'],
+                    'metadata': chunk['metadata'],
+                    'distance': 1 - similarity,
+                    'score': max(0, similarity),
+                    'bm25': 0.0,
+                    'rrf_score': 0.0
+                }
+            rank += 1
+            hits[chunk_id]['bm25'] = bm25
+            hits[chunk_id]['rrf_score'] += 1 / (RRF_K + rank)
+
+        batch_hits.append(sorted(hits.values(), key=lambda hit: hit['rrf_score'], reverse=True)[:n_results])
+    return batch_hits
+
+
+def group_hits_by_file(hits: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+    """把分块命中结果按父文件聚合（结果需已按得分降序排列）"""
+    grouped = {}
+    for hit in hits:
+        parent_id = (hit['metadata'] or {}).get('parent_id', hit['id'])
+        if parent_id not in grouped:
+            grouped[parent_id] = dict(hit, id=parent_id, chunks=[])
+        grouped[parent_id]['chunks'].append({
+            'id': hit['id'],
+            'document': hit['document'],
+            'score': hit['score'],
+            'chunk_index': (hit['metadata'] or {}).get('chunk_index', 0)
+        })
+
+    return list(grouped.values())[:n_results]
 
 
 def search_by_id(collection, doc_id: str):
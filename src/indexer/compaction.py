@@ -0,0 +1,240 @@
+import os
+import re
+import time
+import shutil
+import sqlite3
+import logging
+import chromadb
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable
+from src.indexer.chroma_index import INDEX_DIR, get_max_batch_size, set_search_ef, iter_pages
+from src.indexer.embeddings import get_embedding_function
+from src.indexer.sharding import ShardedCollection
+from src.indexer.query_cache import bump_generation
+from src.config import HNSW_SEARCH_EF
+
+# 重建时写入的临时集合名前缀（不能以分片前缀 documents__ 开头，否则会被当作分片加载）；
+# 写入并校验完成后改为 REBUILT_PREFIX，表示副本完整，此后才删除原集合
+REBUILD_PREFIX = "rebuild__"
+REBUILT_PREFIX = "rebuilt__"
+# 重建后的集合在元数据中记录原集合的ID（中断后恢复时，关联原集合ID的清单和索引仍然有效）
+REBUILT_FROM_KEY = "rebuilt_from"
+# 召回率评估默认比较的 ef 取值
+EVAL_EF_VALUES = (10, 50, 100, 200)
+
+
+def index_size(path: str = INDEX_DIR) -> int:
+    """Chroma持久化文件的总大小（chroma.sqlite3 及其日志文件和各HNSW段目录）"""
+    total = 0
+    for entry in os.scandir(path):
+        if entry.name.startswith("chroma.sqlite3"):
+            total += entry.stat().st_size
+        elif entry.is_dir():
+            for root, _, files in os.walk(entry.path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+_SEGMENT_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def vacuum_index(path: str = INDEX_DIR, timeout: float = 30) -> int:
+    """整理Chroma的SQLite文件，并删除已删除集合遗留的HNSW段目录，返回删除的目录数
+
+    Chroma删除集合时不会删除磁盘上的HNSW段目录，重建索引后旧目录需要在这里清理。
+    """
+    conn = sqlite3.connect(os.path.join(path, "chroma.sqlite3"), timeout=timeout)
+    try:
+        segments = {row[0] for row in conn.execute("SELECT id FROM segments")}
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    removed = 0
+    for entry in os.scandir(path):
+        if entry.is_dir() and _SEGMENT_DIR.match(entry.name) and entry.name not in segments:
+            shutil.rmtree(entry.path)
+            removed += 1
+    if removed:
+        logging.info(f"Removed {removed} orphaned HNSW segment directories")
+    return removed
+
+
+def finish_interrupted_rebuilds(client) -> List[str]:
+    """恢复中断的重建（在打开文档集合之前调用），返回恢复的集合名
+
+    已完成的重建副本（REBUILT_PREFIX）在原集合不存在或为空时改为原名称，
+    原集合仍有数据时保留原集合（此时原集合尚未删除）；未写完的临时集合由下一次重建清理。
+    """
+    collections = {c.name: c for c in client.list_collections()}
+    recovered = []
+    for name, rebuilt in collections.items():
+        if not name.startswith(REBUILT_PREFIX):
+            continue
+        target = name[len(REBUILT_PREFIX):]
+        if target in collections:
+            if collections[target].count() > 0:
+                logging.info(f"Collection {target} is intact, the completed rebuild {name} will be discarded "
+                             f"by the next rebuild")
+                continue
+            client.delete_collection(name=target)
+        rebuilt.modify(name=target)
+        recovered.append(target)
+        logging.info(f"Finished interrupted rebuild of collection {target} ({rebuilt.count()} chunks)")
+    return recovered
+
+
+def rebuild_collection(client, collection, metadata: Dict[str, Any], batch_size: int = None):
+    """用已存储的向量把一个Chroma集合整体重写为新集合（不重新嵌入），返回重建后的集合
+
+    先写入临时集合，分块数一致后把临时集合改名为已完成的副本，再删除原集合并改为原名称；
+    在删除原集合和改名之间中断时，下次打开索引由 finish_interrupted_rebuilds 完成改名。
+    删除和更新在原HNSW图中留下的空洞随之清除，新集合使用 metadata 中的HNSW参数。
+    """
+    name = collection.name
+    temp_name = REBUILD_PREFIX + name
+    done_name = REBUILT_PREFIX + name
+    existing = [c.name for c in client.list_collections()]
+    if temp_name in existing:
+        # 上次重建在写入临时集合时中断（原集合尚未删除）
+        client.delete_collection(name=temp_name)
+    if done_name in existing:
+        if collection.count() == 0:
+            raise RuntimeError(f"集合 {name} 为空而存在已完成的重建副本 {done_name}，重新打开索引后会自动恢复")
+        # 上次重建在删除原集合之前中断，原集合完整且可能已有新的写入
+        client.delete_collection(name=done_name)
+
+    # 保留自定义的集合元数据，HNSW参数使用新的取值
+    merged = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith("hnsw:")}
+    merged.update(metadata)
+    merged[REBUILT_FROM_KEY] = str(collection.id)
+    rebuilt = client.create_collection(
+        name=temp_name,
+        embedding_function=collection._embedding_function,
+        metadata=merged
+    )
+
+    batch_size = batch_size or get_max_batch_size(collection)
+    for page in iter_pages(collection, batch_size, ["embeddings", "documents", "metadatas"]):
+        rebuilt.add(
+            ids=page['ids'],
+            embeddings=page['embeddings'],
+            documents=page['documents'],
+            metadatas=page['metadatas']
+        )
+
+    if rebuilt.count() != collection.count():
+        client.delete_collection(name=temp_name)
+        raise RuntimeError(f"重建集合 {name} 失败：分块数不一致")
+
+    rebuilt.modify(name=done_name)
+    client.delete_collection(name=name)
+    rebuilt.modify(name=name)
+    return rebuilt
+
+
+def compact_collection(client, collection, metadata: Dict[str, Any], batch_size: int = None):
+    """重建文档集合，返回重建后的集合
+
+    分片集合逐个分片重建（分片集合ID保存在单独的集合中，保持不变）；
+    未分片的集合重建后集合ID会改变，调用方需要更新关联集合ID的清单和索引。
+    """
+    if hasattr(collection, 'shard_collections'):
+        for key, shard in collection.shard_collections().items():
+            start = time.perf_counter()
+            rebuilt = rebuild_collection(client, shard, metadata, batch_size)
+            collection.reload(key)
+            logging.info(f"Rebuilt shard {key} ({rebuilt.count()} chunks) in {time.perf_counter() - start:.1f}s")
+        return collection
+
+    start = time.perf_counter()
+    rebuilt = rebuild_collection(client, collection, metadata, batch_size)
+    bump_generation(rebuilt.id)
+    logging.info(f"Rebuilt collection {rebuilt.name} ({rebuilt.count()} chunks) "
+                 f"in {time.perf_counter() - start:.1f}s")
+    return rebuilt
+
+
+def _exact_neighbors(collection, queries: np.ndarray, k: int, page_size: int) -> List[set]:
+    """暴力计算每个查询的余弦相似度前 k 个分块（召回率的基准）"""
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.full((len(queries), k), None, dtype=object)
+    for page in iter_pages(collection, page_size, ["embeddings"]):
+        vectors = np.asarray(page['embeddings'], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = np.hstack([best_scores, queries @ vectors.T])
+        ids = np.hstack([best_ids, np.broadcast_to(np.array(page['ids'], dtype=object), (len(queries), len(vectors)))])
+        top = np.argsort(-scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return [set(row) for row in best_ids]
+
+
+def _open_for_eval(persist_directory: str, name: str, sharding: Dict[str, Any] = None):
+    client = chromadb.PersistentClient(path=persist_directory)
+    if sharding is not None:
+        return ShardedCollection(client, **sharding)
+    return client.get_collection(name=name, embedding_function=get_embedding_function())
+
+
+def _measure(persist_directory: str, name: str, sharding: Dict[str, Any], queries: np.ndarray,
+             exact: List[set], k: int) -> Dict[str, Any]:
+    """在新进程中打开集合并测量召回率和延迟（HNSW索引按打开时的 search_ef 加载）"""
+    collection = _open_for_eval(persist_directory, name, sharding)
+    # 预热：首次查询加载HNSW索引
+    collection.query(query_embeddings=queries[:1].tolist(), n_results=k, include=[])
+    timings, recalls = [], []
+    for query, expected in zip(queries, exact):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected.intersection(result['ids'][0])) / k)
+    timings.sort()
+    return {
+        'recall': float(np.mean(recalls)),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[max(0, int(len(timings) * 0.95) - 1)]
+    }
+
+
+def evaluate_search(collection, ef_values: Iterable[int] = EVAL_EF_VALUES, n_queries: int = 100,
+                    k: int = 10, page_size: int = 5000, restore_ef: int = HNSW_SEARCH_EF,
+                    seed: int = 0) -> List[Dict[str, Any]]:
+    """在不同的 search_ef 下测量近似检索的召回率（与暴力检索比较）和查询延迟
+
+    查询向量取自集合中随机抽样的分块，评估结束后 search_ef 恢复为 restore_ef。
+    已加载的HNSW索引不会应用修改后的 search_ef，每个取值在新启动的进程中测量。
+    """
+    total = collection.count()
+    k = min(k, total)
+    if k == 0:
+        return []
+
+    rng = np.random.RandomState(seed)
+    offsets = rng.choice(total, size=min(n_queries, total), replace=False)
+    queries = np.asarray([
+        collection.get(limit=1, offset=int(offset), include=["embeddings"])['embeddings'][0]
+        for offset in offsets
+    ], dtype=np.float32)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    exact = _exact_neighbors(collection, queries, k, page_size)
+
+    persist_directory = collection._client.get_settings().persist_directory
+    sharding = None
+    if isinstance(collection, ShardedCollection):
+        sharding = {'scheme': collection.scheme, 'count': collection.count_hint,
+                    'root': collection.root, 'metadata': collection.metadata}
+
+    rows = []
+    try:
+        for ef in ef_values:
+            set_search_ef(collection, ef)
+            # fork 出的子进程会继承已加载的索引，必须使用 spawn
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                row = pool.submit(_measure, persist_directory, collection.name, sharding, queries, exact, k).result()
+            rows.append({"ef": ef, **row})
+    finally:
+        set_search_ef(collection, restore_ef)
+    return rows
@@ -0,0 +1,103 @@
+import time
+import logging
+import threading
+from typing import List, Dict, Any
+import numpy as np
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from src.config import EMBEDDING_MODEL, EMBEDDING_DEVICE, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE
+
+# 可选的嵌入后端：PyTorch、ONNX Runtime fp32、ONNX Runtime int8量化
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+class LazySentenceTransformerEmbeddingFunction(SentenceTransformerEmbeddingFunction):
+    """首次调用时才加载模型的 Sentence Transformer 嵌入函数
+
+    与 Chroma 自带的实现配置兼容（name/get_config 相同），已有集合可直接使用；
+    构造时不导入 torch、不加载模型，服务可以在模型预热完成前启动并响应请求。
+    backend 选择推理后端。各后端的向量并不完全相同（onnx-int8 量化后差异更明显），
+    切换后端后应重建索引：否则查询向量与已存储的向量来自不同后端，检索质量下降；
+    快照恢复时也会拒绝嵌入模型或后端不一致的快照。
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, device: str = EMBEDDING_DEVICE,
+                 normalize_embeddings: bool = False, backend: str = EMBEDDING_BACKEND, **kwargs: Any):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"不支持的嵌入后端: {backend}，可选: {', '.join(EMBEDDING_BACKENDS)}")
+        self.model_name = model_name
+        self.backend = backend
+        self.device = device
+        self.normalize_embeddings = normalize_embeddings
+        self.kwargs = kwargs
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.load_seconds = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """加载模型（线程安全，只加载一次）"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    logging.info(f"Loading embedding model {self.model_name} ({self.backend})")
+                    self._model = self._create_model()
+                    self.load_seconds = time.perf_counter() - start
+                    logging.info(f"Embedding model loaded in {self.load_seconds:.1f}s")
+        return self._model
+
+    def _create_model(self):
+        if self.backend == "torch":
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(model_name_or_path=self.model_name, device=self.device, **self.kwargs)
+
+        from src.indexer.onnx_encoder import OnnxSentenceEncoder
+        return OnnxSentenceEncoder(
+            self.model_name,
+            quantized=self.backend == "onnx-int8",
+            onnx_file=EMBEDDING_ONNX_FILE or None
+        )
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        embeddings = self.load().encode(
+            list(input),
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize_embeddings,
+        )
+        return [np.array(embedding, dtype=np.float32) for embedding in embeddings]
+
+
+# 进程内共享的嵌入函数注册表：同一模型和后端只加载一份
+_registry: Dict[tuple, LazySentenceTransformerEmbeddingFunction] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_function(model_name: str = EMBEDDING_MODEL,
+                           backend: str = EMBEDDING_BACKEND) -> LazySentenceTransformerEmbeddingFunction:
+    """获取共享的嵌入函数（索引、搜索、LLM检索共用同一个模型实例）"""
+    key = (model_name, backend)
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = LazySentenceTransformerEmbeddingFunction(model_name=model_name, backend=backend)
+        return _registry[key]
+
+
+def warm_up(model_name: str = EMBEDDING_MODEL):
+    """预加载模型并执行一次推理（通常在后台线程中调用）"""
+    try:
+        get_embedding_function(model_name)(["warm up"])
+    except Exception as e:
+        logging.error(f"Failed to warm up embedding model {model_name}: {str(e)}")
+
+
+def embedding_status() -> Dict[str, Any]:
+    """获取已注册模型的加载状态"""
+    with _registry_lock:
+        functions = list(_registry.values())
+    return {
+        f"{ef.model_name} ({ef.backend})": {'loaded': ef.loaded, 'load_seconds': ef.load_seconds}
+        for ef in functions
+    }
@@ -0,0 +1,159 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+from typing import List, Tuple, Iterable
+from src.chunking import SECTION_MARKER
+from src.indexer.chroma_index import INDEX_DIR
+
+# 词法索引文件（SQLite FTS5，BM25排序）
+LEXICAL_INDEX_PATH = os.path.join(INDEX_DIR, "lexical.sqlite3")
+
+# 标识符：字母数字序列，允许中间出现 - _ . / （合同编号、SKU、错误码、版本号等）
+IDENTIFIER_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+IDENTIFIER_PART = re.compile(r"[a-z0-9]+")
+# CJK字符序列（中日韩统一表意文字、假名、谚文）
+CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+
+
+def _marker_text(match) -> str:
+    """结构标记只保留工作表名称，段落/页面/幻灯片编号等标记不参与检索"""
+    label = match.group(1)
+    sheet = re.match(r"工作表 '(.*)'$", label)
+    return sheet.group(1) if sheet else ""
+
+
+def tokenize(text: str) -> List[str]:
+    """词法分词：CJK文本切分为二元组，标识符保留完整形式并额外拆分出各部分
+
+    例如 "合同HT-2024-001" -> ["合同", "ht-2024-001", "ht", "2024", "001"]
+    """
+    text = SECTION_MARKER.sub(_marker_text, text).lower()
+
+    tokens = []
+    for run in CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        tokens.append(identifier)
+        parts = IDENTIFIER_PART.findall(identifier)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class LexicalIndex:
+    """基于SQLite FTS5的本地倒排索引（线程安全），与Chroma集合中的分块一一对应
+
+    分词在Python中完成，FTS5只按空格切分并计算BM25；查询不需要嵌入模型。
+    索引记录所属集合的ID，集合被重建后旧索引自动清空。
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH, collection_id: str = None, rebuilt_from: str = None):
+        self.path = path
+        self.collection_id = collection_id
+        # 集合原样重建（压缩索引）前的ID，关联该ID的内容仍然有效
+        self.rebuilt_from = rebuilt_from
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS chunk_map (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chunk_id TEXT NOT NULL UNIQUE
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5(
+                    tokens, tokenize = "unicode61 tokenchars '-_./' remove_diacritics 0"
+                );
+            """)
+            if self.collection_id is None:
+                return
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'collection_id'").fetchone()
+            if row is not None and row[0] not in (self.collection_id, self.rebuilt_from):
+                logging.info("Collection has been recreated, discarding stale lexical index")
+                self._conn.execute("DELETE FROM chunk_fts")
+                self._conn.execute("DELETE FROM chunk_map")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('collection_id', ?)", (self.collection_id,)
+            )
+
+    def rebind(self, collection_id: str):
+        """集合被原样重建（如压缩索引）后关联新的集合ID，保留已有的索引内容"""
+        with self._lock, self._conn:
+            self.collection_id = collection_id
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('collection_id', ?)", (collection_id,)
+            )
+
+    def add(self, chunks: Iterable[Tuple[str, str]]):
+        """写入 (分块ID, 文本) 列表，已存在的分块会被替换"""
+        chunks = list(chunks)
+        if not chunks:
+            return
+        with self._lock, self._conn:
+            self._delete_locked([chunk_id for chunk_id, _ in chunks])
+            for chunk_id, text in chunks:
+                cursor = self._conn.execute("INSERT INTO chunk_map (chunk_id) VALUES (?)", (chunk_id,))
+                self._conn.execute(
+                    "INSERT INTO chunk_fts (rowid, tokens) VALUES (?, ?)",
+                    (cursor.lastrowid, " ".join(tokenize(text)))
+                )
+
+    def delete(self, chunk_ids: Iterable[str]):
+        """删除分块"""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return
+        with self._lock, self._conn:
+            self._delete_locked(chunk_ids)
+
+    def _delete_locked(self, chunk_ids: List[str]):
+        # SQLite 单条语句的参数个数有上限，分批删除
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT id FROM chunk_map WHERE chunk_id IN ({placeholders})", batch
+            ).fetchall()
+            if not rows:
+                continue
+            self._conn.executemany("DELETE FROM chunk_fts WHERE rowid = ?", rows)
+            self._conn.executemany("DELETE FROM chunk_map WHERE id = ?", rows)
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """BM25检索，返回按得分降序排列的 (分块ID, BM25得分)"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or n_results <= 0:
+            return []
+        match = " OR ".join(f'"{token}"' for token in tokens)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.chunk_id, -bm25(chunk_fts) FROM chunk_fts "
+                "JOIN chunk_map m ON m.id = chunk_fts.rowid "
+                "WHERE chunk_fts MATCH ? ORDER BY bm25(chunk_fts) LIMIT ?",
+                (match, n_results)
+            ).fetchall()
+        return [(chunk_id, score) for chunk_id, score in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunk_fts")
+            self._conn.execute("DELETE FROM chunk_map")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_map").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,202 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+from src.indexer.chroma_index import INDEX_DIR
+from src.config import UPLOAD_PATH_PREFIX
+
+# 清单文件：记录每个已索引文件的 (大小, 修改时间, 内容摘要, 分块ID)，
+# 近似重复的文件不写入分块，而是记录其规范文件（duplicate_of）
+MANIFEST_PATH = os.path.join(INDEX_DIR, "manifest.json")
+
+
+def file_digest(file_path: str, block_size: int = 1 << 20) -> str:
+    """按块计算文件内容的SHA-256摘要（不解析文件，内存占用恒定）"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_doc_id(file_path: str) -> str:
+    """根据文件路径生成稳定的文档ID"""
+    return hashlib.sha256(normalize_path(file_path).encode('utf-8')).hexdigest()[:32]
+
+
+def upload_path(digest: str, filename: str) -> str:
+    """上传文件的逻辑路径：暂存文件处理后即被删除，清单和元数据记录稳定的 <前缀>/<摘要>/<原始文件名>"""
+    name = os.path.basename((filename or '').replace('\\', '/')) or 'upload'
+    return f"{UPLOAD_PATH_PREFIX.rstrip('/')}/{digest[:16]}/{name}"
+
+
+def is_upload_path(file_path: str) -> bool:
+    """判断路径是否为上传文件的逻辑路径（磁盘上不存在对应文件）"""
+    prefix = os.path.join(normalize_path(UPLOAD_PATH_PREFIX), '')
+    return normalize_path(file_path).startswith(prefix)
+
+
+def normalize_path(file_path: str) -> str:
+    """规范化文件路径，作为清单的键"""
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+class IndexManifest:
+    """持久化的增量索引清单（线程安全）
+
+    清单记录所属集合的ID，集合被重建（如 reset_index）后旧清单自动失效。
+    rebuilt_from 为集合原样重建（压缩索引）前的ID，关联该ID的清单仍然有效。
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH, collection_id: str = None, rebuilt_from: str = None):
+        self.path = path
+        self.collection_id = collection_id
+        self.rebuilt_from = rebuilt_from
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = self._load()
+        self._build_lookups()
+
+    def _build_lookups(self):
+        # 内容摘要 -> 文件路径 的反向索引，用于上传去重
+        self._by_digest = {entry['digest']: path for path, entry in self._entries.items()}
+        # 规范文件 -> 链接到它的近似重复文件
+        self._duplicates = {}
+        for path, entry in self._entries.items():
+            if entry.get('duplicate_of'):
+                self._duplicates.setdefault(entry['duplicate_of'], set()).add(path)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if self.collection_id and data.get('collection_id') != self.collection_id:
+                if not self.rebuilt_from or data.get('collection_id') != self.rebuilt_from:
+                    logging.info("Collection has been recreated, discarding stale manifest")
+                    return {}
+                # 集合重建后尚未关联新的集合ID，下次保存时写入
+                self._dirty = True
+            return data.get('files', {})
+        except Exception as e:
+            logging.error(f"Error loading manifest {self.path}: {str(e)}")
+            return {}
+
+    def rebind(self, collection_id: str):
+        """集合被原样重建（如压缩索引）后关联新的集合ID，保留已有的清单记录"""
+        with self._lock:
+            self.collection_id = collection_id
+            self._dirty = True
+        self.save()
+
+    def save(self):
+        """原子地写回清单文件（仅在有修改时写入）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({
+                'version': 1,
+                'collection_id': self.collection_id,
+                'files': self._entries
+            }, ensure_ascii=False)
+            self._dirty = False
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(normalize_path(file_path))
+            return dict(entry) if entry else None
+
+    def is_unchanged(self, file_path: str, size: int, mtime: float) -> bool:
+        """仅凭文件大小和修改时间判断文件是否未变化（无需打开文件）"""
+        entry = self.get(file_path)
+        return entry is not None and entry['size'] == size and entry['mtime'] == mtime
+
+    def find_digest(self, digest: str) -> Optional[str]:
+        """查找内容摘要相同的已索引文件路径"""
+        with self._lock:
+            return self._by_digest.get(digest)
+
+    def update(self, file_path: str, size: int, mtime: float, digest: str, chunk_ids: List[str],
+               duplicate_of: str = None):
+        path = normalize_path(file_path)
+        with self._lock:
+            old = self._entries.get(path)
+            if old:
+                self._unlink_locked(path, old)
+            self._entries[path] = {
+                'size': size,
+                'mtime': mtime,
+                'digest': digest,
+                'chunk_ids': list(chunk_ids)
+            }
+            if duplicate_of:
+                self._entries[path]['duplicate_of'] = duplicate_of
+                self._duplicates.setdefault(duplicate_of, set()).add(path)
+            self._by_digest[digest] = path
+            self._dirty = True
+
+    def remove(self, file_path: str) -> Optional[Dict[str, Any]]:
+        path = normalize_path(file_path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._unlink_locked(path, entry)
+                self._dirty = True
+            return entry
+
+    def _unlink_locked(self, path: str, entry: Dict[str, Any]):
+        """从反向索引中移除条目"""
+        if self._by_digest.get(entry['digest']) == path:
+            del self._by_digest[entry['digest']]
+        canonical = entry.get('duplicate_of')
+        if canonical and canonical in self._duplicates:
+            self._duplicates[canonical].discard(path)
+            if not self._duplicates[canonical]:
+                del self._duplicates[canonical]
+
+    def duplicates_of(self, file_path: str) -> List[str]:
+        """链接到该规范文件的近似重复文件路径"""
+        with self._lock:
+            return sorted(self._duplicates.get(normalize_path(file_path), ()))
+
+    def canonical_of(self, file_path: str) -> str:
+        """文件所属重复簇的规范文件路径（不是近似重复文件时返回自身）"""
+        path = normalize_path(file_path)
+        with self._lock:
+            entry = self._entries.get(path)
+            return (entry or {}).get('duplicate_of') or path
+
+    def paths(self, dir_path: str = None) -> List[str]:
+        """列出清单中的文件路径，可限定在某个目录下"""
+        with self._lock:
+            paths = list(self._entries)
+        if dir_path is None:
+            return paths
+        prefix = os.path.join(normalize_path(dir_path), '')
+        return [path for path in paths if path.startswith(prefix)]
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        """全部清单记录的副本（用于导出快照）"""
+        with self._lock:
+            return json.loads(json.dumps(self._entries))
+
+    def replace(self, entries: Dict[str, Dict[str, Any]]):
+        """用快照中的清单记录替换当前清单并写回"""
+        with self._lock:
+            self._entries = dict(entries)
+            self._build_lookups()
+            self._dirty = True
+        self.save()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
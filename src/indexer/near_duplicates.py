@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Optional, Iterable, Tuple
+from src.chunking import TOKEN_PATTERN
+from src.indexer.chroma_index import INDEX_DIR
+
+# 近似重复索引文件（SQLite，保存规范文件的MinHash签名和LSH分桶）
+NEAR_DUPLICATE_INDEX_PATH = os.path.join(INDEX_DIR, "near_duplicates.sqlite3")
+
+# MinHash参数：128个哈希函数，LSH分为32个带、每带4行，
+# 估计相似度约0.4以上的文档即成为候选，再用完整签名估计的Jaccard相似度确认
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# 文档按连续5个词元的n元组计算相似度；n元组过少的短文档不参与近似重复检测
+SHINGLE_SIZE = 5
+MIN_SHINGLES = 20
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# 固定随机种子，保证签名在进程之间、重启之后保持一致
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 29, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 29, size=NUM_PERM).astype(np.uint64)
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """文本的词元n元组集合，每个n元组哈希为32位整数"""
+    tokens = [token.lower() for token in TOKEN_PATTERN.findall(text)]
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+
+
+def minhash(text: str, block_size: int = 8192) -> Optional[np.ndarray]:
+    """计算文本的MinHash签名；n元组少于 MIN_SHINGLES 个时返回 None
+
+    分块计算，超大文档的内存占用与 block_size 相关而与文档长度无关。
+    """
+    hashes = _shingle_hashes(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    signature = np.full(NUM_PERM, _MERSENNE_PRIME, dtype=np.uint64)
+    _update_signature(signature, hashes, block_size)
+    return signature
+
+
+def _update_signature(signature: np.ndarray, hashes: np.ndarray, block_size: int = 8192):
+    for start in range(0, len(hashes), block_size):
+        block = hashes[start:start + block_size, None]
+        values = (block * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+        np.minimum(signature, values.min(axis=0), out=signature)
+
+
+class StreamingMinHash:
+    """逐段累计的MinHash签名，用于流式处理的大文件
+
+    各段签名逐元素取最小值，等价于所有段n元组并集的签名（跨段边界的n元组不计入），
+    内存占用与文件大小无关。
+    """
+
+    def __init__(self):
+        self._signature = np.full(NUM_PERM, _MERSENNE_PRIME, dtype=np.uint64)
+        self._shingles = 0
+
+    def update(self, text: str):
+        hashes = _shingle_hashes(text)
+        self._shingles += len(hashes)
+        _update_signature(self._signature, hashes)
+
+    def signature(self) -> Optional[np.ndarray]:
+        """累计的签名；n元组少于 MIN_SHINGLES 个时返回 None"""
+        if self._shingles < MIN_SHINGLES:
+            return None
+        return self._signature.copy()
+
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """由两个MinHash签名估计Jaccard相似度"""
+    return float(np.mean(a == b))
+
+
+def _band_keys(signature: np.ndarray) -> List[str]:
+    return [
+        hashlib.blake2b(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(), digest_size=8).hexdigest()
+        for band in range(LSH_BANDS)
+    ]
+
+
+class NearDuplicateIndex:
+    """基于MinHash/LSH的近似重复文档索引（线程安全），只记录规范文件（实际写入向量索引的文件）
+
+    find() 返回与给定签名相似度不低于阈值的规范文件，摄取时据此把近似重复的文件
+    链接到规范文件而不再切分和嵌入。每个签名带有链接范围（scope），指定 scope 时
+    只在同一范围内查找。索引记录所属集合的ID，集合被重建后自动清空。
+    """
+
+    def __init__(self, path: str = NEAR_DUPLICATE_INDEX_PATH, collection_id: str = None, rebuilt_from: str = None):
+        self.path = path
+        self.collection_id = collection_id
+        # 集合原样重建（压缩索引）前的ID，关联该ID的内容仍然有效
+        self.rebuilt_from = rebuilt_from
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS signatures (
+                    file_path TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    scope TEXT NOT NULL DEFAULT ''
+                );
+                CREATE TABLE IF NOT EXISTS bands (
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    file_path TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket);
+                CREATE INDEX IF NOT EXISTS bands_file ON bands (file_path);
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(signatures)")}
+            if 'scope' not in columns:
+                # 旧版本索引没有链接范围，已有签名的范围为空（不会再被带范围的查找匹配）
+                self._conn.execute("ALTER TABLE signatures ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+            if self.collection_id is None:
+                return
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'collection_id'").fetchone()
+            if row is not None and row[0] not in (self.collection_id, self.rebuilt_from):
+                logging.info("Collection has been recreated, discarding stale near-duplicate index")
+                self._conn.execute("DELETE FROM signatures")
+                self._conn.execute("DELETE FROM bands")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('collection_id', ?)", (self.collection_id,)
+            )
+
+    def rebind(self, collection_id: str):
+        """集合被原样重建（如压缩索引）后关联新的集合ID，保留已有的索引内容"""
+        with self._lock, self._conn:
+            self.collection_id = collection_id
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('collection_id', ?)", (collection_id,)
+            )
+
+    def add(self, file_path: str, signature: np.ndarray, scope: str = ""):
+        """记录规范文件的签名和链接范围（已存在时替换）"""
+        with self._lock, self._conn:
+            self._delete_locked([file_path])
+            self._conn.execute("INSERT INTO signatures (file_path, signature, scope) VALUES (?, ?, ?)",
+                               (file_path, signature.tobytes(), scope))
+            self._conn.executemany(
+                "INSERT INTO bands (band, bucket, file_path) VALUES (?, ?, ?)",
+                [(band, key, file_path) for band, key in enumerate(_band_keys(signature))]
+            )
+
+    def find(self, signature: np.ndarray, threshold: float, exclude: str = None,
+             scope: str = None) -> Optional[str]:
+        """查找相似度最高且不低于 threshold 的规范文件（指定 scope 时只查找同一范围内的规范文件）"""
+        keys = _band_keys(signature)
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(keys):
+                rows = self._conn.execute(
+                    "SELECT file_path FROM bands WHERE band = ? AND bucket = ?", (band, key)
+                ).fetchall()
+                candidates.update(row[0] for row in rows)
+            candidates.discard(exclude)
+
+            best, best_similarity = None, threshold
+            for file_path in candidates:
+                row = self._conn.execute(
+                    "SELECT signature, scope FROM signatures WHERE file_path = ?", (file_path,)
+                ).fetchone()
+                if scope is not None and row[1] != scope:
+                    continue
+                similarity = estimate_similarity(signature, np.frombuffer(row[0], dtype=np.uint64))
+                if similarity >= best_similarity:
+                    best, best_similarity = file_path, similarity
+        return best
+
+    def delete(self, file_paths: Iterable[str]):
+        file_paths = list(file_paths)
+        if not file_paths:
+            return
+        with self._lock, self._conn:
+            self._delete_locked(file_paths)
+
+    def _delete_locked(self, file_paths: List[str]):
+        self._conn.executemany("DELETE FROM signatures WHERE file_path = ?", [(p,) for p in file_paths])
+        self._conn.executemany("DELETE FROM bands WHERE file_path = ?", [(p,) for p in file_paths])
+
+    def signatures(self) -> List[Tuple[str, np.ndarray, str]]:
+        """全部规范文件的 (路径, 签名, 链接范围)（用于导出快照）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_path, signature, scope FROM signatures ORDER BY file_path"
+            ).fetchall()
+        return [(file_path, np.frombuffer(signature, dtype=np.uint64), scope) for file_path, signature, scope in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM signatures")
+            self._conn.execute("DELETE FROM bands")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
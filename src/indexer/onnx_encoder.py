@@ -0,0 +1,107 @@
+import os
+import logging
+import platform
+from typing import List
+import numpy as np
+
+# Hugging Face 上 sentence-transformers 模型仓库自带的ONNX导出文件
+ONNX_FP32_FILE = "onnx/model.onnx"
+# 预量化的int8模型：ARM使用arm64版本，x86使用兼容性最好的AVX2版本
+ONNX_INT8_FILES = {
+    'arm64': "onnx/model_qint8_arm64.onnx",
+    'aarch64': "onnx/model_qint8_arm64.onnx",
+}
+ONNX_INT8_DEFAULT_FILE = "onnx/model_quint8_avx2.onnx"
+
+# 与 sentence-transformers 中 MiniLM 的 max_seq_length 一致
+MAX_SEQ_LENGTH = 256
+
+
+def resolve_repo_id(model_name: str) -> str:
+    """模型简称补全为Hugging Face仓库名（与 SentenceTransformer 的解析规则一致）"""
+    if os.path.isdir(model_name) or "/" in model_name:
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+
+def default_onnx_file(quantized: bool) -> str:
+    """根据CPU架构选择ONNX模型文件"""
+    if not quantized:
+        return ONNX_FP32_FILE
+    return ONNX_INT8_FILES.get(platform.machine().lower(), ONNX_INT8_DEFAULT_FILE)
+
+
+class OnnxSentenceEncoder:
+    """基于ONNX Runtime的句向量编码器（mean pooling + L2归一化）
+
+    encode() 的参数和返回值与 SentenceTransformer.encode 兼容，
+    可以直接替换PyTorch后端；只依赖 onnxruntime、tokenizers 和 huggingface_hub。
+    """
+
+    def __init__(self, model_name: str, quantized: bool = False, onnx_file: str = None,
+                 batch_size: int = 32, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.onnx_file = onnx_file or default_onnx_file(quantized)
+        self.batch_size = batch_size
+
+        model_path = self._resolve_file(model_name, self.onnx_file)
+        tokenizer_path = self._resolve_file(model_name, "tokenizer.json")
+        logging.info(f"Loading ONNX embedding model {model_path}")
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def _resolve_file(model_name: str, filename: str) -> str:
+        """本地目录直接读取，否则从Hugging Face下载（使用本地缓存）"""
+        if os.path.isdir(model_name):
+            return os.path.join(model_name, filename)
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(resolve_repo_id(model_name), filename)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        # mean pooling：只对有效token取平均
+        mask = attention_mask[..., None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, convert_to_numpy: bool = True, normalize_embeddings: bool = True,
+               batch_size: int = None, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        batch_size = batch_size or self.batch_size
+        # 按长度排序后分批，减少padding
+        order = np.argsort([-len(s) for s in sentences])
+        embeddings = np.zeros((len(sentences), 0), dtype=np.float32)
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            batch_index = order[start:start + batch_size]
+            batches.append((batch_index, self._encode_batch([sentences[i] for i in batch_index])))
+        if batches:
+            embeddings = np.zeros((len(sentences), batches[0][1].shape[1]), dtype=np.float32)
+            for batch_index, batch_embeddings in batches:
+                embeddings[batch_index] = batch_embeddings
+
+        # sentence-transformers 的 MiniLM 模型自带 Normalize 层，这里总是归一化以保持一致
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings[0] if single else embeddings
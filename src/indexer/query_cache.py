@@ -0,0 +1,100 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from typing import Any, Dict
+from cachetools import TTLCache
+from src.config import (
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL
+)
+
+
+class QueryCache:
+    """线程安全的LRU/TTL缓存，记录命中率"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=max(1, maxsize), ttl=ttl)
+        self._lock = threading.Lock()
+        self.enabled = maxsize > 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        with self._lock:
+            value = self._cache.get(key, default)
+            if value is default:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._cache[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+
+# 查询向量缓存：/search、/mcp/file_search、/retrieve_answer 共享
+query_embeddings = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+# 搜索结果缓存：键中包含集合的索引代数，集合内容变化后旧结果自然失效
+search_results = QueryCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+# 每个集合的索引代数（本进程内每次写入/删除时递增）
+_generations = defaultdict(int)
+_generation_lock = threading.Lock()
+
+# 索引目录中的写入标记文件（与 chroma_index.INDEX_DIR 相同目录）：每次写入时更新其修改时间，
+# 其他进程（如 cli.py index）写入索引后，服务中已缓存的搜索结果同样失效
+GENERATION_MARKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../index", "generation")
+
+
+def _marker_mtime() -> int:
+    try:
+        return os.stat(GENERATION_MARKER_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def get_generation(collection_id):
+    """获取集合当前的索引代数：(本进程内的写入次数, 写入标记文件的修改时间)"""
+    with _generation_lock:
+        return _generations[str(collection_id)], _marker_mtime()
+
+
+def bump_generation(collection_id):
+    """集合内容发生变化时递增索引代数并更新写入标记文件，使该集合的搜索结果缓存失效"""
+    with _generation_lock:
+        _generations[str(collection_id)] += 1
+        now = time.time_ns()
+        with open(GENERATION_MARKER_PATH, 'a'):
+            pass
+        os.utime(GENERATION_MARKER_PATH, ns=(now, now))
+
+
+def cache_stats() -> Dict[str, Any]:
+    """获取缓存命中统计"""
+    return {
+        'query_embeddings': query_embeddings.stats(),
+        'search_results': search_results.stats()
+    }
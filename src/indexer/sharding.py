@@ -0,0 +1,301 @@
+import os
+import re
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable
+from src.indexer.embeddings import get_embedding_function
+from src.indexer.query_cache import bump_generation
+from src.config import SHARD_BY, SHARD_COUNT, SHARD_ROOT, SHARD_QUERY_WORKERS
+
+# 分片方式：none（单个集合）、directory（按 SHARD_ROOT 下的顶级目录）、
+# tenant（按元数据中的 tenant，没有时按顶级目录）、hash（按文件路径哈希到 SHARD_COUNT 个分片）
+SHARD_SCHEMES = ("none", "directory", "tenant", "hash")
+# 分片集合名前缀，分片集合名为 documents__<分片键>
+SHARD_PREFIX = "documents__"
+# 记录分片集合ID的空集合（名称不带分片前缀，不会被当作分片加载）
+SHARD_REGISTRY = "documents_shards"
+DEFAULT_SHARD = "default"
+
+# 分片查询共用的线程池（各分片并行检索）
+_fan_out = ThreadPoolExecutor(max_workers=max(1, SHARD_QUERY_WORKERS), thread_name_prefix="shard-query")
+
+
+def _top_directory(file_path: str, root: str) -> str:
+    path = os.path.abspath(file_path)
+    if root:
+        path = os.path.relpath(path, os.path.abspath(root))
+        if path.startswith(os.pardir):
+            return DEFAULT_SHARD
+    parts = [part for part in path.replace(os.sep, '/').split('/') if part]
+    return parts[0] if len(parts) > 1 else DEFAULT_SHARD
+
+
+def shard_key(metadata: Dict[str, Any], scheme: str = SHARD_BY, count: int = SHARD_COUNT,
+              root: str = SHARD_ROOT) -> str:
+    """根据分块元数据计算分片键（没有 file_path 的文档进入默认分片）"""
+    metadata = metadata or {}
+    if scheme == "tenant" and metadata.get('tenant'):
+        return safe_shard_key(str(metadata['tenant']))
+    file_path = metadata.get('file_path')
+    if not file_path:
+        return DEFAULT_SHARD
+    if scheme == "hash":
+        digest = hashlib.sha256(os.path.abspath(str(file_path)).encode('utf-8')).hexdigest()
+        return f"{int(digest, 16) % max(1, count):03d}"
+    return safe_shard_key(_top_directory(str(file_path), root))
+
+
+def safe_shard_key(key: str) -> str:
+    """把任意分片键转换为合法的Chroma集合名片段（替换过字符时追加哈希，避免不同键冲突）"""
+    safe = re.sub(r"[^A-Za-z0-9_-]+", "-", key).strip("-_")
+    if safe != key or not safe:
+        safe = f"{safe or 'shard'}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+    return safe
+
+
+class ShardedCollection:
+    """分片的文档集合：写入按分片键路由到 documents__<分片键> 集合，检索并行扇出到各分片后按距离合并
+
+    提供与本项目所用的Chroma Collection相同的接口子集（add/upsert/get/query/update/delete/count），
+    搜索、词法索引、清单等代码无需区分是否分片。每个分片是独立的Chroma集合（独立的HNSW索引），
+    可以单独构建、删除和重新加载；view() 返回只检索部分分片的视图（如只查询某个团队的分片）。
+    集合ID保存在 SHARD_REGISTRY 集合的元数据中，所有实例共享同一个ID；
+    drop_all() 或 reset_index 删除后重新生成（清单等据此判断索引是否被重建）。
+    metadata 为新建分片使用的集合元数据（HNSW参数）。
+    """
+
+    def __init__(self, client, scheme: str = SHARD_BY, count: int = SHARD_COUNT, root: str = SHARD_ROOT,
+                 metadata: Dict[str, Any] = None):
+        if scheme not in SHARD_SCHEMES or scheme == "none":
+            raise ValueError(f"不支持的分片方式: {scheme}，可选: {', '.join(SHARD_SCHEMES[1:])}")
+        self._client = client
+        self._embedding_function = get_embedding_function()
+        self.scheme = scheme
+        self.count_hint = count
+        self.root = root
+        self.metadata = dict(metadata or {"hnsw:space": "cosine"})
+        self.name = "documents"
+        self._lock = threading.Lock()
+        self._shards: Dict[str, Any] = {}
+        self._keys = None
+        self.id = None
+        self.reload()
+
+    def reload(self, key: str = None):
+        """重新打开分片集合（分片在其他进程中重建或恢复后调用），key 为空时重新加载全部分片"""
+        with self._lock:
+            names = [c if isinstance(c, str) else c.name for c in self._client.list_collections()]
+            names = [name for name in names if name.startswith(SHARD_PREFIX)]
+            if key is not None:
+                names = [name for name in names if name == SHARD_PREFIX + key]
+                self._shards.pop(key, None)
+            else:
+                self._shards = {}
+            for name in names:
+                self._shards[name[len(SHARD_PREFIX):]] = self._client.get_collection(
+                    name=name, embedding_function=self._embedding_function
+                )
+            # 已存在时 get_or_create_collection 返回原集合（忽略新的元数据），并发创建的实例得到同一个ID
+            registry = self._client.get_or_create_collection(
+                name=SHARD_REGISTRY,
+                embedding_function=self._embedding_function,
+                metadata={"sharding_id": str(uuid.uuid4())}
+            )
+            self.id = registry.metadata["sharding_id"]
+        # 重新加载的分片内容可能已变化，使搜索结果缓存失效
+        bump_generation(self.id)
+
+    def view(self, keys: Iterable[str]) -> 'ShardedCollection':
+        """只检索指定分片的视图（与原集合共享分片和ID，写入仍按分片键路由）"""
+        view = object.__new__(ShardedCollection)
+        view.__dict__.update(self.__dict__)
+        view._keys = sorted({safe_shard_key(key) for key in keys})
+        return view
+
+    @property
+    def shard_scope(self) -> Optional[str]:
+        """视图限定的分片（搜索结果缓存键的一部分），None 表示全部分片"""
+        return ",".join(self._keys) if self._keys is not None else None
+
+    def shard_names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._shards)
+
+    def shard_collections(self) -> Dict[str, Any]:
+        """分片键到分片集合的映射（用于逐个分片维护，如修改HNSW参数、重建索引）"""
+        with self._lock:
+            return dict(sorted(self._shards.items()))
+
+    def _targets(self) -> List[Any]:
+        with self._lock:
+            if self._keys is None:
+                return [self._shards[key] for key in sorted(self._shards)]
+            return [self._shards[key] for key in self._keys if key in self._shards]
+
+    def _shard(self, key: str):
+        with self._lock:
+            collection = self._shards.get(key)
+            if collection is None:
+                collection = self._client.get_or_create_collection(
+                    name=SHARD_PREFIX + key,
+                    embedding_function=self._embedding_function,
+                    metadata=self.metadata
+                )
+                self._shards[key] = collection
+                logging.info(f"Created index shard {SHARD_PREFIX + key}")
+            return collection
+
+    def key_for(self, metadata: Dict[str, Any]) -> str:
+        return shard_key(metadata, self.scheme, self.count_hint, self.root)
+
+    def _route(self, ids, metadatas, **columns) -> Dict[str, Dict[str, list]]:
+        """按分片键把写入拆分为每个分片一组"""
+        groups = {}
+        for i, chunk_id in enumerate(ids):
+            metadata = metadatas[i] if metadatas else None
+            group = groups.setdefault(self.key_for(metadata), {'ids': [], 'metadatas': [], **{
+                name: [] for name, values in columns.items() if values is not None
+            }})
+            group['ids'].append(chunk_id)
+            group['metadatas'].append(metadata)
+            for name, values in columns.items():
+                if values is not None:
+                    group[name].append(values[i])
+        return groups
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        for key, group in self._route(ids, metadatas, documents=documents, embeddings=embeddings).items():
+            self._shard(key).add(**group)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        for key, group in self._route(ids, metadatas, documents=documents, embeddings=embeddings).items():
+            self._shard(key).upsert(**group)
+
+    def _map(self, fn, collections=None) -> List[Any]:
+        """在各分片上并行执行 fn"""
+        collections = self._targets() if collections is None else collections
+        if len(collections) <= 1:
+            return [fn(collection) for collection in collections]
+        return list(_fan_out.map(fn, collections))
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 10, where=None,
+              include=("documents", "metadatas", "distances")):
+        """并行检索各分片，每个查询按距离合并各分片的前 n_results 个结果"""
+        include = list(include)
+        if query_embeddings is None:
+            query_embeddings = self._embedding_function(list(query_texts))
+        query_embeddings = list(query_embeddings)
+        fields = ['ids'] + [field for field in include if field != 'distances']
+
+        def run(collection):
+            return collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where,
+                                    include=list(set(include) | {'distances'}))
+
+        partials = self._map(run)
+        merged = {field: [] for field in fields + ['distances']}
+        for q in range(len(query_embeddings)):
+            candidates = []
+            for result in partials:
+                for i, distance in enumerate(result['distances'][q]):
+                    candidates.append((distance, result, i))
+            candidates.sort(key=lambda item: item[0])
+            top = candidates[:n_results]
+            for field in fields:
+                merged[field].append([result[field][q][i] for _, result, i in top])
+            merged['distances'].append([distance for distance, _, _ in top])
+        if 'distances' not in include:
+            del merged['distances']
+        return merged
+
+    def get(self, ids=None, where=None, limit: int = None, offset: int = None, include=("documents", "metadatas")):
+        """读取分块：按ID读取时并行查询各分片；分页读取时按分片名顺序跨分片分页"""
+        include = list(include)
+        fields = ['ids'] + include
+        merged = {field: [] for field in fields}
+
+        def extend(result, start=0):
+            for field in fields:
+                values = result[field] if result[field] is not None else []
+                merged[field].extend(list(values)[start:])
+
+        if ids is not None:
+            for result in self._map(lambda c: c.get(ids=list(ids), where=where, include=include)):
+                extend(result)
+            return merged
+
+        skip, remaining = offset or 0, limit
+        for collection in self._targets():
+            if remaining is not None and remaining <= 0:
+                break
+            if where is None:
+                size = collection.count()
+                if skip >= size:
+                    skip -= size
+                    continue
+                result = collection.get(limit=remaining, offset=skip or None, include=include)
+                skip = 0
+                extend(result)
+            else:
+                fetch = None if remaining is None else skip + remaining
+                result = collection.get(where=where, limit=fetch, include=include)
+                got = len(result['ids'])
+                extend(result, start=skip)
+                skip = max(0, skip - got)
+            if remaining is not None:
+                remaining = (limit or 0) - len(merged['ids'])
+        return merged
+
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        """更新已存在的分块（在分块所在的分片中更新，不会迁移到其他分片）"""
+        ids = list(ids)
+        positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+        def run(collection):
+            present = collection.get(ids=ids, include=[])['ids']
+            if not present:
+                return
+            index = [positions[chunk_id] for chunk_id in present]
+            collection.update(
+                ids=present,
+                documents=[documents[i] for i in index] if documents is not None else None,
+                metadatas=[metadatas[i] for i in index] if metadatas is not None else None,
+                embeddings=[embeddings[i] for i in index] if embeddings is not None else None
+            )
+
+        self._map(run, self._all())
+
+    def delete(self, ids=None, where=None):
+        self._map(lambda collection: collection.delete(ids=ids, where=where), self._all())
+
+    def _all(self) -> List[Any]:
+        """写操作总是作用于全部分片（不受视图限制）"""
+        with self._lock:
+            return [self._shards[key] for key in sorted(self._shards)]
+
+    def count(self) -> int:
+        return sum(self._map(lambda collection: collection.count()))
+
+    def stats(self) -> Dict[str, int]:
+        """各分片的分块数"""
+        with self._lock:
+            shards = dict(self._shards)
+        return {SHARD_PREFIX + key: collection.count() for key, collection in sorted(shards.items())}
+
+    def drop_shard(self, key: str) -> bool:
+        """删除一个分片集合（调用方负责同步清单和词法索引）"""
+        with self._lock:
+            collection = self._shards.pop(key, None)
+        if collection is None:
+            return False
+        self._client.delete_collection(name=SHARD_PREFIX + key)
+        bump_generation(self.id)
+        return True
+
+    def drop_all(self):
+        for key in self.shard_names():
+            self.drop_shard(key)
+        self._client.delete_collection(name=SHARD_REGISTRY)
+        self.reload()
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import numpy as np
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from src.indexer.chroma_index import (
+    INDEX_DIR,
+    iter_pages,
+    get_max_batch_size,
+    delete_documents,
+    embedding_model_key
+)
+from src.indexer.query_cache import bump_generation
+
+# 快照目录结构：
+#   snapshot.json          快照ID、嵌入模型、向量维度和各部分的列表
+#   part-NNNNN.npy         该部分分块的向量（float16，可用 np.load(mmap_mode='r') 直接映射）
+#   part-NNNNN.jsonl       与向量逐行对应的 {"id", "document", "metadata"}
+#   part-NNNNN.deleted.json  该部分删除的分块ID（增量快照）
+#   files.json             文件清单（恢复后未变化的文件不会重新索引）
+#   near_duplicates.npy / near_duplicates.json  近似重复检测的规范文件签名
+# 第一个部分是全量快照，之后每次快照只追加新增、修改和删除的分块
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILE = "snapshot.json"
+# 本地记录已恢复的快照部分，再次恢复同一快照时只应用新增的部分
+RESTORE_STATE_PATH = os.path.join(INDEX_DIR, "snapshot_state.json")
+
+
+def chunk_fingerprint(document: str, metadata: Dict[str, Any]) -> str:
+    """分块内容和元数据的指纹，用于判断增量快照中哪些分块发生了变化"""
+    payload = json.dumps([document, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+def _write_json(path: str, data: Any):
+    """原子地写入JSON文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str, default: Any = None) -> Any:
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """读取快照描述（snapshot.json），目录中没有快照时返回 None"""
+    info = _read_json(os.path.join(path, SNAPSHOT_FILE))
+    if info is not None and info.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本: {info.get('version')}")
+    return info
+
+
+def iter_part(path: str, part: str, batch_size: int) -> Iterator[Dict[str, Any]]:
+    """分批读取快照的一个部分，向量按批从内存映射的 .npy 文件转换为 float32"""
+    vectors = np.load(os.path.join(path, f"{part}.npy"), mmap_mode='r')
+    with open(os.path.join(path, f"{part}.jsonl"), 'r', encoding='utf-8') as f:
+        batch, start = [], 0
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) == batch_size:
+                yield _batch(batch, vectors, start)
+                start += len(batch)
+                batch = []
+        if batch:
+            yield _batch(batch, vectors, start)
+
+
+def _batch(rows: List[Dict[str, Any]], vectors: np.ndarray, start: int) -> Dict[str, Any]:
+    return {
+        'ids': [row['id'] for row in rows],
+        'documents': [row['document'] for row in rows],
+        'metadatas': [row['metadata'] for row in rows],
+        'embeddings': np.asarray(vectors[start:start + len(rows)], dtype=np.float32)
+    }
+
+
+def read_deleted(path: str, part: str) -> List[str]:
+    return _read_json(os.path.join(path, f"{part}.deleted.json"), [])
+
+
+def _fingerprints(path: str, info: Dict[str, Any]) -> Dict[str, str]:
+    """按顺序重放已有的快照部分，得到上次快照时每个分块的指纹"""
+    fingerprints = {}
+    for part in info['parts']:
+        for chunk_id in read_deleted(path, part['name']):
+            fingerprints.pop(chunk_id, None)
+        with open(os.path.join(path, f"{part['name']}.jsonl"), 'r', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                fingerprints[row['id']] = chunk_fingerprint(row['document'], row['metadata'])
+    return fingerprints
+
+
+def _write_part(collection, path: str, part: str, ids: List[str], dim: Optional[int],
+                batch_size: int) -> Tuple[int, Optional[int]]:
+    """导出指定分块的向量和内容，返回 (写入的分块数, 向量维度)
+
+    向量逐批写入预先分配的内存映射文件，导出大集合时内存占用与批大小相关；
+    导出期间被删除的分块会被跳过。
+    """
+    npy_path = os.path.join(path, f"{part}.npy")
+    tmp_path = os.path.join(path, f"{part}.tmp.npy")
+    vectors, written = None, 0
+    with open(os.path.join(path, f"{part}.jsonl"), 'w', encoding='utf-8') as f:
+        for start in range(0, len(ids), batch_size):
+            batch = collection.get(ids=ids[start:start + batch_size],
+                                   include=["embeddings", "documents", "metadatas"])
+            if not batch['ids']:
+                continue
+            embeddings = np.asarray(batch['embeddings'], dtype=np.float16)
+            if vectors is None:
+                dim = embeddings.shape[1]
+                vectors = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float16, shape=(len(ids), dim))
+            vectors[written:written + len(embeddings)] = embeddings
+            for chunk_id, document, metadata in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                f.write(json.dumps({'id': chunk_id, 'document': document, 'metadata': metadata},
+                                   ensure_ascii=False) + "\n")
+            written += len(batch['ids'])
+
+    if vectors is None:
+        np.save(npy_path, np.zeros((0, dim or 0), dtype=np.float16))
+        return 0, dim
+    vectors.flush()
+    if written < len(ids):
+        final = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.float16, shape=(written, dim))
+        final[:] = vectors[:written]
+        final.flush()
+        del final
+        del vectors
+        os.remove(tmp_path)
+    else:
+        del vectors
+        os.replace(tmp_path, npy_path)
+    return written, dim
+
+
+def _clear_snapshot(path: str):
+    for name in os.listdir(path):
+        if name == SNAPSHOT_FILE or name.startswith(("part-", "files.json", "near_duplicates.")):
+            os.remove(os.path.join(path, name))
+
+
+def create_snapshot(collection, path: str, full: bool = False, files: Dict[str, Any] = None,
+                    signatures: List[Tuple[str, np.ndarray, str]] = None, batch_size: int = None) -> Dict[str, Any]:
+    """把集合的分块（ID、内容、元数据、向量）导出到快照目录，返回本次快照的统计
+
+    目录中已有同一嵌入模型的快照时只追加变化的部分（增量快照），full 为 True 或模型不同时重新全量导出。
+    files 和 signatures 为随快照保存的文件清单和近似重复签名 (路径, 签名, 链接范围)（每次快照整体覆盖）。
+    """
+    start = time.perf_counter()
+    os.makedirs(path, exist_ok=True)
+    batch_size = batch_size or get_max_batch_size(collection)
+    model = list(embedding_model_key(collection))
+
+    info = None if full else read_snapshot(path)
+    if info is not None and info['model'] != model:
+        logging.info(f"Snapshot was taken with {info['model']}, taking a full snapshot for {model}")
+        info = None
+    if info is None:
+        _clear_snapshot(path)
+        info = {'version': SNAPSHOT_VERSION, 'id': str(uuid.uuid4()), 'model': model, 'dim': None,
+                'dtype': 'float16', 'parts': []}
+
+    # 只读取内容和元数据计算指纹，向量只为变化的分块读取
+    previous = _fingerprints(path, info)
+    current = {}
+    for page in iter_pages(collection, batch_size, ["documents", "metadatas"]):
+        for chunk_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+            current[chunk_id] = chunk_fingerprint(document, metadata)
+    changed = [chunk_id for chunk_id, fingerprint in current.items() if previous.get(chunk_id) != fingerprint]
+    deleted = sorted(set(previous) - set(current))
+
+    part = None
+    if changed or deleted or not info['parts']:
+        part = f"part-{len(info['parts']):05d}"
+        written, info['dim'] = _write_part(collection, path, part, changed, info['dim'], batch_size)
+        if deleted:
+            _write_json(os.path.join(path, f"{part}.deleted.json"), deleted)
+        info['parts'].append({'name': part, 'created': time.time(), 'chunks': written, 'deleted': len(deleted)})
+    else:
+        written = 0
+
+    if files is not None:
+        _write_json(os.path.join(path, "files.json"), files)
+    if signatures is not None:
+        paths = [[file_path, scope] for file_path, _, scope in signatures]
+        matrix = np.stack([signature for _, signature, _ in signatures]) if signatures else np.zeros((0, 0), np.uint64)
+        np.save(os.path.join(path, "near_duplicates.npy"), matrix)
+        _write_json(os.path.join(path, "near_duplicates.json"), paths)
+    # 最后写入描述文件：中途失败时快照仍停留在上一个完整的状态
+    _write_json(os.path.join(path, SNAPSHOT_FILE), info)
+
+    stats = {
+        'snapshot_id': info['id'],
+        'part': part,
+        'chunks': written,
+        'deleted': len(deleted),
+        'total_chunks': len(current),
+        'elapsed': time.perf_counter() - start
+    }
+    logging.info(f"Snapshot {path}: {written} chunks written, {len(deleted)} deleted "
+                 f"({len(current)} total) in {stats['elapsed']:.1f}s")
+    return stats
+
+
+def apply_part(collection, path: str, part: str, batch_size: int = None, lexical_index=None) -> Dict[str, int]:
+    """把快照的一个部分写入集合（使用快照中的向量，不调用嵌入模型）"""
+    batch_size = batch_size or get_max_batch_size(collection)
+    deleted = read_deleted(path, part)
+    if deleted:
+        delete_documents(collection, deleted)
+        if lexical_index is not None:
+            lexical_index.delete(deleted)
+
+    written = 0
+    for batch in iter_part(path, part, batch_size):
+        collection.upsert(**batch)
+        if lexical_index is not None:
+            lexical_index.add(zip(batch['ids'], batch['documents']))
+        written += len(batch['ids'])
+    bump_generation(collection.id)
+    return {'chunks': written, 'deleted': len(deleted)}
+
+
+def read_files(path: str) -> Optional[Dict[str, Any]]:
+    return _read_json(os.path.join(path, "files.json"))
+
+
+def read_signatures(path: str) -> List[Tuple[str, np.ndarray, str]]:
+    paths = _read_json(os.path.join(path, "near_duplicates.json"), [])
+    if not paths:
+        return []
+    matrix = np.load(os.path.join(path, "near_duplicates.npy"))
+    # 早期快照只保存了路径，链接范围为空
+    return [(entry, signature, "") if isinstance(entry, str) else (entry[0], signature, entry[1])
+            for entry, signature in zip(paths, matrix)]
+
+
+def load_restore_state(state_path: str = RESTORE_STATE_PATH) -> Dict[str, Any]:
+    return _read_json(state_path, {})
+
+
+def save_restore_state(state: Dict[str, Any], state_path: str = RESTORE_STATE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    _write_json(state_path, state)
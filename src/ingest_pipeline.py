@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Iterable, Callable, Optional
+from src.file_loader import load_file
+from src.indexer.manifest import file_digest
+
+
+def load_document(file_path: str) -> Dict[str, Any]:
+    """加载文件并补充文件级元数据（在工作进程中执行，必须可被pickle）"""
+    stat = os.stat(file_path)
+    document = load_file(file_path)
+    document['metadata']['file_path'] = file_path
+    document['metadata']['file_size'] = stat.st_size
+    document['metadata']['file_mtime'] = stat.st_mtime
+    document['metadata']['content_hash'] = file_digest(file_path)
+    return document
+
+
+class IngestPipeline:
+    """流水线式摄取：进程池解析 -> 批量收集 -> 单写入线程批量写入索引
+
+    - 解析阶段：ProcessPoolExecutor 并行执行 CPU 密集的文件加载器
+    - 批量阶段：主线程收集解析结果，凑满 batch_size 后提交给写入线程
+    - 写入阶段：唯一的写入线程调用 write_batch 批量写入集合，返回每个文档的处理结果
+    提交解析前先调用 check_skip，返回结果（如文件未变化）的文件不再解析；
+    stream_filter 选中的文件（如超大PDF）不经过进程池，由写入线程调用 stream_file 流式写入。
+    在途任务数（max_pending）和写入队列长度（queue_size）均有上限，
+    下游变慢时上游会阻塞等待，从而形成背压，内存占用保持有界。
+    """
+
+    def __init__(self, write_batch: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+                 workers: int = 4, batch_size: int = 64, queue_size: int = 256,
+                 check_skip: Callable[[str], Optional[Dict[str, Any]]] = None,
+                 stream_filter: Callable[[str], bool] = None,
+                 stream_file: Callable[[str], Dict[str, Any]] = None,
+                 report_interval: float = 10.0):
+        self.write_batch = write_batch
+        self.check_skip = check_skip
+        self.stream_filter = stream_filter
+        self.stream_file = stream_file
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.max_pending = self.workers * 2
+        self.report_interval = report_interval
+        self.stats = {'files': 0, 'indexed': 0, 'skipped': 0, 'errors': 0,
+                      'elapsed': 0.0, 'files_per_sec': 0.0}
+
+        self._results = []
+        self._lock = threading.Lock()
+        self._start = 0.0
+        self._last_report = 0.0
+
+    def run(self, file_paths: Iterable[str]) -> List[Dict[str, Any]]:
+        """运行流水线，返回每个文件的处理结果"""
+        self._start = self._last_report = time.perf_counter()
+        # 写入队列中的每一项是一个批次或一个待流式写入的文件路径，队列满时 put 会阻塞（背压）
+        batches = queue.Queue(maxsize=max(1, self.queue_size // self.batch_size))
+        writer = threading.Thread(target=self._writer_loop, args=(batches,), daemon=True)
+        writer.start()
+
+        batch = []
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                pending = {}
+                for file_path in file_paths:
+                    try:
+                        skipped = self.check_skip(file_path) if self.check_skip else None
+                        stream = skipped is None and self.stream_filter and self.stream_filter(file_path)
+                    except Exception as e:
+                        # 如文件在遍历目录之后被删除
+                        logging.error(f"Error processing file {file_path}: {str(e)}")
+                        self._record({'status': 'error', 'error': str(e), 'file_path': file_path})
+                        continue
+                    if skipped is not None:
+                        self._record(skipped)
+                        continue
+                    if stream:
+                        batches.put(file_path)
+                        continue
+                    if len(pending) >= self.max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        self._collect(done, pending, batch, batches)
+                    pending[pool.submit(load_document, file_path)] = file_path
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done, pending, batch, batches)
+
+            if batch:
+                batches.put(batch)
+        finally:
+            batches.put(None)
+            writer.join()
+
+        self._update_stats(final=True)
+        return self._results
+
+    def _collect(self, done, pending, batch, batches):
+        """收集已完成的解析任务，凑满一批后交给写入线程"""
+        for future in done:
+            file_path = pending.pop(future)
+            try:
+                document = future.result()
+            except Exception as e:
+                logging.error(f"Error processing file {file_path}: {str(e)}")
+                self._record({'status': 'error', 'error': str(e), 'file_path': file_path})
+                continue
+
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                batches.put(list(batch))
+                batch.clear()
+
+    def _writer_loop(self, batches):
+        """单写入线程：顺序消费批次并批量写入索引"""
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, str):
+                self._stream(batch)
+                continue
+            try:
+                for result in self.write_batch(batch):
+                    # 流水线模式下不保留文档全文，避免结果列表占用大量内存
+                    result.pop('document', None)
+                    self._record(result)
+            except Exception as e:
+                logging.error(f"Error writing batch of {len(batch)} documents: {str(e)}")
+                for document in batch:
+                    self._record({
+                        'status': 'error',
+                        'error': str(e),
+                        'file_path': document['metadata']['file_path']
+                    })
+
+    def _stream(self, file_path: str):
+        try:
+            self._record(self.stream_file(file_path))
+        except Exception as e:
+            logging.error(f"Error streaming file {file_path}: {str(e)}")
+            self._record({'status': 'error', 'error': str(e), 'file_path': file_path})
+
+    def _record(self, result: Dict[str, Any]):
+        with self._lock:
+            self._results.append(result)
+            self.stats['files'] += 1
+            if result['status'] == 'success':
+                self.stats['indexed'] += 1
+            elif result['status'] == 'skipped':
+                self.stats['skipped'] += 1
+            else:
+                self.stats['errors'] += 1
+            self._update_stats()
+
+    def _update_stats(self, final: bool = False):
+        now = time.perf_counter()
+        elapsed = now - self._start
+        self.stats['elapsed'] = elapsed
+        self.stats['files_per_sec'] = self.stats['files'] / elapsed if elapsed > 0 else 0.0
+
+        if final or now - self._last_report >= self.report_interval:
+            self._last_report = now
+            logging.info(
+                f"Ingested {self.stats['files']} files "
+                f"({self.stats['skipped']} skipped, {self.stats['errors']} errors) in {elapsed:.1f}s, "
+                f"{self.stats['files_per_sec']:.1f} files/sec"
+            )
@@ -1,24 +1,98 @@
 import os
 import logging
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Iterator, Callable
 from langchain.llms import LlamaCpp
 from langchain.chains import RetrievalQA
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain.vectorstores import Chroma
+from langchain.prompts import PromptTemplate
+from langchain.schema import BaseRetriever, Document
+from langchain.embeddings.base import Embeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.document_loaders import DirectoryLoader
+from src.indexer.embeddings import get_embedding_function
+from src.indexer.chroma_index import get_or_create_collection, search
+from src.chunking import estimate_tokens
+from src.context_packer import pack_passages
+from src.indexer.answer_cache import source_versions
+from src.config import (
+    LLM_PROMPT_CACHE,
+    LLM_PROMPT_CACHE_MB,
+    LLM_PROMPT_CACHE_DIR,
+    LLM_MAX_TOKENS,
+    LLM_CONTEXT_TOKENS,
+    LLM_CONTEXT_CANDIDATES,
+    LLM_CONTEXT_DEDUP_THRESHOLD
+)
 
 # 模型配置
 MODEL_PATH = os.environ.get("MODEL_PATH", "./models/llama-7b.ggmlv3.q4_0.bin")
 MODEL_N_CTX = int(os.environ.get("MODEL_N_CTX", 2048))
 MODEL_TEMPERATURE = float(os.environ.get("MODEL_TEMPERATURE", 0.1))
 
+# 问答提示：固定的系统提示放在最前面，启用提示缓存时这段前缀的KV状态可以在每次提问之间复用
+SYSTEM_PROMPT = (
+    "你是一个本地文件检索助手。请只根据下面提供的文档内容回答用户问题，"
+    "如果文档中没有相关信息，请直接说明无法回答，不要编造。\n\n"
+)
+QA_PROMPT = PromptTemplate(
+    template=SYSTEM_PROMPT + "文档内容:\n{context}\n\n用户问题: {question}\n回答:",
+    input_variables=["context", "question"]
+)
+
+
+class SharedEmbeddings(Embeddings):
+    """LangChain嵌入接口适配器，复用索引和搜索使用的同一个模型实例"""
+
+    def __init__(self):
+        self.embedding_function = get_embedding_function()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [embedding.tolist() for embedding in self.embedding_function(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class PackedRetriever(BaseRetriever):
+    """先多取候选文档，再按token预算打包（去重、按得分排序、截断），问答链只拼接打包后的文档"""
+
+    collection: Any
+    pack: Callable[[str, List[Dict[str, Any]]], List[Dict[str, Any]]]
+    k: int = LLM_CONTEXT_CANDIDATES
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        # 与搜索接口使用同一个集合（分片时并行检索各分片）
+        passages = [
+            {'content': hit['document'], 'metadata': hit['metadata'], 'score': hit['score']}
+            for hit in search(self.collection, query, n_results=self.k)
+        ]
+        return [
+            Document(page_content=passage['content'], metadata=passage['metadata'])
+            for passage in self.pack(query, passages)
+        ]
+
 
 class LLMIntegration:
-    def __init__(self, chroma_client):
+    """本地LLM问答：向量存储、检索器、提示模板和问答链在初始化时构建一次，之后每次提问复用
+
+    llm 参数用于注入其他LangChain LLM（测试和基准测试），默认加载本地LlamaCpp模型。
+    提供 answer_cache 时，ask() 先查找相似问题的缓存回答，生成的回答也写入缓存。
+    collection 为检索使用的文档集合（默认按配置打开，启用分片时为分片集合）。
+    """
+
+    def __init__(self, chroma_client, llm=None, answer_cache=None, collection=None):
         self.chroma_client = chroma_client
-        self.llm = self._init_llm()
-        self.embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.collection = collection if collection is not None else get_or_create_collection(chroma_client)
+        self.answer_cache = answer_cache
+        self.llm = llm if llm is not None else self._init_llm()
+        # LlamaCpp实例不支持并发调用，同一时间只允许一次生成
+        self._generate_lock = threading.Lock()
+        # 使用模型自身的分词器计算token数（注入的其他LLM使用近似估算）
+        self.count_tokens = self.llm.get_num_tokens if isinstance(self.llm, LlamaCpp) else estimate_tokens
+        self.embeddings = SharedEmbeddings()
+        self.prompt = QA_PROMPT
+        self.retriever = PackedRetriever(collection=self.collection, pack=self.pack_context)
+        self.qa_chain = self._build_qa_chain()
 
     def _init_llm(self):
         """初始化LLM模型"""
@@ -27,43 +101,88 @@ class LLMIntegration:
             llm = LlamaCpp(
                 model_path=MODEL_PATH,
                 n_ctx=MODEL_N_CTX,
+                max_tokens=LLM_MAX_TOKENS,
                 temperature=MODEL_TEMPERATURE,
                 verbose=False
             )
-            return llm
         except Exception as e:
             logging.error(f"Failed to load LLM model: {str(e)}")
             raise RuntimeError("LLM模型加载失败，请检查模型路径和配置")
 
-    def get_qa_chain(self):
-        """获取问答链"""
-        # 创建向量存储
-        vectorstore = Chroma(
-            client=self.chroma_client,
-            collection_name="documents",
-            embedding_function=self.embeddings
-        )
+        self._init_prompt_cache(llm)
+        return llm
+
+    def _init_prompt_cache(self, llm):
+        """为llama.cpp启用提示缓存（LLM_PROMPT_CACHE 为 ram 或 disk）
 
-        # 创建检索器
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        缓存按token前缀保存模型的KV状态，之后的提示只需计算与缓存前缀不同的部分。
+        启动时先计算一次系统提示，第一次提问即可命中。
+        """
+        if LLM_PROMPT_CACHE == "none":
+            return
+        try:
+            from llama_cpp import LlamaRAMCache, LlamaDiskCache
+            capacity = int(LLM_PROMPT_CACHE_MB * 1024 * 1024)
+            if LLM_PROMPT_CACHE == "disk":
+                cache = LlamaDiskCache(cache_dir=LLM_PROMPT_CACHE_DIR, capacity_bytes=capacity)
+            else:
+                cache = LlamaRAMCache(capacity_bytes=capacity)
+            llm.client.set_cache(cache)
+            llm.client.create_completion(SYSTEM_PROMPT, max_tokens=1)
+            logging.info(f"LLM prompt cache enabled ({LLM_PROMPT_CACHE}, {LLM_PROMPT_CACHE_MB} MB)")
+        except Exception as e:
+            logging.error(f"Failed to enable LLM prompt cache: {str(e)}")
 
-        # 创建问答链
-        qa_chain = RetrievalQA.from_chain_type(
+    def _build_qa_chain(self):
+        return RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True
+            retriever=self.retriever,
+            return_source_documents=True,
+            chain_type_kwargs={"prompt": self.prompt}
         )
 
-        return qa_chain
+    def get_qa_chain(self):
+        """获取问答链（初始化时已构建，直接复用）"""
+        return self.qa_chain
+
+    def pack_context(self, question: str, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把候选段落打包到上下文预算内
+
+        预算为 LLM_CONTEXT_TOKENS，且不超过 n_ctx 减去回答长度和提示模板本身占用的token数。
+        """
+        overhead = self.count_tokens(self.prompt.format(context="", question=question))
+        budget = min(LLM_CONTEXT_TOKENS, MODEL_N_CTX - LLM_MAX_TOKENS - overhead)
+        return pack_passages(passages, budget, self.count_tokens, LLM_CONTEXT_DEDUP_THRESHOLD)
+
+    def build_prompt(self, question: str, passages: List[Dict[str, Any]]) -> str:
+        """用同一提示模板构建问答提示（流式接口使用，保证与问答链的提示前缀一致）
+
+        passages 为带 'content' 和 'score' 的候选段落，按上下文预算打包后填入提示。
+        """
+        packed = self.pack_context(question, passages)
+        return self.prompt.format(context="\n\n".join(p['content'] for p in packed), question=question)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """逐token生成回答（LlamaCpp原生流式输出，生成第一个token后即可返回给客户端）"""
+        with self._generate_lock:
+            for token in self.llm.stream(prompt):
+                yield token
 
     def ask(self, question: str) -> Dict[str, Any]:
         """向LLM提问并获取回答"""
         try:
-            qa_chain = self.get_qa_chain()
-            result = qa_chain({"query": question})
+            embedding = None
+            if self.answer_cache is not None:
+                embedding = self.embeddings.embed_query(question)
+                cached = self.answer_cache.lookup(embedding, collection=self.collection)
+                if cached is not None:
+                    return {"answer": cached["answer"], "source_documents": cached["source_documents"]}
 
-            return {
+            with self._generate_lock:
+                result = self.qa_chain({"query": question})
+
+            answer = {
                 "answer": result["result"],
                 "source_documents": [
                     {
@@ -73,6 +192,13 @@ class LLMIntegration:
                     for doc in result["source_documents"]
                 ]
             }
+            if embedding is not None:
+                self.answer_cache.put(
+                    question, embedding, answer["answer"], answer["source_documents"],
+                    source_versions((doc.metadata.get('parent_id'), doc.metadata)
+                                    for doc in result["source_documents"])
+                )
+            return answer
         except Exception as e:
             logging.error(f"Error answering question: {str(e)}")
             return {
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class ExecutorBusyError(RuntimeError):
+    """执行器的并发数和排队数都已用满"""
+
+
+class BoundedExecutor:
+    """有界线程池：限制并发执行数和排队数，避免阻塞事件循环
+
+    同时运行的任务不超过 max_workers 个，另外最多 max_queue 个任务排队，
+    超出时立即抛出 ExecutorBusyError（由接口转换为503），而不是无限堆积。
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> asyncio.Future:
+        """提交阻塞函数并立即返回 asyncio.Future（没有空闲槽位时立即抛出 ExecutorBusyError）
+
+        槽位在线程中的函数执行结束（或任务开始前被取消）后才释放：
+        回调挂在线程池的 concurrent.futures.Future 上，等待方被取消时函数仍在执行，不会提前释放。
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorBusyError(f"{self.name} executor is busy")
+
+        with self._lock:
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            job = self._executor.submit(partial(self._call, fn, *args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+        job.add_done_callback(self._release)
+        return asyncio.wrap_future(job, loop=loop)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行阻塞函数并等待结果"""
+        return await self.submit(fn, *args, **kwargs)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def _call(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._pending - self._running,
+                'completed': self._completed,
+                'rejected': self._rejected
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
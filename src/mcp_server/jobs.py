@@ -0,0 +1,218 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+
+class JobQueue:
+    """持久化的后台摄取任务队列
+
+    任务和文件状态保存在 SQLite 中，服务重启后未完成的任务会重新排队。
+    start() 启动后台工作线程；测试中可直接调用 run_pending() 在当前线程内处理。
+    """
+
+    def __init__(self, db_path: str, process_upload: Callable[..., Dict[str, Any]]):
+        self.db_path = db_path
+        # process_upload(暂存路径, 原始文件名)：索引暂存文件，索引中记录上传文件的逻辑路径
+        self.process_upload = process_upload
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+        self._recover()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL
+                );
+                CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    spool_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    doc_id TEXT,
+                    chunks INTEGER,
+                    error TEXT,
+                    elapsed REAL,
+                    PRIMARY KEY (job_id, idx)
+                );
+            """)
+
+    def _recover(self):
+        """服务重启后，把中断时正在处理的任务和文件重新排队"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._conn.execute("UPDATE job_files SET status = 'queued' WHERE status = 'running'")
+
+    def submit(self, files: List[Tuple[str, str]]) -> str:
+        """提交任务，files 为 (原始文件名, 暂存文件路径) 列表，返回任务ID"""
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, created) VALUES (?, 'queued', ?)",
+                (job_id, time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, idx, filename, spool_path, status) VALUES (?, ?, ?, ?, 'queued')",
+                [(job_id, i, filename, spool_path) for i, (filename, spool_path) in enumerate(files)]
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，包括每个文件的进度、吞吐量和错误"""
+        with self._lock:
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            files = self._conn.execute(
+                "SELECT idx, filename, status, doc_id, chunks, error, elapsed "
+                "FROM job_files WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+
+        files = [dict(f) for f in files]
+        processed = [f for f in files if f['status'] in ('success', 'error')]
+        end_time = job['finished'] or time.time()
+        elapsed = end_time - job['started'] if job['started'] else 0.0
+
+        return {
+            'job_id': job['id'],
+            'status': job['status'],
+            'created': job['created'],
+            'started': job['started'],
+            'finished': job['finished'],
+            'total': len(files),
+            'processed': len(processed),
+            'succeeded': sum(1 for f in files if f['status'] == 'success'),
+            'failed': sum(1 for f in files if f['status'] == 'error'),
+            'elapsed': elapsed,
+            'files_per_sec': len(processed) / elapsed if elapsed > 0 else 0.0,
+            'files': files
+        }
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self.get_job(row['id']) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def run_pending(self) -> int:
+        """在当前线程中处理所有排队的任务，返回处理的任务数"""
+        count = 0
+        while not self._stopped.is_set():
+            job_id = self._next_job()
+            if job_id is None:
+                break
+            self._run_job(job_id)
+            count += 1
+        return count
+
+    def _next_job(self) -> Optional[str]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started = COALESCE(started, ?) WHERE id = ?",
+                (time.time(), row['id'])
+            )
+            return row['id']
+
+    def _run_job(self, job_id: str):
+        with self._lock:
+            files = self._conn.execute(
+                "SELECT idx, filename, spool_path FROM job_files "
+                "WHERE job_id = ? AND status = 'queued' ORDER BY idx", (job_id,)
+            ).fetchall()
+
+        for f in files:
+            if self._stopped.is_set():
+                return
+            self._run_file(job_id, f['idx'], f['filename'], f['spool_path'])
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'completed', finished = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+        logging.info(f"Ingestion job {job_id} completed")
+
+    def _run_file(self, job_id: str, idx: int, filename: str, spool_path: str):
+        self._update_file(job_id, idx, status='running')
+        start = time.perf_counter()
+        try:
+            result = self.process_upload(spool_path, filename)
+        except Exception as e:
+            result = {'status': 'error', 'error': str(e)}
+        elapsed = time.perf_counter() - start
+
+        if result['status'] == 'error':
+            logging.error(f"Job {job_id} failed on {filename}: {result.get('error')}")
+        self._update_file(
+            job_id, idx,
+            status='error' if result['status'] == 'error' else 'success',
+            doc_id=result.get('doc_id'),
+            chunks=len(result.get('chunk_ids', [])),
+            error=result.get('error'),
+            elapsed=elapsed
+        )
+
+        # 处理完成后删除暂存文件
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
+    def _update_file(self, job_id: str, idx: int, **fields):
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE job_files SET {assignments} WHERE job_id = ? AND idx = ?",
+                (*fields.values(), job_id, idx)
+            )
+
+    def start(self):
+        """启动后台工作线程"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._worker_loop, name="ingest-jobs", daemon=True)
+        self._thread.start()
+
+    def _worker_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                self.run_pending()
+            except Exception as e:
+                logging.error(f"Ingestion job worker error: {str(e)}")
+            self._wakeup.wait(timeout=5)
+
+    def stop(self):
+        """停止后台工作线程（正在处理的文件完成后退出，未完成的任务在下次启动时继续）"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
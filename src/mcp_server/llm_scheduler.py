@@ -0,0 +1,276 @@
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from src.mcp_server.executor import ExecutorBusyError
+from src.mcp_server.metrics import LatencyTracker
+
+
+class LLMTimeoutError(TimeoutError):
+    """请求在截止时间前没有完成生成"""
+
+
+class _Subscriber:
+    """订阅一次生成的客户端：生成线程通过事件循环把token投递到它的队列中"""
+
+    def __init__(self, deadline: float):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.deadline = deadline
+
+    def send(self, kind: str, value: Any = None) -> bool:
+        """投递消息；订阅者的事件循环已关闭时返回 False"""
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, (kind, value))
+            return True
+        except RuntimeError:
+            return False
+
+
+class _Generation:
+    """一次LLM生成，可被多个提出相同问题的请求共享"""
+
+    def __init__(self, key: str, prompt: str):
+        self.key = key
+        self.prompt = prompt
+        self.enqueued = time.monotonic()
+        self.deadline = 0.0
+        self.tokens: List[str] = []
+        self.subscribers: List[_Subscriber] = []
+        self.finished = False
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def subscribe(self, subscriber: _Subscriber) -> bool:
+        """加入订阅并补发已生成的token；生成已结束时返回 False"""
+        with self.lock:
+            if self.finished or self.cancelled.is_set():
+                return False
+            for token in self.tokens:
+                subscriber.send('token', token)
+            self.subscribers.append(subscriber)
+            self.deadline = max(self.deadline, subscriber.deadline)
+            return True
+
+    def unsubscribe(self, subscriber: _Subscriber) -> bool:
+        """退出订阅，最后一个订阅者退出时取消生成；返回生成是否因此被取消"""
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if not self.subscribers and not self.finished:
+                self.cancelled.set()
+                return True
+            return False
+
+    def push(self, token: str):
+        with self.lock:
+            self.tokens.append(token)
+            self._broadcast(kind='token', value=token)
+
+    def finish(self, kind: str = 'done', value: Any = None):
+        with self.lock:
+            self.finished = True
+            self._broadcast(kind, value)
+
+    def _broadcast(self, kind: str, value: Any):
+        """向所有订阅者投递消息（需持有 self.lock）
+
+        事件循环已关闭的订阅者被移除，全部订阅者都失效时取消生成。
+        """
+        alive = [subscriber for subscriber in self.subscribers if subscriber.send(kind, value)]
+        if len(alive) < len(self.subscribers):
+            logging.warning(f"Dropped {len(self.subscribers) - len(alive)} LLM subscribers with a closed event loop")
+            self.subscribers = alive
+            if not alive and not self.finished:
+                self.cancelled.set()
+
+
+class Subscription:
+    """一次问答请求对生成结果的订阅，以异步迭代器逐个产出token
+
+    迭代结束前退出（如客户端断开）会取消订阅；超过截止时间抛出 LLMTimeoutError。
+    """
+
+    def __init__(self, scheduler: 'LLMScheduler', generation: _Generation,
+                 subscriber: _Subscriber, coalesced: bool):
+        self._scheduler = scheduler
+        self._generation = generation
+        self._subscriber = subscriber
+        self.coalesced = coalesced
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        try:
+            while True:
+                remaining = self._subscriber.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMTimeoutError("LLM请求超时")
+                try:
+                    kind, value = await asyncio.wait_for(self._subscriber.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError("LLM请求超时")
+                if kind == 'token':
+                    yield value
+                elif kind == 'error':
+                    raise value
+                else:
+                    break
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        self._scheduler._unsubscribe(self._generation, self._subscriber)
+
+
+class LLMScheduler:
+    """LLM请求调度器：单个工作线程串行调用LLM（LlamaCpp实例不支持并发调用）
+
+    - 排队的生成数超过 max_queue 时立即拒绝（ExecutorBusyError，接口返回503）；
+      max_queue 为0时不排队，只在没有正在进行的生成时接受请求
+    - 相同提示的请求在生成结束前合并为一次生成，后加入的请求会先收到已生成的token
+    - 每个请求有独立的截止时间；所有订阅者都断开或超时后，生成在下一个token处停止
+    - stats() 提供排队深度、排队等待时间、生成耗时等指标
+    """
+
+    def __init__(self, generate: Callable[[str], Iterator[str]], max_queue: int, timeout: float):
+        self.generate = generate
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+
+        self._queue = deque()
+        self._inflight: Dict[str, _Generation] = {}
+        self._current: Optional[_Generation] = None
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+        self.wait_latency = LatencyTracker()
+        self.generation_latency = LatencyTracker()
+        self._counters = {'submitted': 0, 'coalesced': 0, 'rejected': 0,
+                          'completed': 0, 'cancelled': 0, 'timeouts': 0, 'errors': 0}
+
+    def submit(self, prompt: str, timeout: float = None) -> Subscription:
+        """提交生成请求（需在事件循环中调用），返回可异步迭代的订阅
+
+        工作线程未启动时（如未经过服务的 lifespan）在第一次提交时启动。
+        """
+        self.start()
+        subscriber = _Subscriber(time.monotonic() + (timeout or self.timeout))
+        key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+        with self._condition:
+            self._counters['submitted'] += 1
+            generation = self._inflight.get(key)
+            if generation is not None and generation.subscribe(subscriber):
+                self._counters['coalesced'] += 1
+                return Subscription(self, generation, subscriber, coalesced=True)
+
+            busy = self._current is not None or bool(self._queue)
+            if busy and len(self._queue) >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise ExecutorBusyError("llm scheduler queue is full")
+
+            generation = _Generation(key, prompt)
+            generation.subscribe(subscriber)
+            self._inflight[key] = generation
+            self._queue.append(generation)
+            self._condition.notify()
+            return Subscription(self, generation, subscriber, coalesced=False)
+
+    def _unsubscribe(self, generation: _Generation, subscriber: _Subscriber):
+        if not generation.unsubscribe(subscriber):
+            return
+        with self._condition:
+            # 尚未开始的生成直接出队，释放排队名额
+            if generation in self._queue:
+                self._queue.remove(generation)
+                self._counters['cancelled'] += 1
+            if self._inflight.get(generation.key) is generation:
+                del self._inflight[generation.key]
+
+    def start(self):
+        """启动工作线程"""
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._worker_loop, name="llm-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                generation = self._queue.popleft()
+                self._current = generation
+            try:
+                self._run(generation)
+            finally:
+                with self._condition:
+                    self._current = None
+                    if self._inflight.get(generation.key) is generation:
+                        del self._inflight[generation.key]
+
+    def _run(self, generation: _Generation):
+        started = time.monotonic()
+        self.wait_latency.record(started - generation.enqueued)
+        if started > generation.deadline:
+            self._count('timeouts')
+            generation.finish('error', LLMTimeoutError("LLM请求在排队中超时"))
+            return
+
+        tokens = None
+        try:
+            tokens = self.generate(generation.prompt)
+            for token in tokens:
+                if generation.cancelled.is_set():
+                    self._count('cancelled')
+                    return
+                if time.monotonic() > generation.deadline:
+                    self._count('timeouts')
+                    generation.finish('error', LLMTimeoutError("LLM请求超时"))
+                    return
+                generation.push(token)
+        except Exception as e:
+            logging.error(f"LLM generation failed: {str(e)}")
+            self._count('errors')
+            generation.finish('error', e)
+            return
+        finally:
+            # 提前停止时关闭生成器，让LLM结束本次推理
+            close = getattr(tokens, 'close', None)
+            if close is not None:
+                close()
+
+        self.generation_latency.record(time.monotonic() - started)
+        self._count('completed')
+        generation.finish()
+
+    def _count(self, name: str):
+        with self._condition:
+            self._counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            stats = dict(self._counters)
+            stats.update({
+                'max_queue': self.max_queue,
+                'queue_depth': len(self._queue),
+                'running': 1 if self._current is not None else 0,
+            })
+        stats['wait'] = self.wait_latency.stats()
+        stats['generation'] = self.generation_latency.stats()
+        return stats
@@ -1,31 +1,170 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Query
+import time
+import json
+import threading
+from datetime import datetime
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, File, UploadFile, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
 import os
+from src.config import (
+    SPOOL_DIR,
+    INGEST_CONCURRENCY,
+    INGEST_MAX_QUEUE,
+    SEARCH_CONCURRENCY,
+    SEARCH_MAX_QUEUE,
+    SEARCH_BATCH_MAX_QUERIES,
+    EMBEDDING_WARMUP,
+    LLM_MAX_QUEUE,
+    LLM_REQUEST_TIMEOUT,
+    WATCH_DIRS
+)
 from src.document_processor import DocumentProcessor
-from src.indexer.chroma_index import search
+from src.indexer.chroma_index import (
+    search,
+    search_batch,
+    dedupe_hits,
+    embed_queries,
+    embedding_model_key,
+    build_filter
+)
+from src.indexer.answer_cache import AnswerCache, source_versions
+from src.indexer.manifest import file_doc_id
+from src.indexer.query_cache import cache_stats
+from src.indexer.embeddings import warm_up, embedding_status
+from src.mcp_server.executor import BoundedExecutor, ExecutorBusyError
+from src.mcp_server.metrics import LatencyTracker
+from src.mcp_server.streaming import sse_event
+from src.mcp_server.llm_scheduler import LLMScheduler, LLMTimeoutError
+from src.mcp_server.jobs import JobQueue
+from src.mcp_server.spool import spool_upload
+
+# 解析/嵌入等CPU密集任务与搜索任务使用各自独立的有界线程池，
+# 上传高峰不会占满搜索的执行槽位，也不会阻塞事件循环
+ingest_executor = BoundedExecutor("ingest", INGEST_CONCURRENCY, INGEST_MAX_QUEUE)
+search_executor = BoundedExecutor("search", SEARCH_CONCURRENCY, SEARCH_MAX_QUEUE)
+
+# 问答延迟统计：首token耗时（TTFT，从收到请求算起）和完整回答耗时
+ttft_latency = LatencyTracker()
+answer_latency = LatencyTracker()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 嵌入模型在后台线程中预热，服务无需等待模型加载即可响应请求
+    if EMBEDDING_WARMUP:
+        threading.Thread(target=warm_up, name="embedding-warmup", daemon=True).start()
+    job_queue.start()
+    llm_scheduler.start()
+    if watcher is not None:
+        watcher.start()
+    yield
+    if watcher is not None:
+        watcher.stop()
+    llm_scheduler.stop()
+    job_queue.stop()
+    ingest_executor.shutdown()
+    search_executor.shutdown()
+
 
 app = FastAPI(
     title="MCP文件检索服务",
     description="基于MCP协议的文件检索与问答服务",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # 初始化文档处理器
 processor = DocumentProcessor()
 
+# 后台摄取任务队列（状态持久化在暂存目录中）
+job_queue = JobQueue(os.path.join(SPOOL_DIR, "jobs.sqlite3"), processor.process_upload)
+
+# 目录监视（配置了 WATCH_DIRS 时在后台增量索引这些目录）
+watcher = None
+if WATCH_DIRS:
+    from src.watcher import DirectoryWatcher
+    watcher = DirectoryWatcher(processor, WATCH_DIRS)
+
+# 语义回答缓存：相似问题且来源文件未变化时直接返回已生成的回答
+answer_cache = AnswerCache(model="/".join(embedding_model_key(processor.collection)))
+
+# 本地LLM在第一次问答时加载（langchain 和 llama.cpp 导入较慢，不影响服务启动）
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """获取共享的LLM集成实例"""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            from src.llm_integration import LLMIntegration
+            _llm = LLMIntegration(processor.client, answer_cache=answer_cache, collection=processor.collection)
+        return _llm
+
+
+# LLM调度器：单线程串行生成，排队、截止时间、断开取消，并合并相同问题的生成
+llm_scheduler = LLMScheduler(lambda prompt: get_llm().stream(prompt), LLM_MAX_QUEUE, LLM_REQUEST_TIMEOUT)
+
+
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request: Request, exc: ExecutorBusyError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 
 # 请求模型
+class SearchFilters(BaseModel):
+    """元数据过滤条件（由Chroma的元数据索引在向量检索之前过滤）"""
+    # 扩展名，如 [".pdf", ".docx"]
+    extensions: Optional[List[str]] = None
+    # 目录范围，如 "/legal/2025"
+    path_prefix: Optional[str] = None
+    # 文件修改时间范围（ISO 8601 或Unix时间戳）
+    modified_after: Optional[datetime] = None
+    modified_before: Optional[datetime] = None
+    # 文件大小范围（字节）
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+
+
 class SearchRequest(BaseModel):
     query: str
     limit: int = 3
     file_types: Optional[List[str]] = None
+    filters: Optional[SearchFilters] = None
+    # 搜索模式，默认使用配置中的 SEARCH_MODE
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+    # 只检索指定的分片（启用分片时有效），默认检索全部分片
+    shards: Optional[List[str]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    limit: int = 3
+    file_types: Optional[List[str]] = None
+    filters: Optional[SearchFilters] = None
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+    shards: Optional[List[str]] = None
+    # 为 true 时额外返回所有查询结果的去重并集
+    dedupe: bool = False
+
+
+class AnswerRequest(SearchRequest):
+    # 为 true 时以 Server-Sent Events 逐token返回，否则生成完成后一次性返回JSON
+    stream: bool = True
+    # 生成截止时间（秒），默认使用配置中的 LLM_REQUEST_TIMEOUT
+    timeout: Optional[float] = None
 
 
 class FileSearchResult(BaseModel):
     content: str
     metadata: Dict[str, Any]
     score: float
+    # 与该文件近似重复的其他文件（搜索结果按重复簇折叠）
+    duplicates: List[str] = []
 
 
 class SearchResponse(BaseModel):
@@ -36,83 +175,200 @@ class SearchResponse(BaseModel):
 # 健康检查
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "document_count": processor.get_document_count()}
+    return {
+        "status": "ok",
+        "document_count": processor.get_document_count(),
+        "cache": cache_stats(),
+        "embedding": embedding_status(),
+        "executors": {
+            "ingest": ingest_executor.stats(),
+            "search": search_executor.stats()
+        },
+        "jobs": job_queue.stats(),
+        "watcher": watcher.stats() if watcher is not None else None,
+        "shards": processor.collection.stats() if hasattr(processor.collection, 'stats') else None,
+        "llm": {
+            "loaded": _llm is not None,
+            "scheduler": llm_scheduler.stats(),
+            "ttft": ttft_latency.stats(),
+            "answer": answer_latency.stats(),
+            "answer_cache": answer_cache.stats()
+        }
+    }
 
 
-# 文件上传接口
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    try:
-        # 保存临时文件
-        temp_path = f"temp_{file.filename}"
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
+def _find_duplicate(filename: str, digest: str) -> Optional[Dict[str, Any]]:
+    """内容摘要与已索引文件相同时返回去重结果（无需解析和嵌入）"""
+    existing_path = processor.manifest.find_digest(digest)
+    if existing_path is None:
+        return None
+    return {
+        'status': 'success',
+        'duplicate': True,
+        'doc_id': file_doc_id(existing_path),
+        'duplicate_of': existing_path,
+        'filename': filename
+    }
 
-        # 处理文件
-        result = processor.process_file(temp_path)
 
-        # 清理临时文件
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+# 文件上传接口：按块流式写入唯一的暂存文件，边写边计算摘要，重复内容在解析前直接返回
+@app.post("/upload")
+async def upload_file(file: UploadFile = File(...), tenant: Optional[str] = Query(None)):
+    try:
+        spool_path, digest = await spool_upload(file)
+        try:
+            duplicate = _find_duplicate(file.filename, digest)
+            if duplicate is not None:
+                return duplicate
+
+            # 在解析线程池中处理文件（解析和嵌入不阻塞事件循环），索引中记录稳定的逻辑路径而不是暂存路径
+            metadata = {}
+            if tenant:
+                # SHARD_BY=tenant 时按租户写入对应的分片
+                metadata['tenant'] = tenant
+            return await ingest_executor.run(processor.process_upload, spool_path, file.filename, metadata, digest)
+        finally:
+            # 清理暂存文件
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+
+    except ExecutorBusyError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return result
 
+# 批量上传接口：文件流式写入暂存目录后作为后台摄取任务排队，立即返回任务ID
+@app.post("/upload/batch", status_code=202)
+async def upload_files(files: List[UploadFile] = File(...)):
+    spooled, duplicates, digests = [], [], set()
+    try:
+        for file in files:
+            spool_path, digest = await spool_upload(file)
+            duplicate = _find_duplicate(file.filename, digest)
+            if duplicate is None and digest in digests:
+                duplicate = {'status': 'success', 'duplicate': True, 'filename': file.filename}
+            if duplicate is not None:
+                os.remove(spool_path)
+                duplicates.append(duplicate)
+                continue
+            digests.add(digest)
+            spooled.append((file.filename, spool_path))
     except Exception as e:
+        for _, spool_path in spooled:
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
         raise HTTPException(status_code=500, detail=str(e))
 
+    job_id = job_queue.submit(spooled) if spooled else None
+    return {
+        "job_id": job_id,
+        "status": "queued" if job_id else "completed",
+        "total": len(spooled),
+        "duplicates": duplicates,
+        "status_url": f"/jobs/{job_id}" if job_id else None
+    }
 
-# 批量上传接口
-@app.post("/upload/batch")
-async def upload_files(files: List[UploadFile] = File(...)):
-    results = []
-    for file in files:
-        try:
-            temp_path = f"temp_{file.filename}"
-            with open(temp_path, "wb") as f:
-                f.write(await file.read())
 
-            result = processor.process_file(temp_path)
-            results.append(result)
+# 摄取任务状态查询
+@app.get("/jobs")
+def list_jobs(limit: int = Query(20, ge=1, le=200)):
+    return {"jobs": job_queue.list_jobs(limit)}
 
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
 
-        except Exception as e:
-            results.append({
-                'status': 'error',
-                'filename': file.filename,
-                'error': str(e)
-            })
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
 
-    return results
+
+def _request_filter(request) -> Optional[Dict[str, Any]]:
+    """把请求中的 file_types 和 filters 转换为Chroma过滤条件，条件无效时返回400"""
+    filters = request.filters or SearchFilters()
+    try:
+        return build_filter(
+            file_types=request.file_types,
+            extensions=filters.extensions,
+            path_prefix=filters.path_prefix,
+            modified_after=filters.modified_after.timestamp() if filters.modified_after else None,
+            modified_before=filters.modified_before.timestamp() if filters.modified_before else None,
+            min_size=filters.min_size,
+            max_size=filters.max_size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _request_collection(request):
+    """请求指定了 shards 时返回只检索这些分片的集合视图"""
+    if not request.shards:
+        return processor.collection
+    if not hasattr(processor.collection, 'view'):
+        raise HTTPException(status_code=400, detail="索引未启用分片（SHARD_BY=none）")
+    return processor.collection.view(request.shards)
+
+
+# 分片管理：查看各分片的分块数；分片在其他进程中重建或恢复后重新加载
+@app.get("/shards")
+def list_shards():
+    if not hasattr(processor.collection, 'stats'):
+        raise HTTPException(status_code=400, detail="索引未启用分片（SHARD_BY=none）")
+    return {"scheme": processor.collection.scheme, "shards": processor.collection.stats()}
+
+
+@app.post("/shards/reload")
+def reload_shards(key: Optional[str] = Query(None)):
+    if not hasattr(processor.collection, 'reload'):
+        raise HTTPException(status_code=400, detail="索引未启用分片（SHARD_BY=none）")
+    with processor.write_lock:
+        processor.collection.reload(key)
+    return {"status": "ok", "shards": processor.collection.stats()}
 
 
 @app.post("/search", response_model=SearchResponse)
-def file_search(request: SearchRequest):
+async def file_search(request: SearchRequest):
     try:
         # 构建过滤条件
-        filter = {}
-        if request.file_types:
-            filter["type"] = {"$in": request.file_types}
+        filter = _request_filter(request)
 
         # 执行搜索
-        results = search(processor.collection, request.query, request.limit, filter)
+        results = await search_executor.run(
+            search, _request_collection(request), request.query, request.limit, filter, group_by_file=True,
+            lexical_index=processor.lexical_index, mode=request.mode
+        )
+        results = processor.collapse_duplicates(results)
 
         return {
-            "results": results,
+            "results": [
+                {
+                    "content": hit["document"],
+                    "metadata": hit["metadata"],
+                    "score": hit["score"],
+                    "duplicates": hit.get("duplicates", [])
+                }
+                for hit in results
+            ],
             "total": len(results)
         }
 
+    except (ExecutorBusyError, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # MCP协议兼容接口
 @app.post("/mcp/file_search")
-def mcp_file_search(request: SearchRequest):
+async def mcp_file_search(request: SearchRequest):
     try:
         # 执行搜索
-        results = search(processor.collection, request.query, request.limit)
+        results = await search_executor.run(
+            search, _request_collection(request), request.query, request.limit, _request_filter(request),
+            group_by_file=True, lexical_index=processor.lexical_index, mode=request.mode
+        )
+        results = processor.collapse_duplicates(results)
 
         # 转换为MCP格式
         mcp_response = {
@@ -123,7 +379,8 @@ def mcp_file_search(request: SearchRequest):
                     {
                         "content": hit["document"],
                         "metadata": hit["metadata"],
-                        "score": hit["score"]
+                        "score": hit["score"],
+                        "duplicates": hit.get("duplicates", [])
                     }
                     for hit in results
                 ]
@@ -132,48 +389,225 @@ def mcp_file_search(request: SearchRequest):
 
         return mcp_response
 
+    except (ExecutorBusyError, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# 修正缩进后的检索与问答接口
-@app.post("/retrieve_answer")
-def retrieve_answer(request: SearchRequest):
+async def _run_batch_search(request: BatchSearchRequest) -> Dict[str, Any]:
+    """执行批量搜索，返回每个查询的结果（以及可选的去重并集）"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries 不能为空")
+    if len(request.queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"单次最多 {SEARCH_BATCH_MAX_QUERIES} 个查询")
+
+    filter = _request_filter(request)
+
+    results = await search_executor.run(
+        search_batch, _request_collection(request), request.queries, request.limit, filter, group_by_file=True,
+        lexical_index=processor.lexical_index, mode=request.mode
+    )
+    results = [processor.collapse_duplicates(hits) for hits in results]
+
+    def format_hit(hit):
+        return {"content": hit["document"], "metadata": hit["metadata"], "score": hit["score"],
+                "duplicates": hit.get("duplicates", [])}
+
+    response = {
+        "results": [
+            {"query": query, "results": [format_hit(hit) for hit in hits], "total": len(hits)}
+            for query, hits in zip(request.queries, results)
+        ]
+    }
+    if request.dedupe:
+        response["union"] = [dict(format_hit(hit), queries=hit["queries"]) for hit in dedupe_hits(results)]
+    return response
+
+
+# 批量搜索：所有查询一次嵌入、一次向量检索
+@app.post("/search/batch")
+async def file_search_batch(request: BatchSearchRequest):
     try:
-        # 执行搜索获取相关文档
-        results = search(processor.collection, request.query, request.limit)
+        return await _run_batch_search(request)
+    except (ExecutorBusyError, HTTPException):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if not results:
-            return {
-                "answer": "抱歉，没有找到与查询相关的文档。",
-                "source_documents": []
-            }
 
-        # 构建提示模板
-        prompt = (
-            f"用户问题: {request.query}\n\n"
-            f"参考以下文档内容回答问题:\n\n"
+@app.post("/mcp/file_search/batch")
+async def mcp_file_search_batch(request: BatchSearchRequest):
+    try:
+        response = await _run_batch_search(request)
+        return {
+            "name": "file_search_batch",
+            "parameters": dict(response, queries=request.queries)
+        }
+    except (ExecutorBusyError, HTTPException):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# 检索与问答接口：先返回来源文档，再逐token返回LLM的回答
+def _lookup_answer(query: str, scope: str):
+    """计算问题向量并查找语义回答缓存，返回 (问题向量, 缓存命中或 None)"""
+    embedding = embed_queries(processor.collection, [query])[0]
+    return embedding, answer_cache.lookup(embedding, scope, processor.collection)
+
+
+def _cached_answer_response(request: AnswerRequest, cached: Dict[str, Any], start: float):
+    """以与生成结果相同的格式返回缓存的回答"""
+    elapsed = time.perf_counter() - start
+    if not request.stream:
+        return {
+            "answer": cached["answer"],
+            "source_documents": cached["source_documents"],
+            "ttft": elapsed,
+            "elapsed": elapsed,
+            "coalesced": False,
+            "cached": True,
+            "similarity": cached["similarity"]
+        }
+
+    def events():
+        yield sse_event("sources", {"source_documents": cached["source_documents"]})
+        yield sse_event("token", {"text": cached["answer"]})
+        yield sse_event("done", {"ttft": elapsed, "elapsed": elapsed, "tokens": 1, "coalesced": False,
+                                 "cached": True, "similarity": cached["similarity"]})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _no_results_response(request: AnswerRequest, start: float):
+    """没有检索到相关文档时的回答，流式请求同样以事件流返回"""
+    answer = "抱歉，没有找到与查询相关的文档。"
+    if not request.stream:
+        return {
+            "answer": answer,
+            "source_documents": []
+        }
+
+    def events():
+        elapsed = time.perf_counter() - start
+        yield sse_event("sources", {"source_documents": []})
+        yield sse_event("token", {"text": answer})
+        yield sse_event("done", {"ttft": elapsed, "elapsed": elapsed, "tokens": 1, "coalesced": False,
+                                 "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/retrieve_answer")
+async def retrieve_answer(request: AnswerRequest):
+    start = time.perf_counter()
+    # 检索数量、搜索模式和过滤条件会影响回答，只在相同参数的请求之间复用缓存
+    filter = _request_filter(request)
+    scope = (f"{request.limit}:{request.mode or ''}:{json.dumps(filter, sort_keys=True, ensure_ascii=False)}"
+             f"{':' + ','.join(sorted(request.shards)) if request.shards else ''}")
+    try:
+        embedding, cached = await search_executor.run(_lookup_answer, request.query, scope)
+        if cached is not None:
+            return _cached_answer_response(request, cached, start)
+
+        # 执行搜索获取相关文档（查询向量已在查询缓存中）
+        results = await search_executor.run(
+            search, _request_collection(request), request.query, request.limit, filter, group_by_file=True,
+            lexical_index=processor.lexical_index, mode=request.mode
         )
 
-        # 添加检索结果到提示
-        source_documents = []
-        for i, hit in enumerate(results):
-            prompt += f"文档 {i + 1}:\n{hit['document']}\n\n"
-            source_documents.append({
+        if not results:
+            return _no_results_response(request, start)
+
+        source_documents = [
+            {
                 "content": hit["document"],
                 "metadata": hit["metadata"],
                 "score": hit["score"]
-            })
+            }
+            for hit in results
+        ]
+        versions = source_versions((hit["id"], hit["metadata"]) for hit in results)
+
+        try:
+            llm = await run_in_threadpool(get_llm)
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        # 每个文件命中的所有分块都作为候选段落，由LLM按上下文预算打包
+        passages = [
+            {"content": chunk["document"], "score": chunk["score"]}
+            for hit in results
+            for chunk in hit.get("chunks") or [hit]
+        ]
+        prompt = llm.build_prompt(request.query, passages)
+        # 在响应开始之前提交到调度器，队列已满时直接返回503
+        tokens = llm_scheduler.submit(prompt, timeout=request.timeout)
+
+    except (ExecutorBusyError, HTTPException):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 这里应该调用LLM模型，暂时返回提示
-        answer = "基于检索到的文档，答案如下:\n\n"
-        answer += "由于未连接实际的LLM模型，此处为示例回答。"
-        answer += "在实际部署中，这里会调用本地LLM生成回答。"
+    def remember(answer: str):
+        # 合并到同一次生成的请求只由发起生成的请求写入缓存
+        if not tokens.coalesced:
+            answer_cache.put(request.query, embedding, answer, source_documents, versions, scope)
 
+    if not request.stream:
+        answer, ttft = [], None
+        try:
+            async for token in tokens:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    ttft_latency.record(ttft)
+                answer.append(token)
+        except LLMTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        elapsed = time.perf_counter() - start
+        answer_latency.record(elapsed)
+        await run_in_threadpool(remember, "".join(answer))
         return {
-            "answer": answer,
-            "source_documents": source_documents
+            "answer": "".join(answer),
+            "source_documents": source_documents,
+            "ttft": ttft,
+            "elapsed": elapsed,
+            "coalesced": tokens.coalesced,
+            "cached": False
         }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    async def events():
+        yield sse_event("sources", {"source_documents": source_documents})
+        ttft, answer = None, []
+        try:
+            async for token in tokens:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    ttft_latency.record(ttft)
+                answer.append(token)
+                yield sse_event("token", {"text": token})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        elapsed = time.perf_counter() - start
+        answer_latency.record(elapsed)
+        await run_in_threadpool(remember, "".join(answer))
+        yield sse_event("done", {"ttft": ttft, "elapsed": elapsed, "tokens": len(answer),
+                                 "coalesced": tokens.coalesced, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,29 @@
+import threading
+from collections import deque
+from typing import Dict, Any
+
+
+class LatencyTracker:
+    """记录最近若干次耗时（秒），提供分位数统计"""
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {'count': count, 'p50': None, 'p95': None, 'max': None}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+        return {'count': count, 'p50': percentile(50), 'p95': percentile(95), 'max': samples[-1]}
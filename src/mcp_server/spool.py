@@ -0,0 +1,39 @@
+import os
+import uuid
+import hashlib
+from typing import Tuple
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from src.config import SPOOL_DIR, UPLOAD_CHUNK_SIZE
+
+
+def new_spool_path(filename: str) -> str:
+    """为上传文件生成唯一的暂存路径（保留扩展名以便选择加载器）"""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    _, ext = os.path.splitext(os.path.basename(filename or ''))
+    return os.path.join(SPOOL_DIR, f"{uuid.uuid4().hex}{ext.lower()}")
+
+
+def _copy_to_spool(source, spool_path: str) -> str:
+    """按固定大小的块把上传内容写入暂存文件，同时计算内容摘要
+
+    摘要与索引清单使用相同的算法（文件字节的SHA-256），可直接用于去重。
+    """
+    digest = hashlib.sha256()
+    with open(spool_path, 'wb') as f:
+        for block in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(block)
+            f.write(block)
+    return digest.hexdigest()
+
+
+async def spool_upload(file: UploadFile) -> Tuple[str, str]:
+    """把上传文件流式写入暂存目录（在线程池中执行，不阻塞事件循环），返回 (暂存路径, 内容摘要)"""
+    spool_path = new_spool_path(file.filename)
+    try:
+        digest = await run_in_threadpool(_copy_to_spool, file.file, spool_path)
+    except Exception:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+        raise
+    return spool_path, digest
@@ -0,0 +1,7 @@
+import json
+from typing import Any
+
+
+def sse_event(event: str, data: Any) -> str:
+    """格式化一条 Server-Sent Events 消息（data 为JSON，换行不会破坏事件边界）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
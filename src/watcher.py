@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Iterable, Tuple
+from watchfiles import watch, Change, DefaultFilter
+from src.config import WATCH_DEBOUNCE_MS, WATCH_INITIAL_SCAN
+from src.document_processor import DEFAULT_EXTENSIONS
+from src.indexer.manifest import normalize_path
+
+
+class DirectoryWatcher:
+    """监视目录变化并增量更新索引
+
+    watchfiles 在 debounce 时间窗口内汇总文件系统事件，同一批次中同一路径的多个事件
+    合并为一次处理：按处理时文件是否存在决定重新索引或从索引删除，因此新建、修改、
+    重命名（删除旧路径 + 新建新路径）都归结为这两种操作。整个目录被移入时遍历其中的文件，
+    被删除或移出时删除清单中该目录下的所有文件。一批变化的文件通过 process_files
+    批量写入，删除的文件合并为一次删除，大量文件同时变化（如 git checkout、rsync）时
+    不会逐个文件提交。
+    """
+
+    def __init__(self, processor, paths: List[str], extensions: List[str] = None,
+                 workers: int = None, batch_size: int = None, debounce_ms: int = WATCH_DEBOUNCE_MS):
+        self.processor = processor
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.extensions = [ext.lower() for ext in (extensions or DEFAULT_EXTENSIONS)]
+        self.workers = workers
+        self.batch_size = batch_size
+        self.debounce_ms = debounce_ms
+        self.stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'batches': 0, 'events': 0, 'indexed': 0, 'removed': 0, 'errors': 0,
+                       'last_batch_seconds': None, 'last_sync': None}
+
+    def _matches(self, path: str) -> bool:
+        return path.lower().endswith(tuple(self.extensions))
+
+    def apply_changes(self, changes: Iterable[Tuple[Change, str]]) -> Dict[str, Any]:
+        """把一批文件系统事件应用到索引，返回本批次的统计"""
+        start = time.perf_counter()
+        changes = set(changes)
+        # 同一路径的多个事件只处理一次，以处理时的文件状态为准
+        paths = {path for _, path in changes}
+
+        to_index, to_remove, removed_dirs = [], [], []
+        for path in sorted(paths):
+            if os.path.isfile(path):
+                if self._matches(path):
+                    to_index.append(path)
+            elif os.path.isdir(path):
+                # 整个目录被移入或复制进来
+                to_index.extend(self.processor._iter_files(path, self.extensions))
+            elif self._matches(path):
+                to_remove.append(path)
+            else:
+                # 可能是被删除或移出的目录
+                removed_dirs.append(os.path.join(normalize_path(path), ''))
+
+        # 持有处理器的写锁，与同时进行的上传和后台任务依次写入
+        with self.processor.write_lock:
+            if removed_dirs:
+                prefixes = tuple(removed_dirs)
+                to_remove.extend(path for path in self.processor.manifest.paths() if path.startswith(prefixes))
+
+            removed = self.processor.remove_files(to_remove) if to_remove else []
+            results = self.processor.process_files(to_index, self.workers, self.batch_size) if to_index else []
+            self.processor.manifest.save()
+
+        batch = {
+            'events': len(changes),
+            'indexed': sum(1 for r in results if r['status'] == 'success' and not r.get('unchanged')),
+            'removed': len(removed),
+            'errors': sum(1 for r in results if r['status'] == 'error'),
+            'elapsed': time.perf_counter() - start
+        }
+        with self._lock:
+            self._stats['batches'] += 1
+            for key in ('events', 'indexed', 'removed', 'errors'):
+                self._stats[key] += batch[key]
+            self._stats['last_batch_seconds'] = batch['elapsed']
+            self._stats['last_sync'] = time.time()
+
+        if batch['indexed'] or batch['removed'] or batch['errors']:
+            logging.info(f"Watcher applied {batch['events']} events: {batch['indexed']} indexed, "
+                         f"{batch['removed']} removed, {batch['errors']} errors in {batch['elapsed']:.2f}s")
+        return batch
+
+    def initial_scan(self):
+        """同步监视开始前发生的变化（清单只比较大小和修改时间，未变化的文件不会重新解析）"""
+        for path in self.paths:
+            self.processor.process_directory(path, self.extensions, self.workers, self.batch_size)
+
+    def run(self, initial_scan: bool = WATCH_INITIAL_SCAN):
+        """阻塞地监视目录，直到 stop() 被调用或收到中断信号"""
+        if initial_scan:
+            self.initial_scan()
+        logging.info(f"Watching {', '.join(self.paths)} for changes")
+        for changes in watch(*self.paths, watch_filter=DefaultFilter(), debounce=self.debounce_ms,
+                             stop_event=self.stop_event, raise_interrupt=False):
+            try:
+                self.apply_changes(changes)
+            except Exception as e:
+                logging.error(f"Error applying file changes: {str(e)}")
+                with self._lock:
+                    self._stats['errors'] += 1
+
+    def start(self, initial_scan: bool = WATCH_INITIAL_SCAN):
+        """在后台线程中监视目录"""
+        self.stop_event.clear()
+        self._thread = threading.Thread(target=self.run, args=(initial_scan,), name="directory-watcher",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, paths=self.paths, running=self._thread is not None)
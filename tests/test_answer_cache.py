@@ -0,0 +1,59 @@
+import numpy as np
+from src.indexer.answer_cache import AnswerCache, source_versions
+from src.indexer.chroma_index import get_chroma_client, get_or_create_collection
+
+
+def _vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_question_hits(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), threshold=0.95, max_entries=10)
+    cache.put("季度销售报告的结论是什么？", _vector(1, 0, 0), "销售增长。",
+              [{"content": "报告", "metadata": {}}], {}, scope="3:")
+
+    # 相似问题命中，不相似的问题和不同 scope 的请求不命中
+    hit = cache.lookup(_vector(1, 0.1, 0), scope="3:")
+    assert hit["answer"] == "销售增长。" and hit["similarity"] > 0.95
+    assert cache.lookup(_vector(0, 1, 0), scope="3:") is None
+    assert cache.lookup(_vector(1, 0, 0), scope="5:") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    # 重新打开后缓存仍然有效
+    cache.close()
+    reopened = AnswerCache(str(tmp_path / "answers.sqlite3"), threshold=0.95, max_entries=10)
+    assert reopened.lookup(_vector(1, 0, 0), scope="3:")["answer"] == "销售增长。"
+
+
+def test_eviction_keeps_recently_used(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), threshold=0.99, max_entries=2)
+    cache.put("a", _vector(1, 0, 0), "A", [], {})
+    cache.put("b", _vector(0, 1, 0), "B", [], {})
+    assert cache.lookup(_vector(1, 0, 0))["answer"] == "A"
+
+    # 超出容量时淘汰最久未使用的 b
+    cache.put("c", _vector(0, 0, 1), "C", [], {})
+    assert len(cache) == 2
+    assert cache.lookup(_vector(0, 1, 0)) is None
+    assert cache.lookup(_vector(1, 0, 0))["answer"] == "A"
+
+
+def test_stale_sources_are_dropped(tmp_path):
+    collection = get_or_create_collection(get_chroma_client())
+    collection.upsert(
+        ids=["answer_cache_file#0"],
+        documents=["预算审批需要部门经理签字。"],
+        metadatas=[{"parent_id": "answer_cache_file", "content_hash": "v1"}]
+    )
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), threshold=0.95, max_entries=10)
+    versions = source_versions([("answer_cache_file", {"content_hash": "v1"})])
+    cache.put("预算审批需要哪些步骤？", _vector(1, 0), "经理签字。", [], versions)
+    assert cache.lookup(_vector(1, 0), collection=collection)["answer"] == "经理签字。"
+
+    # 来源文件重新索引（内容摘要变化）后缓存的回答失效
+    collection.update(ids=["answer_cache_file#0"],
+                      metadatas=[{"parent_id": "answer_cache_file", "content_hash": "v2"}])
+    assert cache.lookup(_vector(1, 0), collection=collection) is None
+    assert cache.stats()["stale"] == 1 and len(cache) == 0
+
+    collection.delete(ids=["answer_cache_file#0"])
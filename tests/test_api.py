@@ -1,18 +1,22 @@
 import pytest
 from fastapi.testclient import TestClient
+import json
+from src.mcp_server import main
 from src.mcp_server.main import app, processor
-from src.indexer.chroma_index import reset_index
+from src.indexer.chroma_index import add_documents
 
 client = TestClient(app)
 
 
 @pytest.fixture(autouse=True)
 def setup_test():
-    # 重置索引
-    reset_index(processor.collection)
+    # 重置索引（重新创建集合，清单和词法索引等关联新的集合ID）
+    processor.reset()
+    main.answer_cache.clear()
     yield
     # 清理
-    reset_index(processor.collection)
+    processor.reset()
+    main.answer_cache.clear()
 
 
 def test_health_check():
@@ -34,6 +38,31 @@ def test_upload_file(tmpdir):
     assert "doc_id" in response.json()
 
 
+def test_upload_logical_path(tmpdir):
+    import uuid
+    from src.config import UPLOAD_PATH_PREFIX
+    content = f"上传文件逻辑路径测试 {uuid.uuid4().hex}。".encode("utf-8")
+
+    response = client.post("/upload", files={"file": ("report.txt", content)})
+    assert response.status_code == 200
+
+    # 索引中记录 <前缀>/<摘要>/<原始文件名>，而不是处理后被删除的暂存路径
+    paths = processor.manifest.paths()
+    assert len(paths) == 1
+    assert paths[0].replace("\\", "/").endswith("/report.txt")
+    hit = processor.collection.get(ids=response.json()["chunk_ids"][:1], include=["metadatas"])
+    assert hit["metadatas"][0]["file_path"].startswith(UPLOAD_PATH_PREFIX)
+
+    # 清除已删除文件时跳过上传文件，按前缀过滤可检索上传文件
+    assert processor.purge_missing() == []
+    assert processor.manifest.paths() == paths
+    response = client.post("/search", json={
+        "query": "逻辑路径", "filters": {"path_prefix": UPLOAD_PATH_PREFIX}
+    })
+    assert response.status_code == 200
+    assert len(response.json()["results"]) >= 1
+
+
 def test_search():
     # 先上传测试文档
     test_data = {
@@ -56,6 +85,28 @@ def test_search():
     assert "Python" in results[0]["content"]
 
 
+def test_search_filters():
+    add_documents(processor.collection, [
+        {"content": "法务部2025年的Python合同模板。", "type": "txt",
+         "metadata": {"file_path": "/legal/2025/template.txt", "file_size": 120, "file_mtime": 1735689600.0}},
+        {"content": "财务部的Python预算脚本说明。", "type": "txt",
+         "metadata": {"file_path": "/finance/budget.txt", "file_size": 80, "file_mtime": 1700000000.0}},
+    ], ids=["filter1", "filter2"])
+
+    # 目录范围和修改时间范围
+    response = client.post("/search", json={
+        "query": "Python", "limit": 5,
+        "filters": {"path_prefix": "/legal/2025", "modified_after": "2024-12-01T00:00:00"}
+    })
+    assert response.status_code == 200
+    assert [r["metadata"]["file_path"] for r in response.json()["results"]] == ["/legal/2025/template.txt"]
+
+    # 过深的目录范围返回400
+    deep = "/" + "/".join(f"d{i}" for i in range(40))
+    response = client.post("/search", json={"query": "Python", "filters": {"path_prefix": deep}})
+    assert response.status_code == 400
+
+
 def test_mcp_search():
     # 先上传测试文档
     test_data = {
@@ -78,3 +129,163 @@ def test_mcp_search():
     assert "parameters" in response.json()
     assert "results" in response.json()["parameters"]
     assert len(response.json()["parameters"]["results"]) >= 1
+
+
+def test_upload_batch_job(tmpdir):
+    from src.mcp_server.main import job_queue
+
+    files = []
+    for i in range(3):
+        test_file = tmpdir.join(f"batch{i}.txt")
+        test_file.write(f"批量上传测试文件{i}。")
+        files.append(("files", (f"batch{i}.txt", open(str(test_file), "rb"))))
+    files.append(("files", ("broken.docx", b"not a docx")))
+
+    response = client.post("/upload/batch", files=files)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    # 后台工作线程未启动时任务保持排队状态，用进程内工作器处理
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "queued"
+    job_queue.run_pending()
+
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "completed"
+    assert job["total"] == 4
+    assert job["processed"] == 4
+    assert [f["filename"] for f in job["files"]] == ["batch0.txt", "batch1.txt", "batch2.txt", "broken.docx"]
+    # 索引中记录上传文件的逻辑路径，暂存文件被删除后仍不会被清除
+    assert sorted(p.replace("\\", "/").rsplit("/", 1)[-1] for p in processor.manifest.paths()) == \
+        ["batch0.txt", "batch1.txt", "batch2.txt"]
+    assert processor.purge_missing() == []
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+def test_upload_duplicate_content(tmpdir):
+    import uuid
+    content = f"重复内容检测测试文件 {uuid.uuid4().hex}。".encode("utf-8")
+
+    first = client.post("/upload", files={"file": ("original.txt", content)})
+    assert first.status_code == 200
+    assert "duplicate" not in first.json()
+
+    # 相同内容以不同文件名上传时不再解析，直接返回已有文档
+    second = client.post("/upload", files={"file": ("copy.txt", content)})
+    assert second.status_code == 200
+    assert second.json()["duplicate"] is True
+    assert second.json()["doc_id"] == first.json()["doc_id"]
+
+    batch = client.post("/upload/batch", files=[("files", ("copy2.txt", content))])
+    assert batch.json()["job_id"] is None
+    assert len(batch.json()["duplicates"]) == 1
+
+
+def test_search_batch():
+    processor.collection.add(
+        ids=["batch1", "batch2"],
+        documents=["这是一个关于Python编程的测试文档。", "这是一个关于机器学习的测试文档。"],
+        metadatas=[{"category": "技术"}, {"category": "AI"}]
+    )
+
+    response = client.post("/search/batch", json={"queries": ["Python", "机器学习"], "dedupe": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert [r["query"] for r in body["results"]] == ["Python", "机器学习"]
+    assert all(r["total"] >= 1 for r in body["results"])
+    assert "union" in body
+
+    response = client.post("/mcp/file_search/batch", json={"queries": ["Python"]})
+    assert response.status_code == 200
+    assert response.json()["name"] == "file_search_batch"
+
+    # 空查询列表返回400
+    assert client.post("/search/batch", json={"queries": []}).status_code == 400
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def build_prompt(self, question, passages):
+        return question + "\n" + "\n".join(p["content"] for p in passages)
+
+    def stream(self, prompt):
+        assert "Python" in prompt
+        self.calls += 1
+        yield from ["Python", "是一种", "编程语言。"]
+
+
+def test_retrieve_answer_stream(monkeypatch):
+    processor.collection.add(
+        ids=["answer1"],
+        documents=["Python是一种广泛使用的高级编程语言。"],
+        metadatas=[{"type": "txt"}]
+    )
+    monkeypatch.setattr(main, "_llm", FakeLLM())
+
+    response = client.post("/retrieve_answer", json={"query": "Python是什么"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    # 先返回来源文档，再逐token返回回答，最后返回首token耗时
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events[0][0] == "sources"
+    assert "Python" in events[0][1]["source_documents"][0]["content"]
+    assert "".join(data["text"] for event, data in events if event == "token") == "Python是一种编程语言。"
+    assert events[-1][0] == "done"
+    assert events[-1][1]["tokens"] == 3 and events[-1][1]["ttft"] > 0
+
+    # 非流式模式一次性返回完整回答（检索数量不同，不使用上面请求的缓存回答）
+    response = client.post("/retrieve_answer", json={"query": "Python是什么", "limit": 2, "stream": False})
+    assert response.json()["answer"] == "Python是一种编程语言。"
+    assert response.json()["cached"] is False
+    assert client.get("/health").json()["llm"]["ttft"]["count"] >= 2
+
+
+def test_retrieve_answer_stream_no_results():
+    # 没有检索到文档时，流式请求同样返回事件流，以 done 事件结束
+    response = client.post("/retrieve_answer", json={"query": "Python是什么"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert [event for event, _ in events] == ["sources", "token", "done"]
+    assert events[0][1]["source_documents"] == []
+    assert "没有找到" in events[1][1]["text"]
+
+
+def test_retrieve_answer_cached(monkeypatch):
+    processor.collection.add(
+        ids=["cached1"],
+        documents=["Python是一种广泛使用的高级编程语言。"],
+        metadatas=[{"type": "txt", "content_hash": "v1"}]
+    )
+    llm = FakeLLM()
+    monkeypatch.setattr(main, "_llm", llm)
+
+    first = client.post("/retrieve_answer", json={"query": "Python语言是什么", "stream": False}).json()
+    assert first["cached"] is False
+
+    # 重复提问直接返回缓存的回答和来源，不再调用LLM
+    second = client.post("/retrieve_answer", json={"query": "Python语言是什么", "stream": False}).json()
+    assert second["cached"] is True
+    assert second["answer"] == first["answer"]
+    assert second["source_documents"][0]["content"] == first["source_documents"][0]["content"]
+    assert llm.calls == 1
+
+    # 流式请求同样命中缓存
+    response = client.post("/retrieve_answer", json={"query": "Python语言是什么"})
+    assert '"cached": true' in response.text
+    assert llm.calls == 1
+
+    # 来源文档重新索引后重新生成
+    processor.collection.update(ids=["cached1"], metadatas=[{"type": "txt", "content_hash": "v2"}])
+    third = client.post("/retrieve_answer", json={"query": "Python语言是什么", "stream": False}).json()
+    assert third["cached"] is False
+    assert llm.calls == 2
+    assert client.get("/health").json()["llm"]["answer_cache"]["hits"] == 2
@@ -0,0 +1,70 @@
+import pytest
+from src.chunking import estimate_tokens, split_sections, chunk_text, chunk_document
+
+
+def test_estimate_tokens():
+    # 中文逐字计数，英文单词整体计数
+    assert estimate_tokens("合同编号 ABC123") == 5
+    assert estimate_tokens("") == 0
+
+
+def test_split_sections_on_loader_markers():
+    text = "[段落1] 第一段\n\n[段落2] 第二段\n\n[表格1]\n姓名\t年龄\n张三\t25"
+    sections = split_sections(text)
+
+    assert [s['section'] for s in sections] == ['段落1', '段落2', '表格1']
+    assert "张三" in sections[2]['text']
+
+
+def test_chunk_text_respects_budget_and_overlap():
+    # 单个超长段按token窗口切分，相邻分块有重叠
+    text = "[段落1] " + " ".join(f"word{i}" for i in range(100))
+    chunks = chunk_text(text, chunk_size=30, chunk_overlap=5)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c['content']) <= 30 for c in chunks)
+    assert chunks[0]['content'].split()[-5:] == chunks[1]['content'].split()[:5]
+
+
+def test_chunk_text_rejects_invalid_overlap():
+    # 重叠不小于分块大小时窗口无法前进，直接报错
+    with pytest.raises(ValueError):
+        chunk_text("短文本", chunk_size=30, chunk_overlap=30)
+    with pytest.raises(ValueError):
+        chunk_text("短文本", chunk_size=30, chunk_overlap=-1)
+    # 不切分时不检查重叠
+    assert len(chunk_text("短文本", chunk_size=0, chunk_overlap=30)) == 1
+
+
+def test_chunk_text_packs_small_sections():
+    text = "\n\n".join(f"[幻灯片 {i}]\n标题: 第{i}页" for i in range(1, 7))
+    chunks = chunk_text(text, chunk_size=30, chunk_overlap=0)
+
+    assert 1 < len(chunks) < 6
+    assert chunks[0]['section'] == '幻灯片 1'
+    assert "".join(c['content'] for c in chunks).count("[幻灯片") == 6
+
+
+def test_chunk_document_metadata():
+    document = {
+        'content': "[工作表 'Sheet1']\n" + "\n".join(f"行{i}\t数据{i}" for i in range(200)),
+        'type': 'excel',
+        'status': 'success',
+        'metadata': {'file_path': '/tmp/test.xlsx'}
+    }
+    chunks = chunk_document(document, 'parent', chunk_size=50, chunk_overlap=10)
+
+    assert len(chunks) > 1
+    assert chunks[1]['id'] == 'parent:1'
+    assert all(c['metadata']['parent_id'] == 'parent' for c in chunks)
+    assert [c['metadata']['chunk_index'] for c in chunks] == list(range(len(chunks)))
+    assert all(c['metadata']['file_path'] == '/tmp/test.xlsx' for c in chunks)
+
+
+def test_chunk_document_start_index():
+    document = {'content': '[页面 3]\n第三页内容', 'type': 'pdf', 'metadata': {'page': 3}}
+    chunks = chunk_document(document, 'parent', start_index=7)
+
+    assert chunks[0]['id'] == 'parent:7'
+    assert chunks[0]['metadata']['page'] == 3
+    assert chunks[0]['metadata']['section'] == '页面 3'
@@ -0,0 +1,147 @@
+import chromadb
+import numpy as np
+import pytest
+from src.document_processor import DocumentProcessor
+from src.indexer.chroma_index import hnsw_metadata, hnsw_config, search
+from src.indexer.compaction import (
+    rebuild_collection,
+    compact_collection,
+    evaluate_search,
+    vacuum_index,
+    finish_interrupted_rebuilds,
+    REBUILT_FROM_KEY
+)
+from src.indexer.manifest import IndexManifest
+from src.indexer.embeddings import get_embedding_function
+from src.indexer.sharding import ShardedCollection
+
+
+def _fill(collection, n=300, dim=16, seed=0):
+    vectors = np.random.RandomState(seed).standard_normal((n, dim)).astype(np.float32)
+    collection.add(
+        ids=[f"c{i}" for i in range(n)],
+        embeddings=vectors.tolist(),
+        documents=[f"分块{i}" for i in range(n)],
+        metadatas=[{'file_path': f"/data/{i % 3}/f{i}.txt", 'parent_id': f"f{i}"} for i in range(n)]
+    )
+    # 模拟重新索引留下的删除
+    collection.delete(ids=[f"c{i}" for i in range(0, n, 4)])
+
+
+def test_rebuild_collection(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.get_or_create_collection(
+        name="documents", embedding_function=get_embedding_function(), metadata=hnsw_metadata()
+    )
+    _fill(collection)
+    before = collection.get(include=["embeddings", "documents", "metadatas"])
+
+    # 用新的HNSW参数重建，内容和向量保持不变
+    rebuilt = rebuild_collection(client, collection, hnsw_metadata(m=8, construction_ef=64, search_ef=50))
+    assert rebuilt.name == "documents" and [c.name for c in client.list_collections()] == ["documents"]
+    assert hnsw_config(rebuilt)['max_neighbors'] == 8 and hnsw_config(rebuilt)['ef_search'] == 50
+    after = rebuilt.get(ids=before['ids'], include=["embeddings", "documents", "metadatas"])
+    order = {chunk_id: i for i, chunk_id in enumerate(after['ids'])}
+    for i, chunk_id in enumerate(before['ids']):
+        assert after['documents'][order[chunk_id]] == before['documents'][i]
+        assert np.allclose(after['embeddings'][order[chunk_id]], before['embeddings'][i])
+
+    # 清理原集合遗留的HNSW段目录
+    vacuum_index(str(tmp_path))
+    assert len([p for p in tmp_path.iterdir() if p.is_dir()]) == 1
+
+    # 召回率评估：ef 越大召回率不降低，评估后恢复 search_ef
+    rows = evaluate_search(rebuilt, ef_values=[10, 200], n_queries=20, k=5, restore_ef=50)
+    assert [row['ef'] for row in rows] == [10, 200]
+    assert rows[1]['recall'] >= rows[0]['recall'] and rows[1]['recall'] > 0.9
+    assert hnsw_config(rebuilt)['ef_search'] == 50
+
+
+def test_compact_sharded_collection(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = ShardedCollection(client, scheme="directory", root="/data", metadata=hnsw_metadata())
+    _fill(collection)
+    count, collection_id = collection.count(), collection.id
+
+    # 逐个分片重建，分片集合ID保持不变
+    compacted = compact_collection(client, collection, hnsw_metadata(m=8))
+    assert compacted.count() == count and compacted.id == collection_id
+    assert compacted.shard_names() == ["0", "1", "2"]
+    assert all(hnsw_config(shard)['max_neighbors'] == 8 for shard in compacted.shard_collections().values())
+
+
+def test_processor_compact(tmpdir):
+    test_file = tmpdir.join("compact.txt")
+    test_file.write("压缩索引后清单和搜索结果保持不变。")
+    processor = DocumentProcessor()
+    processor.process_file(str(test_file))
+
+    stats = processor.compact()
+    assert stats['chunks'] == processor.get_document_count()
+
+    # 清单关联新的集合ID，未变化的文件仍被跳过；重建后的索引可以检索
+    assert processor.manifest.collection_id == str(processor.collection.id)
+    assert processor.process_file(str(test_file))['status'] == 'skipped'
+    reopened = DocumentProcessor()
+    assert reopened.manifest.get(str(test_file)) is not None
+    hits = search(reopened.collection, "压缩索引后清单", n_results=1)
+    assert "压缩索引" in hits[0]['document']
+
+    reopened.remove_files([str(test_file)])
+
+
+def test_rebuild_interrupted(tmp_path, monkeypatch):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.get_or_create_collection(
+        name="documents", embedding_function=get_embedding_function(), metadata=hnsw_metadata()
+    )
+    _fill(collection, n=40)
+    original_id = str(collection.id)
+    manifest = IndexManifest(str(tmp_path / "manifest.json"), collection_id=original_id)
+    manifest.update("/data/0/f1.txt", 1, 1.0, "digest", ["c1"])
+    manifest.save()
+
+    # 模拟在删除原集合之后、改名之前崩溃
+    delete_collection = client.delete_collection
+
+    def crash_after_delete(name):
+        delete_collection(name=name)
+        if name == "documents":
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(client, "delete_collection", crash_after_delete)
+    with pytest.raises(KeyboardInterrupt):
+        rebuild_collection(client, collection, hnsw_metadata(m=8))
+    monkeypatch.undo()
+
+    # 旧版本启动时创建了空的文档集合：恢复时仍以完整的重建副本为准
+    client.create_collection(name="documents")
+    assert finish_interrupted_rebuilds(client) == ["documents"]
+    restored = client.get_collection(name="documents")
+    assert restored.count() == 30 and [c.name for c in client.list_collections()] == ["documents"]
+    assert restored.metadata[REBUILT_FROM_KEY] == original_id
+
+    # 关联原集合ID的清单仍然有效
+    manifest = IndexManifest(str(tmp_path / "manifest.json"), collection_id=str(restored.id),
+                             rebuilt_from=original_id)
+    assert manifest.get("/data/0/f1.txt")['chunk_ids'] == ["c1"]
+    assert finish_interrupted_rebuilds(client) == []
+
+
+def test_rebuild_discards_completed_copy_when_original_intact(tmp_path, monkeypatch):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.get_or_create_collection(
+        name="documents", embedding_function=get_embedding_function(), metadata=hnsw_metadata()
+    )
+    _fill(collection, n=40)
+
+    # 模拟在删除原集合之前崩溃：原集合保持不变，下一次重建清理已完成的副本
+    monkeypatch.setattr(client, "delete_collection", lambda name: (_ for _ in ()).throw(KeyboardInterrupt))
+    with pytest.raises(KeyboardInterrupt):
+        rebuild_collection(client, collection, hnsw_metadata(m=8))
+    monkeypatch.undo()
+
+    assert finish_interrupted_rebuilds(client) == []
+    collection = client.get_collection(name="documents", embedding_function=get_embedding_function())
+    rebuilt = rebuild_collection(client, collection, hnsw_metadata(m=8))
+    assert rebuilt.count() == 30 and [c.name for c in client.list_collections()] == ["documents"]
@@ -0,0 +1,40 @@
+from src.chunking import estimate_tokens
+from src.context_packer import pack_passages, trim_to_tokens
+
+
+def test_pack_passages_orders_and_dedupes():
+    passages = [
+        {'content': '预算审批流程需要部门经理签字，然后提交财务部。', 'score': 0.5},
+        {'content': '季度销售报告显示华东地区收入增长了百分之十二。', 'score': 0.9},
+        # 与得分最高的段落近似重复，只保留一个
+        {'content': '季度销售报告显示华东地区收入增长了百分之十二。 ', 'score': 0.8},
+    ]
+
+    packed = pack_passages(passages, budget=1000)
+    assert [p['score'] for p in packed] == [0.9, 0.5]
+    assert not any(p['truncated'] for p in packed)
+
+
+def test_pack_passages_respects_budget():
+    long_text = "合同条款" * 200
+    passages = [
+        {'content': long_text, 'score': 0.9},
+        {'content': '付款周期为三十天。', 'score': 0.7},
+    ]
+
+    # 超出预算的段落被截断，总token数不超过预算
+    packed = pack_passages(passages, budget=100, min_tokens=10)
+    assert packed[0]['truncated']
+    assert sum(estimate_tokens(p['content']) for p in packed) <= 100
+
+    # 剩余预算不足 min_tokens 时不再截断放入
+    packed = pack_passages(passages, budget=5, min_tokens=10)
+    assert packed == []
+
+
+def test_trim_to_tokens():
+    text = "错误码 E-40412 表示设备离线"
+    trimmed = trim_to_tokens(text, 4)
+    assert text.startswith(trimmed)
+    assert estimate_tokens(trimmed) <= 4
+    assert trim_to_tokens(text, 100) == text
@@ -1,5 +1,7 @@
 import os
+import pytest
 from src.document_processor import DocumentProcessor
+from src.indexer.manifest import normalize_path
 
 
 def test_process_file():
@@ -35,8 +37,296 @@ def test_process_directory(tmpdir):
     results = processor.process_directory(str(test_dir))
 
     assert len(results) == 2
-    assert all(r['status'] == 'success' for r in results)
+    # 空PDF加载失败，不写入索引
+    statuses = {os.path.basename(r['file_path']): r['status'] for r in results}
+    assert statuses == {'test1.txt': 'success', 'test2.pdf': 'error'}
 
     # 验证文档数量
     count = processor.get_document_count()
-    assert count >= 2
+    assert count >= 1
+
+
+def test_process_directory_pipelined(tmpdir):
+    # 创建多个临时文件
+    test_dir = tmpdir.mkdir("pipeline_dir")
+    for i in range(5):
+        test_dir.join(f"doc{i}.txt").write(f"这是第{i}个流水线测试文件。")
+
+    processor = DocumentProcessor()
+    results = processor.process_directory(str(test_dir), workers=2, batch_size=2)
+
+    assert len(results) == 5
+    assert all(r['status'] == 'success' for r in results)
+    assert processor.last_ingest_stats['files'] == 5
+    assert processor.last_ingest_stats['files_per_sec'] > 0
+
+
+def test_pipelined_missing_file(tmpdir):
+    # 遍历之后被删除的文件记为错误，其余文件照常索引
+    test_dir = tmpdir.mkdir("vanished_dir")
+    paths = [str(test_dir.join(f"doc{i}.txt")) for i in range(3)]
+    for i, path in enumerate(paths):
+        with open(path, "w") as f:
+            f.write(f"这是第{i}个会被删除的流水线测试文件。")
+    missing = str(test_dir.join("gone.txt"))
+
+    processor = DocumentProcessor()
+    results = {r['file_path']: r for r in processor.process_files(paths + [missing], workers=2, batch_size=2)}
+
+    assert results[missing]['status'] == 'error'
+    assert all(results[path]['status'] == 'success' for path in paths)
+    assert all(processor.manifest.get(path) for path in paths)
+    processor.remove_files(paths)
+
+
+def test_interrupted_run_keeps_manifest(tmpdir, monkeypatch):
+    # 每批写入后保存清单：运行中断时已写入的文件不需要重新嵌入
+    import src.document_processor as document_processor
+    from src.indexer.manifest import IndexManifest
+    test_dir = tmpdir.mkdir("interrupted_dir")
+    paths = [str(test_dir.join(f"doc{i}.txt")) for i in range(3)]
+    for i, path in enumerate(paths):
+        with open(path, "w") as f:
+            f.write(f"这是第{i}个中断测试文件。")
+
+    load_document = document_processor.load_document
+
+    def interrupt_on_last(file_path):
+        if file_path == paths[-1]:
+            raise KeyboardInterrupt
+        return load_document(file_path)
+
+    processor = DocumentProcessor()
+    monkeypatch.setattr(document_processor, "load_document", interrupt_on_last)
+    with pytest.raises(KeyboardInterrupt):
+        processor.process_files(paths, workers=1, batch_size=1)
+
+    saved = IndexManifest(processor.manifest.path, collection_id=str(processor.collection.id))
+    assert saved.get(paths[0]) and saved.get(paths[1]) and saved.get(paths[2]) is None
+    processor.remove_files(paths[:2])
+
+
+def test_incremental_reindex(tmpdir):
+    test_dir = tmpdir.mkdir("incremental_dir")
+    keep_file = test_dir.join("keep.txt")
+    keep_file.write("这个文件不会变化。")
+    change_file = test_dir.join("change.txt")
+    change_file.write("这是修改前的内容。")
+    delete_file = test_dir.join("delete.txt")
+    delete_file.write("这个文件稍后会被删除。")
+
+    processor = DocumentProcessor()
+    results = processor.process_directory(str(test_dir))
+    assert all(r['status'] == 'success' for r in results)
+    count = processor.get_document_count()
+
+    # 未变化的文件直接跳过
+    results = processor.process_directory(str(test_dir))
+    assert all(r['status'] == 'skipped' for r in results)
+    assert processor.get_document_count() == count
+
+    # 修改的文件替换旧分块，删除的文件从索引中清除
+    change_file.write("这是修改后的内容，长度也不一样。")
+    delete_file.remove()
+    results = processor.process_directory(str(test_dir))
+    statuses = {os.path.basename(r['file_path']): r['status'] for r in results}
+    assert statuses == {'keep.txt': 'skipped', 'change.txt': 'success'}
+    assert processor.last_ingest_stats['purged'] == 1
+    assert processor.get_document_count() == count - 1
+
+
+def test_process_large_pdf_streaming(tmpdir, monkeypatch):
+    from tests.test_file_loader import write_text_pdf
+    import src.document_processor as document_processor
+
+    # 所有PDF都走流式写入，每两页写入一次
+    monkeypatch.setattr(document_processor, 'STREAM_THRESHOLD_MB', 0)
+    monkeypatch.setattr(document_processor, 'STREAM_WINDOW', 2)
+
+    pdf_path = str(tmpdir.join("large.pdf"))
+    write_text_pdf(pdf_path, [f"Contract clause {i}" for i in range(1, 6)])
+
+    processor = DocumentProcessor()
+    result = processor.process_file(pdf_path)
+
+    assert result['status'] == 'success'
+    assert len(result['chunk_ids']) == 5
+    pages = processor.collection.get(ids=result['chunk_ids'])['metadatas']
+    assert sorted(m['page'] for m in pages) == [1, 2, 3, 4, 5]
+
+    # 内容未变化时不重新解析
+    os.utime(pdf_path, None)
+    assert processor.process_file(pdf_path)['unchanged'] is True
+
+
+def test_lexical_index_sync(tmpdir):
+    test_dir = tmpdir.mkdir("lexical_dir")
+    sku_file = test_dir.join("sku.txt")
+    sku_file.write("库存清单：SKU-88421-B 红色外壳，共120件。")
+
+    processor = DocumentProcessor()
+    processor.process_file(str(sku_file))
+    hits = processor.lexical_index.search("SKU-88421-B")
+    assert hits[0][0] in processor.manifest.get(str(sku_file))['chunk_ids']
+
+    # 修改后旧分块被替换，删除后词法索引中也不再有该文件
+    sku_file.write("库存清单：SKU-99107-C 蓝色外壳，共80件。")
+    processor.process_file(str(sku_file))
+    assert processor.lexical_index.search("88421") == []
+    assert processor.lexical_index.search("SKU-99107-C")
+
+    processor.remove_file(str(sku_file))
+    assert processor.lexical_index.search("99107") == []
+
+
+def test_near_duplicate_linking(tmpdir):
+    # 同一份合同的多个副本只索引一次
+    text = " ".join(f"近似重复合同条款{i} 甲方乙方 clause-{i} dedupe-test" for i in range(80))
+    test_dir = tmpdir.mkdir("copies")
+    original = test_dir.join("合同 v2 final.txt")
+    original.write(text)
+    copy = test_dir.join("合同 v2 final (1).txt")
+    copy.write(text.replace("条款3 ", "第三条 "))
+
+    processor = DocumentProcessor()
+    if processor._duplicate_scope({'file_path': str(original)}) != processor._duplicate_scope({'file_path': str(copy)}):
+        pytest.skip("两个副本被哈希到不同的分片，不会互相链接")
+    results = {r['file_path']: r for r in processor.process_directory(str(test_dir))}
+    canonical, duplicate = sorted(results, key=lambda p: bool(results[p].get('duplicate_of')))
+    assert results[duplicate]['duplicate_of'] == processor.manifest.canonical_of(canonical)
+    assert results[duplicate]['chunk_ids'] == []
+    assert processor.manifest.duplicates_of(canonical) == [normalize_path(duplicate)]
+
+    # 搜索结果按重复簇折叠，命中中列出其他副本
+    hits = [{'metadata': {'file_path': canonical}}, {'metadata': {'file_path': duplicate}}]
+    collapsed = processor.collapse_duplicates(hits)
+    assert len(collapsed) == 1 and len(collapsed[0]['duplicates']) == 1
+
+    # 规范文件被删除后，原副本重新索引为规范文件
+    os.remove(canonical)
+    processor.process_directory(str(test_dir))
+    entry = processor.manifest.get(duplicate)
+    assert entry['chunk_ids'] and not entry.get('duplicate_of')
+
+    processor.remove_file(duplicate)
+
+
+def test_streamed_near_duplicate_linking(tmpdir):
+    # 流式写入的 .xlsx 副本同样链接到规范文件，不在索引中重复
+    from openpyxl import Workbook
+
+    test_dir = tmpdir.mkdir("xlsx_copies")
+    paths = []
+    for name, last in (("orders.xlsx", "final"), ("orders (1).xlsx", "draft")):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Orders")
+        sheet.append(["OrderNo", "Customer", "Status"])
+        for i in range(1, 201):
+            sheet.append([f"PO-{i:05d}", f"customer-{i % 13}", last if i == 200 else "shipped"])
+        path = str(test_dir.join(name))
+        workbook.save(path)
+        paths.append(path)
+
+    processor = DocumentProcessor(chunk_size=60, chunk_overlap=0)
+    if processor._duplicate_scope({'file_path': paths[0]}) != processor._duplicate_scope({'file_path': paths[1]}):
+        pytest.skip("两个副本被哈希到不同的分片，不会互相链接")
+    canonical = processor.process_file(paths[0])
+    duplicate = processor.process_file(paths[1])
+    assert canonical['chunk_ids'] and not canonical.get('duplicate_of')
+    assert duplicate['duplicate_of'] == normalize_path(paths[0])
+    assert duplicate['chunk_ids'] == []
+    assert processor.collection.get(where={'file_path': paths[1]})['ids'] == []
+
+    # 内容未变化时仍保持链接；规范文件被删除后副本重新流式写入
+    os.utime(paths[1], None)
+    assert processor.process_file(paths[1])['duplicate_of'] == normalize_path(paths[0])
+    processor.remove_file(paths[0])
+    entry = processor.manifest.get(paths[1])
+    assert entry['chunk_ids'] and not entry.get('duplicate_of')
+
+    processor.remove_file(paths[1])
+
+
+def test_load_error_not_indexed(tmpdir):
+    # 加载失败的文件不写入分块、不记入清单，下次处理时重试
+    broken = tmpdir.join("broken.docx")
+    broken.write("不是有效的docx文件")
+
+    processor = DocumentProcessor()
+    for result in (processor.process_file(str(broken)),
+                   processor.process_files([str(broken)])[0]):
+        assert result['status'] == 'error'
+        assert result['error'].startswith("Error")
+        assert processor.manifest.get(str(broken)) is None
+    assert processor.collection.get(where={'file_path': str(broken)})['ids'] == []
+
+
+def test_near_duplicates_scoped_to_directory(tmpdir):
+    # 不同目录中的副本分别索引，按目录前缀过滤时不会漏掉
+    text = " ".join(f"跨目录合同条款{i} 甲方乙方 clause-{i} scope-test" for i in range(80))
+    first = tmpdir.mkdir("legal").join("合同.txt")
+    first.write(text)
+    second = tmpdir.mkdir("sales").join("合同.txt")
+    second.write(text)
+
+    processor = DocumentProcessor()
+    results = processor.process_files([str(first), str(second)])
+    assert not any(r.get('duplicate_of') for r in results)
+    assert all(r['chunk_ids'] for r in results)
+
+    # 之后处理的同目录副本仍链接到该目录中的规范文件
+    copy = tmpdir.join("sales").join("合同 (1).txt")
+    copy.write(text)
+    if processor._duplicate_scope({'file_path': str(second)}) != processor._duplicate_scope({'file_path': str(copy)}):
+        processor.remove_files([str(first), str(second)])
+        pytest.skip("两个副本被哈希到不同的分片，不会互相链接")
+    result = processor.process_file(str(copy))
+    assert result['duplicate_of'] == normalize_path(str(second))
+
+    processor.remove_files([str(first), str(second), str(copy)])
+
+
+def test_small_xlsx_streamed_with_chunk_size(tmpdir):
+    # .xlsx 不论文件大小都流式写入，行块按处理器的分块大小切分
+    from openpyxl import Workbook
+    from src.chunking import estimate_tokens
+
+    xlsx_path = str(tmpdir.join("orders.xlsx"))
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Orders")
+    sheet.append(["OrderNo", "SKU", "Amount"])
+    for i in range(1, 301):
+        sheet.append([f"PO-{i:05d}", f"SKU{i % 97}", i * 10])
+    workbook.create_sheet("Empty")
+    workbook.save(xlsx_path)
+
+    processor = DocumentProcessor(chunk_size=60, chunk_overlap=0)
+    result = processor.process_file(xlsx_path)
+    assert result['status'] == 'success' and 'document' not in result
+
+    documents = processor.collection.get(ids=result['chunk_ids'])['documents']
+    assert len(documents) == len(result['chunk_ids'])
+    assert all(estimate_tokens(document) <= 60 for document in documents)
+    assert any(document.endswith("空表") for document in documents)
+
+    processor.remove_file(xlsx_path)
+
+
+def test_writes_serialized(tmpdir):
+    # 多个线程共用同一个处理器时，写入操作在写锁上依次执行
+    import threading
+
+    test_file = tmpdir.join("locked.txt")
+    test_file.write("写锁测试文件，另一个线程持有写锁时等待。")
+    processor = DocumentProcessor()
+    results = []
+    worker = threading.Thread(target=lambda: results.append(processor.process_file(str(test_file))))
+
+    with processor.write_lock:
+        worker.start()
+        worker.join(timeout=1)
+        assert worker.is_alive() and results == []
+    worker.join(timeout=30)
+    assert results[0]['status'] == 'success'
+
+    processor.remove_file(str(test_file))
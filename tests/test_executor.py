@@ -0,0 +1,75 @@
+import time
+import asyncio
+from src.mcp_server.executor import BoundedExecutor, ExecutorBusyError
+
+
+def test_bounded_executor_runs_off_event_loop():
+    executor = BoundedExecutor("test", max_workers=2, max_queue=0)
+
+    async def main():
+        start = time.perf_counter()
+        # 两个阻塞任务并发执行，事件循环在此期间保持可用
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        results = await asyncio.gather(
+            executor.run(time.sleep, 0.1),
+            executor.run(time.sleep, 0.1),
+            ticker()
+        )
+        return time.perf_counter() - start, ticks, results
+
+    elapsed, ticks, _ = asyncio.run(main())
+
+    assert elapsed < 0.19
+    assert len(ticks) == 5
+    assert executor.stats()['completed'] == 2
+    executor.shutdown()
+
+
+def test_bounded_executor_rejects_when_full():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=1)
+
+    async def main():
+        tasks = [asyncio.ensure_future(executor.run(time.sleep, 0.1)) for _ in range(3)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert sum(isinstance(r, ExecutorBusyError) for r in results) == 1
+    assert executor.stats()['rejected'] == 1
+    executor.shutdown()
+
+
+
+def test_bounded_executor_cancel_keeps_slot():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=0)
+
+    async def main():
+        # 等待方被取消时线程中的函数仍在执行，槽位不能提前释放
+        task = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.sleep(0.01)
+        try:
+            await executor.run(time.sleep, 0)
+            busy = False
+        except ExecutorBusyError:
+            busy = True
+        stats = executor.stats()
+        # 函数执行结束后释放槽位
+        await asyncio.sleep(0.3)
+        return busy, stats, await executor.run(lambda: "done")
+
+    busy, stats, result = asyncio.run(main())
+
+    assert busy
+    assert stats['running'] == 1 and stats['queued'] == 0
+    assert result == "done"
+    assert executor.stats() == {'max_workers': 1, 'max_queue': 0, 'running': 0, 'queued': 0,
+                                'completed': 2, 'rejected': 1}
+    executor.shutdown()
@@ -1,3 +1,4 @@
+import pytest
 import os
 from src.file_loader import load_file
 
@@ -168,3 +169,97 @@ def test_load_ppt():
 
     # 清理
     os.remove('test.pptx')
+
+
+def write_text_pdf(file_path, pages):
+    """生成每页包含一行文本的简单PDF"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out, offsets = "%PDF-1.4\n", []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(file_path, "w", encoding="latin-1") as f:
+        f.write(out)
+
+
+def test_iter_pdf_pages(tmpdir):
+    from src.file_loader import iter_file
+
+    pdf_path = str(tmpdir.join("pages.pdf"))
+    write_text_pdf(pdf_path, [f"Page number {i}" for i in range(1, 4)])
+
+    pages = list(iter_file(pdf_path))
+
+    assert [p['metadata']['page'] for p in pages] == [1, 2, 3]
+    assert pages[2]['content'].startswith("[页面 3]")
+    assert "Page number 3" in pages[2]['content']
+
+    # load_pdf 返回完整文档，不再截断
+    result = load_file(pdf_path)
+    assert result['status'] == 'success'
+    assert result['metadata']['num_pages'] == 3
+    assert "Page number 1" in result['content'] and "Page number 3" in result['content']
+
+
+def test_iter_excel_blocks(tmpdir):
+    from openpyxl import Workbook
+    from src.file_loader import iter_excel_blocks
+
+    xlsx_path = str(tmpdir.join("large.xlsx"))
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Orders")
+    sheet.append(["OrderNo", "SKU", "Amount"])
+    for i in range(1, 2501):
+        sheet.append([f"PO-{i:05d}", f"SKU{i % 97}", i * 10])
+    workbook.save(xlsx_path)
+
+    blocks = list(iter_excel_blocks(xlsx_path, block_rows=100, max_tokens=0))
+
+    # 所有行都被读取，没有1000行上限
+    assert len(blocks) == 25
+    assert blocks[-1]['metadata']['row_end'] == 2501
+    assert "PO-02500" in blocks[-1]['content']
+    # 每个行块都重复表头
+    assert all(b['content'].split("\n")[1] == "OrderNo\tSKU\tAmount" for b in blocks)
+    assert blocks[1]['content'].startswith("[工作表 'Orders'] 行 102-201")
+
+    # 按token预算切分时每个行块不超过预算
+    from src.chunking import estimate_tokens
+    blocks = list(iter_excel_blocks(xlsx_path, block_rows=1000, max_tokens=120))
+    assert all(estimate_tokens(b['content']) <= 120 for b in blocks)
+    assert sum(len(b['content'].split("\n")) - 2 for b in blocks) == 2500
+
+    # iter_file 把 max_tokens 传给行块加载器；不支持流式加载的类型直接报错
+    from src.file_loader import iter_file
+    assert [b['content'] for b in iter_file(xlsx_path, max_tokens=120)] == [b['content'] for b in blocks]
+    with pytest.raises(ValueError):
+        iter_file(str(tmpdir.join("notes.txt")))
+
+
+def test_iter_excel_blocks_empty_sheet(tmpdir):
+    from openpyxl import Workbook
+    from src.file_loader import iter_excel_blocks
+
+    xlsx_path = str(tmpdir.join("empty.xlsx"))
+    workbook = Workbook()
+    workbook.active.title = "Blank"
+    workbook.create_sheet("HeaderOnly").append(["OrderNo", "SKU"])
+    workbook.save(xlsx_path)
+
+    # 没有数据行的工作表输出“空表”标记
+    blocks = list(iter_excel_blocks(xlsx_path))
+    assert [b['content'] for b in blocks] == ["[工作表 'Blank']\n空表", "[工作表 'HeaderOnly']\n空表"]
@@ -7,7 +7,11 @@ from src.indexer.chroma_index import (
     add_documents,
     count_documents,
     search,
-    search_by_id
+    search_batch,
+    dedupe_hits,
+    search_by_id,
+    build_filter,
+    path_prefixes
 )
 
 
@@ -58,3 +62,202 @@ def test_index_and_search():
     results = search(collection, "文档", filter={"category": "商业"})
     assert len(results) >= 1
     assert "市场营销" in results[0]['document']
+
+
+def test_add_documents_batched():
+    client = get_chroma_client()
+    collection = reset_index(client)
+
+    docs = [
+        {'content': f'批量写入测试文档 {i}', 'type': 'txt', 'metadata': {'sheet_names': ['a', 'b']}}
+        for i in range(10)
+    ]
+    # 重复内容在同一批次中只写入一次
+    docs.append({'content': '批量写入测试文档 0', 'type': 'txt', 'metadata': {}})
+
+    doc_ids = add_documents(collection, docs)
+
+    assert len(doc_ids) == 11
+    assert doc_ids[0] == doc_ids[10]
+    assert count_documents(collection) == 10
+
+    # 列表类型的元数据会被转换为字符串
+    retrieved = search_by_id(collection, doc_ids[1])
+    assert retrieved['metadata']['sheet_names'] == 'a, b'
+
+    # 已存在的ID被覆盖（中断后重新索引时不残留旧内容）
+    add_documents(collection, [{'content': '更新后的文档', 'type': 'txt', 'metadata': {}}], ids=[doc_ids[1]])
+    assert search_by_id(collection, doc_ids[1])['document'] == '更新后的文档'
+    assert count_documents(collection) == 10
+
+
+def test_search_caches():
+    from src.indexer.query_cache import query_embeddings, search_results
+
+    client = get_chroma_client()
+    collection = reset_index(client)
+    add_document(collection, {'content': '缓存测试文档：季度销售报告。', 'type': 'txt', 'metadata': {}})
+
+    embedding_hits = query_embeddings.hits
+    result_hits = search_results.hits
+
+    first = search(collection, "销售报告", n_results=1)
+    second = search(collection, "销售报告", n_results=1)
+    assert first == second
+    assert search_results.hits == result_hits + 1
+
+    # 写入新文档后结果缓存失效，但查询向量仍然命中缓存
+    add_document(collection, {'content': '另一份销售报告。', 'type': 'txt', 'metadata': {}})
+    third = search(collection, "销售报告", n_results=2)
+    assert len(third) == 2
+    assert query_embeddings.hits >= embedding_hits + 1
+
+    # 其他进程写入索引（更新写入标记文件）后结果缓存同样失效
+    import os
+    from src.indexer.query_cache import GENERATION_MARKER_PATH
+    search(collection, "销售报告", n_results=2)
+    result_hits = search_results.hits
+    mtime = os.stat(GENERATION_MARKER_PATH).st_mtime_ns + 1_000_000_000
+    os.utime(GENERATION_MARKER_PATH, ns=(mtime, mtime))
+    search(collection, "销售报告", n_results=2)
+    assert search_results.hits == result_hits
+
+
+def test_shared_embedding_function():
+    from src.indexer.embeddings import get_embedding_function, LazySentenceTransformerEmbeddingFunction
+
+    # 同一模型在进程内只创建一个嵌入函数，构造时不加载模型
+    embedding_function = get_embedding_function()
+    assert get_embedding_function() is embedding_function
+    assert LazySentenceTransformerEmbeddingFunction().loaded is False
+
+    # 与已持久化的集合配置兼容
+    client = get_chroma_client()
+    collection = get_or_create_collection(client)
+    assert collection._embedding_function is embedding_function
+    assert embedding_function.name() == "sentence_transformer"
+
+    embeddings = embedding_function(["懒加载测试"])
+    assert embedding_function.loaded
+    assert len(embeddings) == 1
+
+
+def test_embedding_backend_selection():
+    import pytest
+    from src.indexer.embeddings import get_embedding_function, LazySentenceTransformerEmbeddingFunction
+
+    # 不同后端各自注册，名称保持一致以兼容已有集合
+    onnx_function = get_embedding_function(backend="onnx-int8")
+    assert onnx_function is not get_embedding_function(backend="torch")
+    assert onnx_function.backend == "onnx-int8"
+    assert onnx_function.name() == "sentence_transformer"
+
+    with pytest.raises(ValueError):
+        LazySentenceTransformerEmbeddingFunction(backend="tensorrt")
+
+
+def test_lexical_tokenize():
+    from src.indexer.lexical_index import tokenize
+
+    # CJK切分为二元组，标识符保留完整形式并拆分出各部分，结构标记不参与分词
+    assert tokenize("[段落1]\n合同HT-2024-001") == ["合同", "ht-2024-001", "ht", "2024", "001"]
+    assert tokenize("[工作表 'Q3'] 行 1-50") == ["行", "q3", "1-50", "1", "50"]
+
+
+def test_hybrid_search(tmpdir):
+    from src.indexer.lexical_index import LexicalIndex
+
+    client = get_chroma_client()
+    collection = reset_index(client)
+    lexical_index = LexicalIndex(str(tmpdir.join("lexical.sqlite3")), collection_id=str(collection.id))
+
+    documents = [
+        {'id': 'a', 'content': '错误码 E-40412 表示设备离线，请检查网络连接。', 'type': 'txt', 'metadata': {}},
+        {'id': 'b', 'content': '设备离线时请重启路由器并检查网线。', 'type': 'txt', 'metadata': {}},
+        {'id': 'c', 'content': '季度销售报告汇总了各地区的收入。', 'type': 'pdf', 'metadata': {}}
+    ]
+    add_documents(collection, documents, [d['id'] for d in documents])
+    lexical_index.add((d['id'], d['content']) for d in documents)
+
+    # 词法检索不需要嵌入模型，精确标识符排在第一位
+    lexical = search(collection, "E-40412", n_results=2, lexical_index=lexical_index, mode="lexical")
+    assert [hit['id'] for hit in lexical] == ['a']
+
+    hybrid = search(collection, "E-40412", n_results=3, lexical_index=lexical_index, mode="hybrid")
+    assert hybrid[0]['id'] == 'a'
+    assert hybrid[0]['bm25'] > 0 and 'rrf_score' in hybrid[0]
+
+    # 元数据过滤同样作用于词法命中
+    filtered = search(collection, "E-40412", n_results=3, filter={'type': 'pdf'},
+                      lexical_index=lexical_index, mode="hybrid")
+    assert all(hit['metadata']['type'] == 'pdf' for hit in filtered)
+
+
+def test_search_batch():
+    client = get_chroma_client()
+    collection = reset_index(client)
+    documents = [
+        {'content': '季度销售报告汇总了各地区的收入。', 'type': 'txt', 'metadata': {}},
+        {'content': '预算审批流程需要部门经理签字。', 'type': 'txt', 'metadata': {}},
+        {'content': '客户名单按地区和行业分类。', 'type': 'txt', 'metadata': {}}
+    ]
+    add_documents(collection, documents, ['sales', 'budget', 'customers'])
+
+    queries = ['销售报告', '预算审批', '销售报告']
+    results = search_batch(collection, queries, n_results=2)
+
+    # 每个查询一组结果，与逐个搜索的结果一致；重复的查询返回相同结果
+    assert len(results) == 3
+    assert results[0] == search(collection, '销售报告', n_results=2)
+    assert results[1] == search(collection, '预算审批', n_results=2)
+    assert results[0] == results[2]
+
+    # 去重并集中每个分块只出现一次，并记录命中的查询
+    union = dedupe_hits(results)
+    assert len({hit['id'] for hit in union}) == len(union)
+    assert all(hit['queries'] for hit in union)
+
+
+def test_build_filter():
+    assert build_filter() is None
+    assert build_filter(extensions=["PDF"]) == {'extension': {'$in': ['.pdf']}}
+    assert path_prefixes("/legal/2025/合同.pdf") == ["/legal", "/legal/2025"]
+
+    # 目录范围转换为对应层级目录键的等值条件
+    where = build_filter(path_prefix="/legal/2025/", min_size=10, modified_after=100)
+    assert {'path_2': '/legal/2025'} in where['$and']
+    assert {'file_size': {'$gte': 10}} in where['$and']
+    assert {'file_mtime': {'$gte': 100.0}} in where['$and']
+
+
+def test_filtered_search():
+    client = get_chroma_client()
+    collection = reset_index(client)
+
+    def doc(path, size, mtime):
+        return {
+            'content': f'季度预算报告 {path}',
+            'type': 'txt',
+            'size': 999,
+            # 文档自带的元数据不会覆盖 type/size
+            'metadata': {'file_path': path, 'file_size': size, 'file_mtime': mtime, 'type': 'override'}
+        }
+
+    add_documents(collection, [
+        doc("/legal/2025/a.txt", 100, 1000.0),
+        doc("/legal/2024/b.txt", 5000, 2000.0),
+        doc("/finance/2025/c.pdf", 100, 3000.0),
+    ], ids=["a", "b", "c"])
+
+    def paths(where):
+        hits = search(collection, "季度预算报告", n_results=10, filter=where, mode="vector")
+        return sorted(hit['metadata']['file_path'] for hit in hits)
+
+    assert paths(build_filter(path_prefix="/legal/2025")) == ["/legal/2025/a.txt"]
+    assert paths(build_filter(path_prefix="/legal")) == ["/legal/2024/b.txt", "/legal/2025/a.txt"]
+    assert paths(build_filter(extensions=[".pdf"])) == ["/finance/2025/c.pdf"]
+    assert paths(build_filter(min_size=1000)) == ["/legal/2024/b.txt"]
+    assert paths(build_filter(modified_after=1500, modified_before=2500)) == ["/legal/2024/b.txt"]
+
+    metadata = search_by_id(collection, "a")['metadata']
+    assert metadata['type'] == 'txt' and metadata['size'] == 999
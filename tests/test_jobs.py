@@ -0,0 +1,36 @@
+from src.mcp_server.jobs import JobQueue
+
+
+def test_job_queue_survives_restart(tmpdir):
+    db_path = str(tmpdir.join("jobs.sqlite3"))
+    processed = []
+
+    def process_upload(spool_path, filename):
+        processed.append(filename)
+        return {'status': 'success', 'doc_id': filename, 'chunk_ids': ['c1', 'c2']}
+
+    spool_files = []
+    for i in range(3):
+        spool_file = tmpdir.join(f"spool{i}.txt")
+        spool_file.write("内容")
+        spool_files.append((f"file{i}.txt", str(spool_file)))
+
+    queue = JobQueue(db_path, process_upload)
+    job_id = queue.submit(spool_files)
+
+    # 模拟处理到一半时服务中断：任务和第一个文件处于 running 状态
+    queue._next_job()
+    queue._update_file(job_id, 0, status='running')
+
+    # 重启后任务重新排队并从中断处继续
+    restarted = JobQueue(db_path, process_upload)
+    assert restarted.get_job(job_id)['status'] == 'queued'
+    assert restarted.run_pending() == 1
+
+    job = restarted.get_job(job_id)
+    assert job['status'] == 'completed'
+    assert job['succeeded'] == 3
+    assert job['files'][0]['chunks'] == 2
+    assert processed == ['file0.txt', 'file1.txt', 'file2.txt']
+    # 处理完成后暂存文件被删除
+    assert not any(tmpdir.join(f"spool{i}.txt").exists() for i in range(3))
@@ -1,6 +1,6 @@
 import pytest
 from src.llm_integration import LLMIntegration
-from src.indexer.chroma_index import get_chroma_client, reset_index
+from src.indexer.chroma_index import get_chroma_client, get_or_create_collection, reset_index
 
 
 @pytest.mark.skip(reason="需要本地LLM模型才能运行")
@@ -29,3 +29,30 @@ def test_llm_integration():
     assert "source_documents" in result
     assert len(result["source_documents"]) >= 1
     assert "Python" in result["source_documents"][0]["content"]
+
+
+def test_qa_chain_reused():
+    from langchain.llms.fake import FakeListLLM
+
+    client = get_chroma_client()
+    collection = get_or_create_collection(client)
+    collection.add(
+        ids=["qa_reuse"],
+        documents=["Python是一种广泛使用的高级编程语言。"],
+        metadatas=[{"type": "txt", "category": "编程"}]
+    )
+
+    # 注入假LLM，问答链只构建一次，每次提问复用
+    llm_integration = LLMIntegration(client, llm=FakeListLLM(responses=["Python是一种编程语言。"] * 2))
+    chain = llm_integration.get_qa_chain()
+    assert llm_integration.get_qa_chain() is chain
+
+    result = llm_integration.ask("Python是什么?")
+    assert result["answer"] == "Python是一种编程语言。"
+    assert any("Python" in doc["content"] for doc in result["source_documents"])
+
+    # 流式接口与问答链使用相同的系统提示前缀
+    prompt = llm_integration.build_prompt("Python是什么?", [{"content": "文档A", "score": 1.0}])
+    assert prompt.startswith(llm_integration.prompt.template.split("{context}")[0])
+
+    collection.delete(ids=["qa_reuse"])
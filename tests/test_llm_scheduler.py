@@ -0,0 +1,137 @@
+import time
+import asyncio
+import threading
+import pytest
+from src.mcp_server.executor import ExecutorBusyError
+from src.mcp_server.llm_scheduler import LLMScheduler, LLMTimeoutError
+
+
+class SlowLLM:
+    """每个token耗时 delay 秒的假LLM，记录生成次数"""
+
+    def __init__(self, tokens, delay=0.01):
+        self.tokens = tokens
+        self.delay = delay
+        self.calls = 0
+        self.stopped_early = threading.Event()
+
+    def stream(self, prompt):
+        self.calls += 1
+        try:
+            for token in self.tokens:
+                time.sleep(self.delay)
+                yield token
+        except GeneratorExit:
+            self.stopped_early.set()
+            raise
+
+
+def run_with_scheduler(llm, coroutine_fn, max_queue=4, timeout=5):
+    scheduler = LLMScheduler(llm.stream, max_queue=max_queue, timeout=timeout)
+    scheduler.start()
+    try:
+        return asyncio.run(coroutine_fn(scheduler)), scheduler.stats()
+    finally:
+        scheduler.stop()
+
+
+async def collect(subscription):
+    return [token async for token in subscription]
+
+
+def test_identical_questions_coalesced():
+    llm = SlowLLM(["甲", "乙", "丙"])
+
+    async def main(scheduler):
+        first = scheduler.submit("同一个问题")
+        await asyncio.sleep(0.015)
+        # 生成过程中加入的相同请求共享同一次生成，并收到已生成的token
+        second = scheduler.submit("同一个问题")
+        other = scheduler.submit("另一个问题")
+        return await asyncio.gather(collect(first), collect(second), collect(other)), second.coalesced
+
+    (results, coalesced), stats = run_with_scheduler(llm, main)
+    assert results == [["甲", "乙", "丙"]] * 3
+    assert coalesced
+    assert llm.calls == 2
+    assert stats['coalesced'] == 1 and stats['completed'] == 2
+    assert stats['wait']['count'] == 2
+
+
+def test_queue_full_rejected():
+    llm = SlowLLM(["a"] * 5)
+
+    async def main(scheduler):
+        running = scheduler.submit("问题1")
+        await asyncio.sleep(0.02)
+        queued = scheduler.submit("问题2")
+        with pytest.raises(ExecutorBusyError):
+            scheduler.submit("问题3")
+        return await asyncio.gather(collect(running), collect(queued))
+
+    _, stats = run_with_scheduler(llm, main, max_queue=1)
+    assert stats['rejected'] == 1
+
+
+def test_disconnect_cancels_generation():
+    llm = SlowLLM(["a"] * 50)
+
+    async def main(scheduler):
+        subscription = scheduler.submit("问题")
+        async for _ in subscription:
+            break
+        # 最后一个订阅者退出后，生成在下一个token处停止
+        await asyncio.sleep(0.05)
+
+    _, stats = run_with_scheduler(llm, main)
+    assert llm.stopped_early.is_set()
+    assert stats['cancelled'] == 1 and stats['completed'] == 0
+
+
+def test_deadline():
+    llm = SlowLLM(["a"] * 50, delay=0.02)
+
+    async def main(scheduler):
+        with pytest.raises(LLMTimeoutError):
+            await collect(scheduler.submit("问题", timeout=0.1))
+
+    run_with_scheduler(llm, main)
+
+
+def test_closed_loop_subscriber_does_not_stop_worker():
+    llm = SlowLLM(["a"] * 20)
+    scheduler = LLMScheduler(llm.stream, max_queue=4, timeout=2)
+    scheduler.start()
+    try:
+        async def abandon():
+            # 订阅后事件循环直接关闭，生成线程向它投递token时失败
+            scheduler.submit("问题1")
+            await asyncio.sleep(0.03)
+
+        async def ask():
+            return await collect(scheduler.submit("问题2"))
+
+        asyncio.run(abandon())
+        # 工作线程继续处理后续请求，失效的订阅者被移除，生成随之取消
+        assert asyncio.run(ask()) == ["a"] * 20
+        stats = scheduler.stats()
+        assert stats['cancelled'] == 1 and stats['completed'] == 1
+    finally:
+        scheduler.stop()
+
+
+def test_max_queue_zero_accepts_when_idle():
+    llm = SlowLLM(["a"] * 5)
+
+    async def main(scheduler):
+        running = scheduler.submit("问题1")
+        # 不排队：生成进行中时拒绝新的请求
+        with pytest.raises(ExecutorBusyError):
+            scheduler.submit("问题2")
+        first = await collect(running)
+        await asyncio.sleep(0.01)
+        return first, await collect(scheduler.submit("问题3"))
+
+    results, stats = run_with_scheduler(llm, main, max_queue=0)
+    assert results == (["a"] * 5, ["a"] * 5)
+    assert stats['rejected'] == 1 and stats['completed'] == 2
@@ -0,0 +1,36 @@
+from src.indexer.near_duplicates import NearDuplicateIndex, minhash, estimate_similarity
+
+BASE = " ".join(f"条款{i} 合同双方约定 payment term {i} days" for i in range(60))
+
+
+def test_minhash_similarity():
+    near = BASE.replace("条款7 ", "条款七 ")
+    different = " ".join(f"会议纪要{i} 项目进度 milestone {i * 3} 延期" for i in range(60))
+
+    assert estimate_similarity(minhash(BASE), minhash(near)) > 0.9
+    assert estimate_similarity(minhash(BASE), minhash(different)) < 0.2
+    # 过短的文本不参与近似重复检测
+    assert minhash("这是一个测试文件。") is None
+
+
+def test_near_duplicate_index(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "near.sqlite3"))
+    index.add("/share/contract_v2_final.txt", minhash(BASE))
+
+    near = BASE.replace("条款7 ", "条款七 ")
+    assert index.find(minhash(near), 0.9) == "/share/contract_v2_final.txt"
+    assert index.find(minhash(near), 0.9, exclude="/share/contract_v2_final.txt") is None
+
+    index.delete(["/share/contract_v2_final.txt"])
+    assert index.find(minhash(near), 0.9) is None and len(index) == 0
+
+
+def test_near_duplicate_scope(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "near.sqlite3"))
+    index.add("/share/legal/contract.txt", minhash(BASE), scope="/share/legal|.txt")
+
+    # 指定范围时只匹配同一范围内的规范文件
+    near = BASE.replace("条款7 ", "条款七 ")
+    assert index.find(minhash(near), 0.9, scope="/share/legal|.txt") == "/share/legal/contract.txt"
+    assert index.find(minhash(near), 0.9, scope="/share/sales|.txt") is None
+    assert index.signatures()[0][2] == "/share/legal|.txt"
@@ -0,0 +1,74 @@
+import chromadb
+from src.indexer.sharding import ShardedCollection, shard_key, safe_shard_key, SHARD_PREFIX
+
+
+def _add(collection, paths, vectors):
+    collection.add(
+        ids=[f"{path}#0" for path in paths],
+        documents=[f"{path} 的内容" for path in paths],
+        metadatas=[{'file_path': path, 'parent_id': path} for path in paths],
+        embeddings=vectors
+    )
+
+
+def test_shard_key():
+    # 按顶级目录、租户和路径哈希计算分片键
+    assert shard_key({'file_path': '/data/sales/q1.txt'}, "directory", root="/data") == "sales"
+    assert shard_key({'file_path': '/data/q1.txt'}, "directory", root="/data") == "default"
+    assert shard_key({'file_path': '/data/q1.txt', 'tenant': 'acme'}, "tenant") == "acme"
+    assert shard_key({'file_path': '/data/q1.txt'}, "hash", count=4) in {"000", "001", "002", "003"}
+    assert shard_key({}, "hash") == "default"
+
+    # 不合法的字符被替换，并追加哈希避免冲突
+    assert safe_shard_key("team-a") == "team-a"
+    assert safe_shard_key("团队 A") != safe_shard_key("团队 B")
+    assert safe_shard_key("团队 A").startswith("A-")
+
+
+def test_sharded_collection(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = ShardedCollection(client, scheme="directory", root="/data")
+    # 在分片创建之前打开的实例也共享同一个集合ID
+    assert ShardedCollection(client, scheme="directory", root="/data").id == collection.id
+    _add(collection, ["/data/sales/a.txt", "/data/sales/b.txt", "/data/hr/c.txt"],
+         [[1.0, 0.0, 0.0], [0.8, 0.6, 0.0], [0.0, 1.0, 0.0]])
+
+    # 写入按目录路由到不同的分片集合
+    assert collection.stats() == {SHARD_PREFIX + "hr": 1, SHARD_PREFIX + "sales": 2}
+    assert collection.count() == 3
+
+    # 并行查询各分片，按距离合并
+    results = collection.query(query_embeddings=[[0.0, 1.0, 0.0]], n_results=2)
+    assert results['ids'][0] == ["/data/hr/c.txt#0", "/data/sales/b.txt#0"]
+    assert results['distances'][0] == sorted(results['distances'][0])
+
+    # 视图只检索指定的分片
+    view = collection.view(["sales"])
+    assert view.shard_scope == "sales"
+    assert view.query(query_embeddings=[[0.0, 1.0, 0.0]], n_results=3)['ids'][0][0] == "/data/sales/b.txt#0"
+
+    # 按ID读取和跨分片分页读取
+    assert collection.get(ids=["/data/hr/c.txt#0"])['documents'] == ["/data/hr/c.txt 的内容"]
+    pages = [collection.get(limit=2, offset=offset)['ids'] for offset in (0, 2)]
+    assert len(pages[0]) == 2 and len(pages[1]) == 1
+    assert sorted(pages[0] + pages[1]) == sorted(collection.get()['ids'])
+    assert collection.get(where={'parent_id': '/data/sales/b.txt'})['ids'] == ["/data/sales/b.txt#0"]
+
+    # 更新和删除在分块所在的分片中进行
+    collection.update(ids=["/data/hr/c.txt#0"], metadatas=[{'file_path': '/data/hr/c.txt', 'parent_id': 'x'}])
+    assert collection.get(ids=["/data/hr/c.txt#0"])['metadatas'][0]['parent_id'] == 'x'
+    collection.delete(ids=["/data/sales/a.txt#0"])
+    assert collection.count() == 2
+
+    # 重新打开后分片和集合ID保持不变
+    reopened = ShardedCollection(client, scheme="directory", root="/data")
+    assert reopened.id == collection.id and reopened.shard_names() == ["hr", "sales"]
+
+    # 删除分片
+    assert reopened.drop_shard("hr") and reopened.count() == 1
+    collection.reload()
+    assert collection.shard_names() == ["sales"]
+
+    # 删除全部分片后生成新的集合ID
+    reopened.drop_all()
+    assert reopened.shard_names() == [] and reopened.id != collection.id
@@ -0,0 +1,75 @@
+import os
+import chromadb
+import numpy as np
+import pytest
+from src.document_processor import DocumentProcessor
+from src.indexer.chroma_index import hnsw_metadata
+from src.indexer.embeddings import get_embedding_function
+from src.indexer.snapshot import create_snapshot, apply_part, read_snapshot, read_files
+
+
+def _collection(path):
+    client = chromadb.PersistentClient(path=str(path))
+    return client.get_or_create_collection(
+        name="documents", embedding_function=get_embedding_function(), metadata=hnsw_metadata()
+    )
+
+
+def test_snapshot_and_restore(tmp_path):
+    source = _collection(tmp_path / "source")
+    vectors = np.random.RandomState(0).standard_normal((50, 8)).astype(np.float32)
+    source.add(
+        ids=[f"c{i}" for i in range(50)],
+        documents=[f"分块{i}" for i in range(50)],
+        metadatas=[{'parent_id': f"f{i}"} for i in range(50)],
+        embeddings=vectors.tolist()
+    )
+    snapshot_dir = str(tmp_path / "snapshot")
+
+    # 全量快照：向量保存为 float16，可以内存映射
+    stats = create_snapshot(source, snapshot_dir, batch_size=16)
+    assert stats['part'] == "part-00000" and stats['chunks'] == 50
+    mapped = np.load(os.path.join(snapshot_dir, "part-00000.npy"), mmap_mode='r')
+    assert mapped.dtype == np.float16 and mapped.shape == (50, 8)
+
+    # 没有变化时不写入新的部分；增量快照只包含修改、新增和删除的分块
+    assert create_snapshot(source, snapshot_dir)['part'] is None
+    source.update(ids=["c1"], documents=["分块1（已修改）"], embeddings=[vectors[1].tolist()])
+    source.add(ids=["c50"], documents=["新分块"], metadatas=[{'parent_id': "f50"}], embeddings=[vectors[0].tolist()])
+    source.delete(ids=["c2"])
+    stats = create_snapshot(source, snapshot_dir)
+    assert (stats['part'], stats['chunks'], stats['deleted']) == ("part-00001", 2, 1)
+
+    # 按顺序应用各部分恢复到新的集合，不调用嵌入模型
+    target = _collection(tmp_path / "target")
+    for part in read_snapshot(snapshot_dir)['parts']:
+        apply_part(target, snapshot_dir, part['name'], batch_size=16)
+    expected = source.get(include=["documents", "embeddings"])
+    restored = target.get(ids=expected['ids'], include=["documents", "embeddings"])
+    assert sorted(restored['ids']) == sorted(expected['ids'])
+    order = {chunk_id: i for i, chunk_id in enumerate(restored['ids'])}
+    for i, chunk_id in enumerate(expected['ids']):
+        assert restored['documents'][order[chunk_id]] == expected['documents'][i]
+        assert np.allclose(restored['embeddings'][order[chunk_id]], expected['embeddings'][i], atol=1e-2)
+
+    # 全量快照重新开始
+    assert create_snapshot(source, snapshot_dir, full=True)['part'] == "part-00000"
+    assert len(read_snapshot(snapshot_dir)['parts']) == 1
+
+
+def test_processor_snapshot(tmpdir):
+    test_file = tmpdir.join("snapshot.txt")
+    test_file.write("快照包含文件清单，恢复后未变化的文件不会重新索引。")
+    processor = DocumentProcessor()
+    processor.process_file(str(test_file))
+
+    snapshot_dir = str(tmpdir.join("snapshot"))
+    processor.snapshot(snapshot_dir)
+    files = read_files(snapshot_dir)
+    assert any(path.endswith("snapshot.txt") for path in files)
+
+    # 已有内容的索引不能直接恢复其他快照
+    with pytest.raises(ValueError):
+        processor.restore(snapshot_dir)
+
+    processor.remove_files([str(test_file)])
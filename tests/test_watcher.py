@@ -0,0 +1,54 @@
+import os
+import shutil
+from watchfiles import Change
+from src.document_processor import DocumentProcessor
+from src.watcher import DirectoryWatcher
+
+
+def _indexed(processor, path):
+    return processor.manifest.get(path) is not None
+
+
+def test_apply_changes(tmpdir):
+    watch_dir = tmpdir.mkdir("watched")
+    processor = DocumentProcessor()
+    watcher = DirectoryWatcher(processor, [str(watch_dir)])
+
+    # 新建文件：同一批次中的多个事件只处理一次，不匹配扩展名的文件被忽略
+    first = watch_dir.join("a.txt")
+    first.write("监视目录中的第一个文件。")
+    ignored = watch_dir.join("notes.log")
+    ignored.write("日志")
+    batch = watcher.apply_changes({(Change.added, str(first)), (Change.modified, str(first)),
+                                   (Change.added, str(ignored))})
+    assert batch['indexed'] == 1
+    assert _indexed(processor, str(first)) and not _indexed(processor, str(ignored))
+
+    # 修改后重新索引
+    first.write("监视目录中的第一个文件，已修改。")
+    os.utime(str(first), (1, 1))
+    assert watcher.apply_changes({(Change.modified, str(first))})['indexed'] == 1
+
+    # 重命名 = 旧路径删除 + 新路径新建
+    renamed = watch_dir.join("b.txt")
+    first.rename(renamed)
+    batch = watcher.apply_changes({(Change.deleted, str(first)), (Change.added, str(renamed))})
+    assert batch['removed'] == 1 and batch['indexed'] == 1
+    assert not _indexed(processor, str(first)) and _indexed(processor, str(renamed))
+
+    # 整个目录移入与删除
+    sub = tmpdir.mkdir("incoming")
+    for i in range(3):
+        sub.join(f"doc{i}.txt").write(f"批量移入的文件{i}。")
+    moved = os.path.join(str(watch_dir), "incoming")
+    shutil.move(str(sub), moved)
+    assert watcher.apply_changes({(Change.added, moved)})['indexed'] == 3
+
+    shutil.rmtree(moved)
+    assert watcher.apply_changes({(Change.deleted, moved)})['removed'] == 3
+    assert processor.manifest.paths(moved) == []
+
+    stats = watcher.stats()
+    assert stats['batches'] == 5 and stats['errors'] == 0
+
+    processor.remove_files([str(renamed)])